@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark for the ViT wrapper preprocessing.
+
+Compares the legacy per-frame pipeline (min-max to uint8, PIL image, torchvision
+Resize/Grayscale/ToTensor/Normalize) with the vectorized FramePreprocessor on
+synthetic SAXS-like detector frames, and reports the per-frame time on CPU.
+
+Usage:
+    python benchmark_preprocessing.py --height 2048 --width 2048 --dtype uint32 --batch-sizes 1 8 16
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from vit_wrapper import FramePreprocessor
+
+LEGACY_TRANSFORM = transforms.Compose([
+    transforms.Resize((512, 512)),
+    transforms.Grayscale(num_output_channels=1),
+    transforms.ToTensor(),
+    transforms.Normalize((0.0,), (1.0,)),
+])
+
+
+def legacy_preprocess(frames):
+    """Per-frame preprocessing as done by the wrapper before vectorization"""
+    tensors = []
+    for frame in frames:
+        if frame.dtype == np.uint8:
+            img_array = frame
+        else:
+            array_min = frame.min()
+            array_max = frame.max()
+            if array_max > array_min:
+                img_array = (((frame.astype(np.float32) - array_min) /
+                              (array_max - array_min)) * 255).astype(np.uint8)
+            else:
+                img_array = np.zeros_like(frame, dtype=np.uint8)
+        tensors.append(LEGACY_TRANSFORM(Image.fromarray(img_array)))
+    return torch.stack(tensors)
+
+
+def make_saxs_frames(batch_size, height, width, dtype, seed=0):
+    """Synthetic scattering frames: radially decaying intensity with Poisson noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.ogrid[:height, :width]
+    radius = np.hypot(y - height / 2, x - width / 2) + 1.0
+    intensity = 1e5 / radius**2
+    frames = rng.poisson(intensity, size=(batch_size, height, width))
+    return frames.astype(dtype)
+
+
+def time_per_frame(fn, frames, repeats):
+    """Best-of-repeats wall time per frame in milliseconds"""
+    fn(frames)  # warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(frames)
+        best = min(best, time.perf_counter() - start)
+    return best / len(frames) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--dtype", default="uint32", choices=["uint8", "uint16", "uint32", "float32"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    preprocessor = FramePreprocessor(size=(512, 512), device=torch.device("cpu"))
+
+    print("----------------------------------------------")
+    print(f"Frames: {args.height}x{args.width} {args.dtype}, torch threads: {torch.get_num_threads()}")
+    print(f"{'batch':>6} {'legacy ms/frame':>16} {'vectorized ms/frame':>20} {'speedup':>8} {'max abs diff':>13}")
+    for batch_size in args.batch_sizes:
+        frames = make_saxs_frames(batch_size, args.height, args.width, np.dtype(args.dtype))
+
+        legacy_ms = time_per_frame(legacy_preprocess, frames, args.repeats)
+        vectorized_ms = time_per_frame(preprocessor, frames, args.repeats)
+
+        # The legacy path quantizes to 8 bits, so differences up to ~1/255 are expected
+        max_diff = (legacy_preprocess(frames) - preprocessor(frames)).abs().max().item()
+        print(f"{batch_size:>6} {legacy_ms:>16.2f} {vectorized_ms:>20.2f} "
+              f"{legacy_ms / vectorized_ms:>7.1f}x {max_diff:>13.4f}")
+    print("----------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
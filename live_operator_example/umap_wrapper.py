@@ -44,10 +44,11 @@ class UMAPModelWrapper(mlflow.pyfunc.PythonModel):
         
         Args:
             context: MLflow context
-            model_input: Input data as numpy array
+            model_input: Latent features as numpy array, (latent_dim,) for a single
+                frame or (B, latent_dim) for a batch of frames
             
         Returns:
-            Dictionary with UMAP coordinates
+            Dictionary with UMAP coordinates of shape (B, n_components)
         """
         if self.model is None:
             raise RuntimeError("UMAP model not loaded. Call load_context first.")
@@ -56,11 +57,15 @@ class UMAPModelWrapper(mlflow.pyfunc.PythonModel):
         if not isinstance(model_input, np.ndarray):
             raise ValueError(f"Input must be a numpy array, got {type(model_input)}")
             
+        # A single latent vector is treated as a batch of one
+        if model_input.ndim == 1:
+            model_input = model_input[np.newaxis]
+
         # Check input dimensions
-        if len(model_input.shape) != 2 or model_input.shape[0] != 1:
-            raise ValueError(f"Input must be a 2D array with shape (1, latent_dim), got shape {model_input.shape}")
+        if model_input.ndim != 2 or model_input.shape[0] == 0:
+            raise ValueError(f"Input must be a 2D array with shape (B, latent_dim), got shape {model_input.shape}")
         
-        # Apply UMAP transformation
+        # Apply UMAP transformation to the whole batch at once
         umap_coords = self.model.transform(model_input)
         
         # Return results
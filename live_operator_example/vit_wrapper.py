@@ -6,6 +6,7 @@ Provides functionality to load a ViT autoencoder model and register it with MLfl
 
 import os
 import sys
+import threading
 import time
 import traceback
 import importlib.util
@@ -13,8 +14,7 @@ from datetime import datetime
 
 import numpy as np
 import torch
-from torchvision import transforms
-from PIL import Image
+import torch.nn.functional as F
 import mlflow
 
 
@@ -32,6 +32,97 @@ if not hasattr(torch, "get_default_device"):
     torch.get_default_device = get_default_device
 
 
+class FramePreprocessor:
+    """
+    Vectorized preprocessing of raw detector frames into model input tensors.
+
+    Takes a stack of frames (B,H,W) or (B,H,W,C) straight from the detector
+    (uint8, uint16, uint32 or float32) and produces a normalized (B,1,H',W')
+    float32 tensor. This replaces the per-frame uint8 -> PIL -> torchvision chain:
+    - uint8 frames are scaled by 1/255, other dtypes are min-max scaled per frame
+      to [0, 1] without the lossy 8-bit round trip
+    - color frames are converted to grayscale with the ITU-R 601-2 luma weights,
+      as PIL does
+    - frames are resized with antialiased bilinear interpolation, as PIL does
+
+    Min-max scaling is linear, so it is applied after the resize using the
+    extrema of the full-resolution frame, which only touches the small output.
+    The float32 staging buffer for the raw frames is allocated once per thread
+    and reused for every batch of the same shape, so frames can be preprocessed
+    from several threads at once.
+    """
+
+    SUPPORTED_DTYPES = (np.uint8, np.uint16, np.uint32, np.float32)
+    LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+
+    def __init__(self, size=(512, 512), mean=0.0, std=1.0, device=None):
+        self.size = tuple(size)
+        self.mean = mean
+        self.std = std
+        self.device = device or torch.device("cpu")
+        self._local = threading.local()
+
+    def _staging_buffer(self, shape):
+        """Return a float32 buffer of the given shape, reusing this thread's previous one if possible"""
+        staging = getattr(self._local, "staging", None)
+        if staging is None or staging.shape != shape:
+            staging = self._local.staging = np.empty(shape, dtype=np.float32)
+        return staging
+
+    def __call__(self, frames):
+        """
+        Args:
+            frames: numpy array (B,H,W) or (B,H,W,C)
+
+        Returns:
+            torch.Tensor of shape (B, 1, size[0], size[1]) on self.device
+        """
+        if frames.dtype.type not in self.SUPPORTED_DTYPES:
+            raise ValueError(f"Input must be uint8, uint16, uint32, or float32, got {frames.dtype}")
+
+        # Convert to float32 once, into the reusable staging buffer
+        staging = self._staging_buffer(frames.shape)
+        np.copyto(staging, frames, casting="unsafe")
+        batch = torch.from_numpy(staging).to(self.device)
+
+        # Collapse channels to a single grayscale channel
+        if batch.ndim == 4:
+            channels = batch.shape[-1]
+            if channels >= 3:
+                weights = torch.tensor(self.LUMA_WEIGHTS, device=batch.device)
+                batch = batch[..., :3] @ weights
+            else:
+                batch = batch[..., 0]
+
+        # Per-frame scale and offset mapping the raw values to [0, 1]
+        if frames.dtype == np.uint8:
+            offset = torch.zeros((batch.shape[0], 1, 1, 1), device=batch.device)
+            scale = torch.full_like(offset, 1.0 / 255.0)
+        else:
+            flat = batch.reshape(batch.shape[0], -1)
+            low = flat.amin(dim=1)
+            high = flat.amax(dim=1)
+            span = high - low
+            # Uniform frames map to zeros
+            scale = torch.where(span > 0, 1.0 / span, torch.zeros_like(span))
+            offset = low.view(-1, 1, 1, 1)
+            scale = scale.view(-1, 1, 1, 1)
+
+        resized = F.interpolate(
+            batch.unsqueeze(1),
+            size=self.size,
+            mode="bilinear",
+            align_corners=False,
+            antialias=True,
+        )
+        resized.sub_(offset).mul_(scale).clamp_(0.0, 1.0)
+
+        # Normalize to the configured mean and std
+        if self.mean != 0.0 or self.std != 1.0:
+            resized.sub_(self.mean).div_(self.std)
+        return resized
+
+
 class VitAutoencoderWrapper(mlflow.pyfunc.PythonModel):
     """
     Wrapper for ViT Autoencoder with direct model access and latent features functionality
@@ -115,16 +206,36 @@ class VitAutoencoderWrapper(mlflow.pyfunc.PythonModel):
         self.model.eval()
         self.model = self.model.to(self.device)
         
-        # Define the image transformation pipeline
-        self.transform = transforms.Compose([
-            transforms.Resize((512, 512)),  # Resize to smaller dimensions to save memory
-            transforms.Grayscale(num_output_channels=1),
-            transforms.ToTensor(),  # Convert image to PyTorch tensor (0-1 range)
-            transforms.Normalize((0.0,), (1.0,)),  # Normalize tensor to have mean 0 and std 1
-        ])
+        # Define the image preprocessing pipeline: resize to 512x512 to save memory,
+        # grayscale, scale to the 0-1 range and normalize with mean 0 and std 1
+        self.preprocessor = FramePreprocessor(size=(512, 512), mean=0.0, std=1.0, device=self.device)
         
         print(f"✓ ViT model loaded successfully with latent_dim={latent_dim}")
     
+    @staticmethod
+    def _as_batch(model_input):
+        """
+        Normalize the input to a batch of frames.
+
+        Accepts a single frame (H,W) or (H,W,C) and a stack of frames (B,H,W),
+        (B,H,W,C) or (B,1,H,W). A 3D array whose last axis has 1, 3 or 4 entries
+        is read as one (H,W,C) image, any other 3D array as a (B,H,W) stack.
+        """
+        if model_input.ndim == 2:
+            return model_input[np.newaxis]
+        if model_input.ndim == 3:
+            if model_input.shape[-1] in (1, 3, 4):
+                return model_input[np.newaxis]
+            return model_input
+        if model_input.ndim == 4:
+            if model_input.shape[1] == 1 and model_input.shape[-1] not in (1, 3, 4):
+                return model_input[:, 0]
+            return model_input
+        raise ValueError(
+            "Input must be (H,W), (H,W,C), (B,H,W) or (B,H,W,C), "
+            f"got shape {model_input.shape}"
+        )
+
     def predict(self, context, model_input):
         """
         Standard predict method (required by MLflow)
@@ -134,10 +245,13 @@ class VitAutoencoderWrapper(mlflow.pyfunc.PythonModel):
         
         Args:
             context: MLflow context
-            model_input: Input data as 2D/3D numpy array (H,W) or (H,W,C)
+            model_input: Input data as numpy array, either one frame (H,W) / (H,W,C)
+                or a stack of frames (B,H,W) / (B,H,W,C)
             
         Returns:
-            Dictionary with reconstruction and latent features
+            Dictionary with reconstruction and latent features, batched along
+            the first axis (B=1 for a single frame), and the seconds spent in
+            preprocessing so callers can tell it apart from the forward pass
         """
         if self.model is None:
             raise RuntimeError("ViT model not loaded. Call load_context first.")
@@ -145,61 +259,21 @@ class VitAutoencoderWrapper(mlflow.pyfunc.PythonModel):
         # Validate input
         if not isinstance(model_input, np.ndarray):
             raise ValueError(f"Input must be a numpy array, got {type(model_input)}")
-            
-        # Check input dimensions
-        model_input = np.squeeze(model_input)
-        if not (len(model_input.shape) == 2 or len(model_input.shape) == 3):
-            raise ValueError(f"Input must be a 2D or 3D array (H,W) or (H,W,C), got shape {model_input.shape}")
-        
-        
-        # Check and handle input dtype
-        if model_input.dtype == np.uint8:
-            # uint8 is already the preferred format, no conversion needed
-            img_array = model_input
-        elif model_input.dtype == np.uint32:
-            # Convert uint32 to uint8 with robust min-max scaling
-            array_min = model_input.min()
-            array_max = model_input.max()
-            # Protect against divide-by-zero and handle the case where all values are the same
-            if array_max > array_min:
-                # Scale using full range from min to max for better contrast
-                img_array = (((model_input.astype(np.float32) - array_min) / 
-                            (array_max - array_min)) * 255).astype(np.uint8)
-            else:
-                # If all values are the same, create a uniform image
-                img_array = np.zeros_like(model_input, dtype=np.uint8)
-        elif model_input.dtype == np.float32:
-            # Convert float32 to uint8 with robust min-max scaling
-            array_min = model_input.min()
-            array_max = model_input.max()
-            
-            # Protect against divide-by-zero and handle the case where all values are the same
-            if array_max > array_min:
-                # Scale using full range from min to max for better contrast
-                img_array = (((model_input - array_min) / 
-                            (array_max - array_min)) * 255).astype(np.uint8)
-            else:
-                # If all values are the same, create a uniform image
-                img_array = np.zeros_like(model_input, dtype=np.uint8)
-        else:
-            # Raise exception for unsupported dtypes
-            raise ValueError(f"Input must be uint8, uint32, or float32, got {model_input.dtype}")
-        
-        try:
-            # Convert numpy array to PIL Image
-            # PIL.Image.fromarray handles both 2D and 3D arrays automatically
-            pil_image = Image.fromarray(img_array)
 
-            # Apply transformations (resize, convert to tensor, normalize)
-            tensor = self.transform(pil_image)
-            
-            # Add batch dimension and move to device
-            tensor = tensor.unsqueeze(0).to(self.device)
-            
+        # Single frames become a batch of one
+        frames = self._as_batch(model_input)
+
+        preprocess_start = time.perf_counter()
+        try:
+            # Preprocess the whole batch at once (grayscale, scale, resize, normalize)
+            tensor = self.preprocessor(frames)
+        except ValueError:
+            raise
         except Exception as e:
             raise ValueError(f"Failed to process input image: {e}")
+        preprocess_seconds = time.perf_counter() - preprocess_start
         
-        # Process with model
+        # Process the whole batch with a single forward pass
         with torch.no_grad():
             # Get reconstruction
             reconstruction = self.model(tensor)
@@ -212,7 +286,8 @@ class VitAutoencoderWrapper(mlflow.pyfunc.PythonModel):
         # Return results
         return {
             "reconstruction": reconstruction_np,
-            "latent_features": latent_features
+            "latent_features": latent_features,
+            "preprocess_seconds": preprocess_seconds,
         }
 
 
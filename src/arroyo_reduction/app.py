@@ -7,8 +7,11 @@ import typer
 from arroyosas.zmq import ZMQFrameListener
 from dynaconf import Dynaconf
 
+from .metrics import start_metrics_server
+from .model_prefetch import ModelPrefetcher
 from .operator import LatentSpaceOperator
 from .publisher import LSEWSResultPublisher
+from .session_log import LiveSessionLog
 from .redis_model_store import RedisModelStore  # Import the RedisModelStore class
 
 settings = Dynaconf(
@@ -35,8 +38,15 @@ def setup_logger(logger: logging.Logger, log_level: str = "INFO"):
 setup_logger(logger, settings.logging_level)
 
 
+def log_task_failure(task: asyncio.Task) -> None:
+    """Log the exception of a background task, e.g. a metrics port already in use"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+
 @app.command()
 async def start() -> None:
+    metrics_task = None
     try:
         app_settings = settings.lse_operator
         logger.info("Getting settings")
@@ -48,6 +58,20 @@ async def start() -> None:
         # Initialize the WebSocket publisher first (so it's available for connections)
         ws_publisher = LSEWSResultPublisher.from_settings(app_settings.ws_publisher)
         publisher_task = asyncio.create_task(ws_publisher.start())
+
+        # Serve Prometheus metrics next to the websocket server
+        metrics_settings = app_settings.get("metrics", {})
+        if metrics_settings.get("enabled", True):
+            metrics_task = asyncio.create_task(
+                start_metrics_server(metrics_settings.get("host", "0.0.0.0"), metrics_settings.get("port", 9100)),
+                name="metrics_server",
+            )
+            metrics_task.add_done_callback(log_task_failure)
+        
+        # Download the live mode models while the user is still choosing a pair
+        prefetch_settings = settings.lse_reducer.get("prefetch", {})
+        if prefetch_settings.get("enabled", True):
+            ModelPrefetcher.from_settings(prefetch_settings).start()
         
         # Initialize Redis model store instead of direct Redis client
         logger.info("Initializing Redis Model Store")
@@ -80,6 +104,11 @@ async def start() -> None:
         # Models are selected, now create operator and start listening
         operator = LatentSpaceOperator.from_settings(app_settings, settings.lse_reducer)
         operator.add_publisher(ws_publisher)
+
+        # Keep the live results in kvrocks streams, so they outlive the page and the operator
+        session_log_settings = app_settings.get("session_log", {})
+        if session_log_settings.get("enabled", True):
+            operator.add_publisher(LiveSessionLog.from_settings(session_log_settings))
         
         listener = ZMQFrameListener.from_settings(app_settings.listener, operator)
         
@@ -90,6 +119,10 @@ async def start() -> None:
     except Exception as e:
         logger.critical(f"Fatal error in main application: {e}")
         sys.exit(1)
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+            await asyncio.gather(metrics_task, return_exceptions=True)
 
 if __name__ == "__main__":
     asyncio.run(start())
\ No newline at end of file
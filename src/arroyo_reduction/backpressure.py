@@ -0,0 +1,147 @@
+import logging
+from collections import deque
+
+logger = logging.getLogger("arroyo_reduction.backpressure")
+
+
+class BackpressurePolicy:
+    """
+    Bounded intake buffer between the listener and the reduction pipeline.
+
+    Frames are offered as they arrive and taken when the pipeline has room.
+    When frames arrive faster than they are reduced, the policy decides which
+    ones are shed. Every frame taken out carries the number of frames shed
+    since the previous one, so published events can report the sampling.
+    """
+
+    name = "drop_oldest"
+
+    def __init__(self, max_pending: int = 32):
+        self.max_pending = max(1, int(max_pending))
+        self.shed = 0
+        self._pending = deque()
+        self._skipped = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def offer(self, message, arrived_at: float) -> int:
+        """Add a frame, returning the number of frames shed to make room"""
+        self._pending.append((message, arrived_at))
+        shed = 0
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            shed += 1
+        return self._count_shed(shed)
+
+    def take(self):
+        """Return (message, arrived_at, frames_skipped) for the next frame, or None if empty"""
+        if not self._pending:
+            return None
+        message, arrived_at = self._pending.popleft()
+        skipped, self._skipped = self._skipped, 0
+        return message, arrived_at, skipped
+
+    def skip(self, count: int = 1) -> None:
+        """Account for frames taken out but not reduced, e.g. because they were stale"""
+        self._skipped += count
+
+    def clear(self) -> int:
+        shed = len(self._pending)
+        self._pending.clear()
+        self._skipped = 0
+        return shed
+
+    def describe(self) -> str:
+        """The sampling applied, as reported on published events"""
+        return self.name
+
+    def _count_shed(self, shed: int) -> int:
+        if shed:
+            self.shed += shed
+            self._skipped += shed
+            # A sustained overload sheds on every arrival, so only log now and then
+            if self.shed == shed or self.shed // 100 != (self.shed - shed) // 100:
+                logger.warning(f"Reducer is behind, {self.name} policy has shed {self.shed} frames")
+        return shed
+
+
+class DropOldestPolicy(BackpressurePolicy):
+    """Keep the most recent max_pending frames, shedding the oldest ones"""
+
+    name = "drop_oldest"
+
+
+class KeepLatestPolicy(BackpressurePolicy):
+    """Only ever keep the newest frame, the lowest latency under overload"""
+
+    name = "keep_latest"
+
+    def __init__(self, max_pending: int = 1):
+        super().__init__(max_pending=1)
+
+
+class StridePolicy(BackpressurePolicy):
+    """
+    Admit every Nth frame while the pipeline is behind. The stride doubles
+    (up to max_stride) each time the buffer overflows and halves each time
+    the pipeline catches up, so frames are sampled evenly over time.
+    """
+
+    name = "stride"
+
+    def __init__(self, max_pending: int = 32, max_stride: int = 64):
+        super().__init__(max_pending=max_pending)
+        self.max_stride = max(1, int(max_stride))
+        self.stride = 1
+        self._arrivals = 0
+
+    def offer(self, message, arrived_at: float) -> int:
+        self._arrivals += 1
+        if self._arrivals % self.stride:
+            return self._count_shed(1)
+
+        self._pending.append((message, arrived_at))
+        shed = 0
+        if len(self._pending) > self.max_pending:
+            if self.stride < self.max_stride:
+                self.stride = min(2 * self.stride, self.max_stride)
+                logger.info(f"Reducer is behind, sampling every {self.stride} frames")
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                shed += 1
+        return self._count_shed(shed)
+
+    def take(self):
+        item = super().take()
+        if item is not None and not self._pending and self.stride > 1:
+            self.stride //= 2
+            logger.info(f"Reducer is catching up, sampling every {self.stride} frames")
+        return item
+
+    def clear(self) -> int:
+        self.stride = 1
+        self._arrivals = 0
+        return super().clear()
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.stride}"
+
+
+POLICIES = {
+    DropOldestPolicy.name: DropOldestPolicy,
+    KeepLatestPolicy.name: KeepLatestPolicy,
+    StridePolicy.name: StridePolicy,
+}
+
+
+def make_policy(name: str, max_pending: int = 32, max_stride: int = 64) -> BackpressurePolicy:
+    """Create a policy by name, or return None to disable load shedding"""
+    if not name or name == "none":
+        return None
+    if name not in POLICIES:
+        logger.warning(f"Unknown backpressure policy {name}, expected one of {list(POLICIES)}")
+        return None
+    if name == StridePolicy.name:
+        return StridePolicy(max_pending=max_pending, max_stride=max_stride)
+    return POLICIES[name](max_pending=max_pending)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from . import metrics, ws_protocol
+
+logger = logging.getLogger("arroyo_reduction.client_queue")
+
+# What to do when a client's queue is full
+POLICY_COALESCE = "coalesce"  # merge the queued batches of a session, then drop the oldest frames
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DISCONNECT = "disconnect"
+POLICIES = (POLICY_COALESCE, POLICY_DROP_OLDEST, POLICY_DISCONNECT)
+
+
+class OutboundFrame:
+    """
+    A frame queued for one or more clients: either a legacy JSON text event, or
+    a batch with the session it belongs to. Batches are encoded at most once per
+    protocol, by the first writer that sends them.
+    """
+
+    def __init__(self, text: str = None, session: dict = None, batch: dict = None, enqueued_at: float = None):
+        self.text = text
+        self.session = session
+        self.batch = batch
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        self._encoded = {}
+
+    def payload(self, protocol: str):
+        if self.text is not None:
+            return self.text
+        if protocol not in self._encoded:
+            with metrics.STAGE_SECONDS.time(stage="serialize"):
+                self._encoded[protocol] = ws_protocol.encode(self.batch, protocol)
+        return self._encoded[protocol]
+
+    def merge(self, other: "OutboundFrame") -> "OutboundFrame":
+        """A frame holding the points of this batch followed by those of other"""
+        return OutboundFrame(
+            session=self.session,
+            batch=ws_protocol.merge_batches(self.batch, other.batch),
+            enqueued_at=self.enqueued_at,
+        )
+
+
+class ClientSendQueue:
+    """
+    Bounded outbound queue and writer task of one websocket client.
+
+    The publisher only ever puts frames in the queue, so a client that reads
+    slowly holds up its own writer and nothing else. When the queue is full
+    the policy decides between coalescing, shedding the oldest frames and
+    disconnecting the client.
+    """
+
+    def __init__(self, websocket, max_frames: int = 64, policy: str = POLICY_COALESCE):
+        if policy not in POLICIES:
+            logger.warning(f"Unknown client queue policy {policy}, expected one of {POLICIES}")
+            policy = POLICY_COALESCE
+        self.websocket = websocket
+        self.protocol = websocket.subprotocol
+        self.max_frames = max(1, int(max_frames))
+        self.policy = policy
+        self.name = self._client_name(websocket)
+        self.dropped = 0
+        self.session_id = None
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._writer = None
+
+        metrics.CLIENT_QUEUE_DEPTH.set_function(lambda: len(self._queue), client=self.name)
+        metrics.CLIENT_LAG_SECONDS.set_function(self.lag, client=self.name)
+
+    @staticmethod
+    def _client_name(websocket) -> str:
+        address = getattr(websocket, "remote_address", None)
+        if isinstance(address, tuple) and len(address) >= 2:
+            return f"{address[0]}:{address[1]}"
+        return str(id(websocket))
+
+    def __len__(self):
+        return len(self._queue)
+
+    def lag(self) -> float:
+        """Seconds the oldest queued frame has waited"""
+        return time.monotonic() - self._queue[0].enqueued_at if self._queue else 0.0
+
+    def start(self) -> None:
+        self._writer = asyncio.ensure_future(self._write())
+
+    def stop(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        self._queue.clear()
+        for metric in (metrics.CLIENT_QUEUE_DEPTH, metrics.CLIENT_LAG_SECONDS, metrics.CLIENT_FRAMES_DROPPED):
+            metric.remove(client=self.name)
+
+    def put(self, frame: OutboundFrame) -> None:
+        self._queue.append(frame)
+        if len(self._queue) > self.max_frames:
+            self._overflow()
+        self._ready.set()
+
+    def _overflow(self) -> None:
+        if self.policy == POLICY_DISCONNECT:
+            logger.warning(f"Client {self.name} is {self.lag():.1f}s behind, disconnecting it")
+            self._count_dropped(len(self._queue))
+            self._queue.clear()
+            asyncio.ensure_future(self.websocket.close(code=1008, reason="client too slow"))
+            return
+
+        if self.policy == POLICY_COALESCE:
+            self._coalesce()
+        while len(self._queue) > self.max_frames:
+            frame = self._queue.popleft()
+            self._count_dropped(frame.batch["count"] if frame.batch is not None else 1)
+
+    def _coalesce(self) -> None:
+        """Merge consecutive batches of the same session, keeping every point"""
+        merged = deque()
+        for frame in self._queue:
+            previous = merged[-1] if merged else None
+            if (
+                previous is not None
+                and previous.batch is not None
+                and frame.batch is not None
+                and previous.batch["session"] == frame.batch["session"]
+            ):
+                merged[-1] = previous.merge(frame)
+            else:
+                merged.append(frame)
+        self._queue = merged
+
+    def _count_dropped(self, count: int) -> None:
+        if self.dropped == 0:
+            logger.warning(f"Client {self.name} is too slow, dropping queued events ({self.policy})")
+        self.dropped += count
+        metrics.CLIENT_FRAMES_DROPPED.inc(count, client=self.name)
+
+    async def _write(self) -> None:
+        while True:
+            await self._ready.wait()
+            if not self._queue:
+                self._ready.clear()
+                continue
+            frame = self._queue.popleft()
+            try:
+                start = time.perf_counter()
+                if frame.session is not None and frame.session["session"] != self.session_id:
+                    # The batches reference the tiled_url and model names sent in the session frame
+                    await self.websocket.send(ws_protocol.encode(frame.session, self.protocol))
+                    self.session_id = frame.session["session"]
+                await self.websocket.send(frame.payload(self.protocol))
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="websocket_send")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"Stopped sending to client {self.name}: {e}")
+                self._queue.clear()
+                return
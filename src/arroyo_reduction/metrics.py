@@ -0,0 +1,232 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("arroyo_reduction.metrics")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    """A named metric with optional labels, rendered in the Prometheus text format"""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._functions = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def set_function(self, function, **labels) -> None:
+        """Read the value from function() whenever the metrics are collected"""
+        self._functions[self._key(labels)] = function
+
+    def remove(self, **labels) -> None:
+        """Forget the value with these labels, e.g. of a client that disconnected"""
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+        self._functions.pop(key, None)
+
+    def get(self, **labels):
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self._values.get(key, 0)
+
+    def _samples(self):
+        with self._lock:
+            samples = dict(self._values)
+        for key, function in list(self._functions.items()):
+            try:
+                samples[key] = function()
+            except Exception as e:
+                logger.debug(f"Could not collect {self.name}{key}: {e}")
+        return samples
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {float(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time spent in the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get(self, **labels) -> tuple:
+        """(count, sum) of the observations with these labels"""
+        counts, total = self._values.get(self._key(labels), ([0], 0.0))
+        return sum(counts), total
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total) in sorted(self._samples().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        # Registering a metric twice returns the existing one, e.g. when a module is reloaded
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+FRAMES_RECEIVED = REGISTRY.counter("lse_frames_received_total", "Frames received from the detector")
+EVENTS_PUBLISHED = REGISTRY.counter("lse_events_published_total", "Latent space events published")
+FRAMES_DROPPED = REGISTRY.counter(
+    "lse_frames_dropped_total", "Frames received but never published", ["reason"]
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "lse_stage_duration_seconds",
+    "Time spent per frame (or per batch) in each processing stage",
+    ["stage"],
+)
+FRAME_LAG_SECONDS = REGISTRY.histogram(
+    "lse_frame_lag_seconds", "Time from a frame's arrival to the publishing of its event"
+)
+REORDER_WAIT_SECONDS = REGISTRY.histogram(
+    "lse_reorder_wait_seconds", "Time a finished result waited to be published in frame order"
+)
+MODEL_SWAP_SECONDS = REGISTRY.histogram(
+    "lse_model_swap_seconds",
+    "Time from a model update to serving the new model",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+MODEL_TIME_TO_FIRST_RESULT = REGISTRY.histogram(
+    "lse_model_time_to_first_result_seconds",
+    "Time from a model update (or the reducer starting) to the first frame reduced by the new pair",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+MODELS_PREFETCHED = REGISTRY.gauge("lse_models_prefetched", "Live mode models in the disk cache")
+MODEL_CACHE = REGISTRY.gauge(
+    "lse_model_cache", "Hits, misses, evictions, entries and bytes of the in-memory model cache", ["stat"]
+)
+QUEUE_DEPTH = REGISTRY.gauge("lse_queue_depth", "Frames or requests waiting in each queue", ["queue"])
+CONNECTED_CLIENTS = REGISTRY.gauge("lse_websocket_clients", "Connected websocket clients")
+CLIENT_QUEUE_DEPTH = REGISTRY.gauge(
+    "lse_websocket_client_queue_depth", "Frames waiting in each websocket client's send queue", ["client"]
+)
+CLIENT_LAG_SECONDS = REGISTRY.gauge(
+    "lse_websocket_client_lag_seconds", "Age of the oldest frame in each websocket client's send queue", ["client"]
+)
+CLIENT_FRAMES_DROPPED = REGISTRY.counter(
+    "lse_websocket_client_events_dropped_total", "Events dropped because a websocket client was too slow", ["client"]
+)
+
+
+async def start_metrics_server(host: str = "0.0.0.0", port: int = 9100, registry: MetricsRegistry = REGISTRY):
+    """Serve the registry in the Prometheus text format on http://host:port/metrics"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Drain the headers, the request body is never needed
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Error serving metrics: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Metrics server started at http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,71 @@
+import logging
+import threading
+
+from src.utils.mlflow_utils import MLflowClient
+
+from . import metrics
+
+logger = logging.getLogger("arroyo_reduction.model_prefetch")
+
+
+class ModelPrefetcher:
+    """
+    Keeps every live mode model in the shared disk cache, so that selecting a
+    model in the live dialog only has to deserialize it rather than download it.
+
+    A daemon thread lists the models offered by get_mlflow_models(livemode=True)
+    every interval_s seconds and downloads the latest version of those not
+    cached yet, one at a time so it does not compete with a selected model for
+    bandwidth. Models are not loaded into memory. Prefetching only fills free
+    room in the disk cache: it never evicts a cached model nor marks one as
+    used, so the models actually in use are kept.
+    """
+
+    def __init__(self, mlflow_client: MLflowClient = None, interval_s: float = 300):
+        self.mlflow_client = mlflow_client
+        self.interval = max(1.0, float(interval_s))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name="lse-model-prefetch")
+        self._thread.start()
+        logger.info(f"Prefetching live mode models every {self.interval:.0f}s")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        if self.mlflow_client is None:
+            self.mlflow_client = MLflowClient()
+        while not self._stop.is_set():
+            self.prefetch_once()
+            self._stop.wait(self.interval)
+
+    def prefetch_once(self) -> int:
+        """Download the live mode models missing from the disk cache, returns how many are cached"""
+        try:
+            options = self.mlflow_client.get_mlflow_models(livemode=True)
+        except Exception as e:
+            logger.warning(f"Could not list live mode models to prefetch: {e}")
+            return 0
+
+        cached = 0
+        for option in options:
+            if self._stop.is_set():
+                break
+            model_name = option.get("value")
+            if model_name is None:
+                # The placeholder option shown when MLflow could not be reached
+                continue
+            if self.mlflow_client.prefetch_model(model_name):
+                cached += 1
+        metrics.MODELS_PREFETCHED.set(cached)
+        logger.debug(f"{cached} of {len(options)} live mode models in the disk cache")
+        return cached
+
+    @classmethod
+    def from_settings(cls, settings) -> "ModelPrefetcher":
+        return cls(interval_s=settings.get("interval_s", 300))
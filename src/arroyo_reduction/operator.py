@@ -1,26 +1,119 @@
 import asyncio
 import logging
 import os
+import time
+from collections import Counter, deque
 
-import msgpack
+import numpy as np
 import redis
 import zmq
 from arroyopy.operator import Operator
 from arroyopy.schemas import Start, Stop
 from arroyosas.schemas import RawFrameEvent, SASMessage
 
+from . import metrics
+from .backpressure import BackpressurePolicy, make_policy
+from .pending_queue import PendingFrameQueue
 from .reducer import LatentSpaceReducer, Reducer
 from .schemas import LatentSpaceEvent
-from .redis_model_store import RedisModelStore  # Import the RedisModelStore class
+from .worker_pool import ReducerWorkerPool
+from .redis_model_store import ModelSelectionCache, RedisModelStore
 
 logger = logging.getLogger("arroyo_reduction.operator")
 
 
+class _InFlightRequest:
+    """Frames submitted for reduction together and the task producing their events"""
+
+    __slots__ = ("messages", "task", "completed_at")
+
+    def __init__(self, messages, task):
+        self.messages = messages
+        self.task = task
+        self.completed_at = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task):
+        self.completed_at = time.monotonic()
+
+
 class LatentSpaceOperator(Operator):
-    def __init__(self, proxy_socket: zmq.Socket, reducer: Reducer):
+    def __init__(
+        self,
+        proxy_socket: zmq.Socket,
+        reducer: Reducer,
+        batch_size: int = 1,
+        batch_max_wait_ms: float = 50,
+        pending_queue: PendingFrameQueue = None,
+        replay_poll_interval: float = 0.1,
+        max_hold_s: float = 600,
+        selection_reconcile_interval: float = 30.0,
+        worker_pool: ReducerWorkerPool = None,
+        max_in_flight: int = 1,
+        reorder_timeout_ms: float = 1000,
+        backpressure: BackpressurePolicy = None,
+        max_lag_ms: float = 0,
+    ):
         super().__init__()
         self.proxy_socket = proxy_socket
         self.reducer = reducer
+
+        # With a worker pool, frames are reduced in worker processes instead of by self.reducer
+        self.worker_pool = worker_pool
+
+        # In-flight pipeline: up to max_in_flight requests (a frame or a batch) are
+        # reduced while the next frames are read, and their events are published in
+        # the order the frames arrived. A request that is still not done
+        # reorder_timeout_ms after reaching the head of the queue stops blocking the
+        # ones behind it and is published late. A timeout of 0 waits indefinitely.
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.reorder_timeout = reorder_timeout_ms / 1000.0 if reorder_timeout_ms else None
+        self._in_flight = deque()
+        self._in_flight_slots = None
+        self._result_publisher = None
+        self._late_publishers = set()
+        # Pipeline metrics
+        self.max_in_flight_seen = 0
+        self.late_frames = 0
+        self.reorder_wait_count = 0
+        self.reorder_wait_total = 0.0
+        self.reorder_wait_max = 0.0
+
+        # Load shedding: when the pipeline is full, arriving frames wait in the
+        # backpressure policy's buffer, which sheds frames instead of stalling the
+        # listener. Frames older than max_lag_ms when they leave the buffer are
+        # skipped as stale (0 disables). Without a policy the listener waits.
+        self.backpressure = backpressure
+        self.max_lag = max_lag_ms / 1000.0 if max_lag_ms else None
+        self._feeder = None
+        # Arrival time and sampling of each frame in the pipeline, by id(message)
+        self._frame_meta = {}
+        # Arrival to publish lag
+        self.lag_count = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_lag = None
+
+        # Micro-batching: frames are collected until batch_size frames are pending
+        # or batch_max_wait_ms has elapsed since the first pending frame.
+        # A batch_size of 1 keeps the frame-by-frame behavior.
+        self.batch_size = max(1, int(batch_size))
+        self.batch_max_wait = batch_max_wait_ms / 1000.0
+        self._pending_batch = []
+        self._batch_timer = None
+        self._batch_lock = asyncio.Lock()
+
+        # Frames that arrive while the reducer has no models yet wait here and
+        # are replayed in order once it has
+        self.pending_frames = pending_queue if pending_queue is not None else PendingFrameQueue()
+        self.replay_poll_interval = replay_poll_interval
+        self._replay_task = None
+        # Held frames are dropped if the models have not loaded after max_hold_s (0 waits
+        # indefinitely), and later frames are dropped too until they load or the selection changes
+        self.max_hold = max_hold_s if max_hold_s else None
+        self._hold_expired_for = None
+        # Frames that were received but never published, by reason
+        self.dropped_frames = Counter()
         
         # Initialize RedisModelStore instead of direct Redis client
         try:
@@ -28,91 +121,505 @@ class LatentSpaceOperator(Operator):
             self.redis_port = int(os.getenv("REDIS_PORT", 6666))
             self.redis_model_store = RedisModelStore(host=self.redis_host, port=self.redis_port)
             logger.info(f"Connected to Redis Model Store at {self.redis_host}:{self.redis_port}")
+            # Frames are checked against an in-memory copy of the selection kept current by pub/sub
+            self.model_selection = ModelSelectionCache(
+                self.redis_model_store, reconcile_interval=selection_reconcile_interval
+            )
         except Exception as e:
             logger.warning(f"Could not connect to Redis Model Store: {e}")
             self.redis_model_store = None
+            self.model_selection = None
+
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self.pending_frames), queue="pending")
+        metrics.QUEUE_DEPTH.set_function(
+            lambda: len(self.backpressure) if self.backpressure is not None else 0, queue="intake"
+        )
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._pending_batch), queue="batch")
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._in_flight), queue="in_flight")
+        if self.worker_pool is not None:
+            metrics.QUEUE_DEPTH.set_function(lambda: self.worker_pool.in_flight, queue="worker_pool")
 
     async def process(self, message: SASMessage) -> None:
         # logger.debug("message recvd")
         if isinstance(message, Start):
             logger.info("Received Start Message")
+            # Frames still waiting from a previous run must not show up in the new one
+            self.pending_frames.clear(reason="new_run")
+            await self.drain_intake()
+            await self.drain_in_flight()
             await self.publish(message)
         elif isinstance(message, RawFrameEvent):
-            result = await self.dispatch(message)
-            if result is not None:  # Only publish if we got a valid result
-                await self.publish(result)
+            metrics.FRAMES_RECEIVED.inc()
+            # The time the listener is held up by each frame
+            with metrics.STAGE_SECONDS.time(stage="receive"):
+                await self.handle_frame(message)
         elif isinstance(message, Stop):
             logger.info("Received Stop Message")
+            # Flush any frames still waiting for a batch before signalling the end
+            await self.drain_intake()
+            await self.flush_batch()
+            await self.drain_in_flight()
+            if len(self.pending_frames):
+                logger.info(f"{len(self.pending_frames)} frames still waiting for models at Stop")
             await self.publish(message)
         else:
             logger.warning(f"Unknown message type: {type(message)}")
         return None
 
+    async def handle_frame(self, message: RawFrameEvent) -> None:
+        """Process a frame, or hold it in the pending queue while the reducer has no models"""
+        # Once frames are waiting, later frames queue behind them to keep the order
+        if self._replay_task is not None or len(self.pending_frames) or self._awaiting_models():
+            if self._hold_expired_for is not None and self._hold_expired_for == self._selected_models():
+                self._count_dropped("model_load_failed")
+                return
+            self.hold_frame(message)
+            return
+        self._hold_expired_for = None
+        await self._process_frame(message)
+
+    async def _process_frame(self, message: RawFrameEvent) -> None:
+        if self.backpressure is None:
+            self._frame_meta[id(message)] = (time.monotonic(), None, 0)
+            await self._enter_pipeline(message)
+            return
+
+        shed = self.backpressure.offer(message, time.monotonic())
+        if shed:
+            self._count_dropped("load_shed", shed)
+        if self._feeder is None:
+            self._feeder = asyncio.create_task(self._feed_pipeline())
+
+    async def _enter_pipeline(self, message: RawFrameEvent) -> None:
+        if self.batch_size > 1:
+            await self.add_to_batch(message)
+        else:
+            await self.submit([message])
+
+    async def _feed_pipeline(self) -> None:
+        """Move frames from the backpressure buffer into the pipeline as it has room"""
+        try:
+            while True:
+                item = self.backpressure.take()
+                if item is None:
+                    break
+                message, arrived_at, skipped = item
+                if self.max_lag is not None and time.monotonic() - arrived_at > self.max_lag:
+                    self._count_dropped("stale")
+                    self.backpressure.skip(skipped + 1)
+                    continue
+                self._frame_meta[id(message)] = (arrived_at, self.backpressure.describe(), skipped)
+                await self._enter_pipeline(message)
+        except Exception as e:
+            logger.error(f"Error feeding frames to the pipeline: {e}")
+        finally:
+            self._feeder = None
+
+    async def drain_intake(self) -> None:
+        """Wait until the frames in the backpressure buffer have entered the pipeline"""
+        while self._feeder is not None:
+            await asyncio.shield(self._feeder)
+
+    def _record_lag(self, messages: list[RawFrameEvent]) -> None:
+        """Record the arrival to publish lag of frames whose events were just published"""
+        now = time.monotonic()
+        for message in messages:
+            meta = self._frame_meta.pop(id(message), None)
+            if meta is None:
+                continue
+            lag = now - meta[0]
+            self.lag_count += 1
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            self.last_lag = lag
+            metrics.FRAME_LAG_SECONDS.observe(lag)
+
+    def hold_frame(self, message: RawFrameEvent) -> None:
+        """Queue a frame until the reducer has models and make sure it gets replayed"""
+        self.pending_frames.put(message)
+        if self._replay_task is None:
+            logger.info("Reducer has no models yet, holding frames until it has")
+            self._replay_task = asyncio.create_task(self._replay_pending())
+
+    async def _replay_pending(self) -> None:
+        """Replay held frames in arrival order once the reducer has models"""
+        replayed = 0
+        waiting_for, held_since = None, time.monotonic()
+        try:
+            while len(self.pending_frames):
+                selected = self._selected_models()
+                if selected is not None and not all(selected):
+                    # Live processing was switched off while frames were waiting
+                    self.pending_frames.clear(reason="offline")
+                    break
+                if self._awaiting_models(selected):
+                    if selected != waiting_for:
+                        # A newly selected pair gets the whole max_hold_s to load
+                        waiting_for, held_since = selected, time.monotonic()
+                    elif self.max_hold is not None and time.monotonic() - held_since > self.max_hold:
+                        logger.error(
+                            f"Models {selected} still not loaded after {self.max_hold:.0f}s, "
+                            f"dropping {len(self.pending_frames)} held frames"
+                        )
+                        self.pending_frames.clear(reason="model_load_failed")
+                        self._hold_expired_for = selected
+                        break
+                    await asyncio.sleep(self.replay_poll_interval)
+                    continue
+                message = await self.pending_frames.get_async()
+                if message is not None:
+                    await self._process_frame(message)
+                    replayed += 1
+        except Exception as e:
+            logger.error(f"Error replaying pending frames: {e}")
+        finally:
+            self._replay_task = None
+            logger.info(f"Replayed {replayed} pending frames, frame stats: {self.frame_stats()}")
+
+    def pipeline_stats(self) -> dict:
+        """Depth of the in-flight queue and how long finished results waited to be published in order"""
+        return {
+            "in_flight": len(self._in_flight),
+            "max_in_flight": self.max_in_flight,
+            "max_in_flight_seen": self.max_in_flight_seen,
+            "late_frames": self.late_frames,
+            "reorder_wait_ms_mean": (
+                1000 * self.reorder_wait_total / self.reorder_wait_count if self.reorder_wait_count else 0.0
+            ),
+            "reorder_wait_ms_max": 1000 * self.reorder_wait_max,
+            "intake": len(self.backpressure) if self.backpressure is not None else 0,
+            "lag_ms_last": 1000 * self.last_lag if self.last_lag is not None else None,
+            "lag_ms_mean": 1000 * self.lag_total / self.lag_count if self.lag_count else 0.0,
+            "lag_ms_max": 1000 * self.lag_max,
+        }
+
+    def _count_dropped(self, reason: str, count: int = 1) -> None:
+        self.dropped_frames[reason] += count
+        metrics.FRAMES_DROPPED.inc(count, reason=reason)
+
+    async def _publish_events(self, events: list[LatentSpaceEvent]) -> None:
+        for event in events:
+            await self.publish(event)
+        metrics.EVENTS_PUBLISHED.inc(len(events))
+
+    def frame_stats(self) -> dict:
+        """Pending queue occupancy and the number of dropped frames by reason"""
+        stats = self.pending_frames.stats()
+        stats["dropped"] = dict(self.dropped_frames + self.pending_frames.dropped)
+        return stats
+
+    def _selected_models(self) -> tuple:
+        """The (autoencoder, dimred) names selected in Redis, or None if the store is unavailable"""
+        if self.model_selection is None:
+            return None
+        return self.model_selection.get()
+
+    def _models_selected(self) -> bool:
+        """Check whether live processing is enabled (both models are set)"""
+        # Use the RedisModelStore instead of direct Redis client
+        selected = self._selected_models()
+        if selected is not None:
+            # Check if processing is disabled (by checking if models are set)
+            return all(selected)
+
+        # Model store couldn't be initialized, log a warning but continue processing
+        logger.debug("Redis Model Store not available, proceeding with processing")
+        return True
+
+    def _awaiting_models(self, selected: tuple = None) -> bool:
+        """
+        Whether frames have to wait because the reducer has no models yet.
+        During a hot swap the previous pair keeps serving until the selected
+        one is swapped in, so frames are not held then.
+        """
+        if self.worker_pool is not None:
+            # Each worker waits for the selected pair itself before reducing
+            return False
+        selected = selected or self._selected_models()
+        if selected is None or not all(selected):
+            # Without a store or in offline mode there is nothing to wait for
+            return False
+        return not self._reducer_ready()
+
+    def _reducer_ready(self) -> bool:
+        """
+        Check whether the reducer has models to serve frames with. A model that
+        is loading in the background does not block processing: the previous
+        model keeps serving until the new one is swapped in.
+        """
+        if hasattr(self.reducer, "is_ready") and not self.reducer.is_ready():
+            logger.info("Reducer has no models loaded yet, cannot process frames")
+            return False
+        return True
+
+    def _model_snapshot(self) -> tuple:
+        """The model pair a frame is reduced with, so events carry the right model names"""
+        if hasattr(self.reducer, "model_snapshot"):
+            return self.reducer.model_snapshot()
+        return (self.reducer.autoencoder_model_name, None, self.reducer.dimred_model_name, None)
+
+    def _build_event(self, message: RawFrameEvent, feature_vector, models: tuple) -> LatentSpaceEvent:
+        """Wrap a reduced feature vector into a LatentSpaceEvent for publishing"""
+        autoencoder_name, _, dimred_name, _ = models
+        _, sampling_policy, frames_skipped = self._frame_meta.get(id(message), (None, None, 0))
+        return LatentSpaceEvent(
+            tiled_url=message.tiled_url,
+            feature_vector=feature_vector.tolist(),
+            index=message.frame_number,
+            autoencoder_model=autoencoder_name,
+            dimred_model=dimred_name,
+            sampling_policy=sampling_policy,
+            frames_skipped=frames_skipped,
+        )
+
+    def _reduce(self, message: RawFrameEvent, models: tuple):
+        if models[1] is None:
+            return self.reducer.reduce(message)
+        return self.reducer.reduce(message, models)
+
+    def _reduce_batch(self, messages: list[RawFrameEvent], models: tuple):
+        if models[1] is None:
+            return self.reducer.reduce_batch(messages)
+        return self.reducer.reduce_batch(messages, models)
+
     async def dispatch(self, message: RawFrameEvent) -> LatentSpaceEvent:
         try:
-            # Use the RedisModelStore instead of direct Redis client
-            if self.redis_model_store is not None:
-                # Check if processing is disabled (by checking if models are set)
-                autoencoder_model = self.redis_model_store.get_autoencoder_model()
-                dimred_model = self.redis_model_store.get_dimred_model()
-                
-                if not autoencoder_model or not dimred_model:
-                    logger.info(f"In offline mode - skipping frame {message.frame_number}")
-                    return None
-            else:
-                # Model store couldn't be initialized, log a warning but continue processing
-                logger.debug("Redis Model Store not available, proceeding with processing")
-                
-            # Existing loading check
-            if hasattr(self.reducer, 'is_loading_model') and self.reducer.is_loading_model:
-                loading_type = self.reducer.loading_model_type or "unknown"
-                logger.info(f"Waiting for {loading_type} model to finish loading before processing frame {message.frame_number}...")
+            if not self._models_selected():
+                logger.info(f"In offline mode - skipping frame {message.frame_number}")
                 return None
-                
-            feature_vector = await asyncio.to_thread(self.reducer.reduce, message)
-            
-            # Get the current model names from the reducer
-            current_autoencoder = self.reducer.autoencoder_model_name
-            current_dimred = self.reducer.dimred_model_name
-            
-            response = LatentSpaceEvent(
-                tiled_url=message.tiled_url,
-                feature_vector=feature_vector[0].tolist(),
-                index=message.frame_number,
-                autoencoder_model=current_autoencoder,  # Add autoencoder model name
-                dimred_model=current_dimred,            # Add dimension reduction model name
-            )
-            return response
+
+            if not self._reducer_ready():
+                self.hold_frame(message)
+                return None
+
+            # Reduce with a consistent model pair, even if a swap happens meanwhile
+            models = self._model_snapshot()
+            feature_vector = await asyncio.to_thread(self._reduce, message, models)
+            if feature_vector is None:
+                self._count_dropped("reduce_error")
+                return None
+
+            # Tag the event with the names of the models that produced it
+            return self._build_event(message, feature_vector[0], models)
         except Exception as e:
             logger.error(f"Error sending message to broker {e}")
+            self._count_dropped("dispatch_error")
             return None
 
-    async def dispatch_workers(self, message: RawFrameEvent) -> LatentSpaceEvent:
-        """Dispatch the message to the worker and return the response. This is applicable
-        when the reducer is setup to run in a zqm req/rep worker pool. Currently unsupported."""
+    async def dispatch_batch(self, messages: list[RawFrameEvent]) -> list[LatentSpaceEvent]:
+        """Run a batch of frames through the reducer in one call and split the
+        results back into per-frame events, preserving each frame_number."""
+        try:
+            if not self._models_selected():
+                logger.info(f"In offline mode - skipping {len(messages)} frames")
+                return []
+
+            if not self._reducer_ready():
+                for message in messages:
+                    self.hold_frame(message)
+                return []
+
+            models = self._model_snapshot()
+            feature_vectors = await asyncio.to_thread(self._reduce_batch, messages, models)
+            if feature_vectors is None:
+                self._count_dropped("reduce_error", len(messages))
+                return []
+
+            return [
+                self._build_event(message, feature_vector, models)
+                for message, feature_vector in zip(messages, feature_vectors)
+            ]
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(messages)} frames: {e}")
+            self._count_dropped("dispatch_error", len(messages))
+            return []
+
+    async def add_to_batch(self, message: RawFrameEvent) -> None:
+        """Queue a frame for batched inference, flushing when the batch is full"""
+        self._pending_batch.append(message)
+        if len(self._pending_batch) >= self.batch_size:
+            await self.flush_batch()
+        elif self._batch_timer is None:
+            # First frame of a new batch: make sure it waits at most batch_max_wait
+            self._batch_timer = asyncio.create_task(self._flush_after_timeout())
+
+    async def _flush_after_timeout(self) -> None:
+        await asyncio.sleep(self.batch_max_wait)
+        self._batch_timer = None
+        await self.flush_batch()
+
+    async def flush_batch(self) -> None:
+        """Reduce all pending frames as one batch and publish the resulting events"""
+        if self._batch_timer is not None and self._batch_timer is not asyncio.current_task():
+            self._batch_timer.cancel()
+        self._batch_timer = None
+
+        async with self._batch_lock:
+            messages, self._pending_batch = self._pending_batch, []
+            if not messages:
+                return
+            logger.debug(f"Flushing batch of {len(messages)} frames")
+            await self.submit(messages)
+
+    async def submit(self, messages: list[RawFrameEvent]) -> None:
+        """
+        Start reducing frames without waiting for the result. Waits only while
+        max_in_flight requests are queued; the events are published in order
+        by the result publisher.
+        """
+        if self._in_flight_slots is None:
+            self._in_flight_slots = asyncio.Semaphore(self.max_in_flight)
+        await self._in_flight_slots.acquire()
 
         try:
-            message = message.model_dump()
-            message = msgpack.packb(message, use_bin_type=True)
-            await self.proxy_socket.send(message)
-            # logger.debug("sent frame to broker")
-            response = await self.proxy_socket.recv()
-            if response == b"ERROR":
-                logger.debug("Worker reported an error")
-                return None
-            # logger.debug("response from broker")
-            return LatentSpaceEvent(**msgpack.unpackb(response))
+            if self.worker_pool is not None:
+                future = await self.worker_pool.submit(messages)
+                task = asyncio.create_task(self._events_from_pool(messages, future))
+            else:
+                task = asyncio.create_task(self._events_in_process(messages))
+        except Exception:
+            self._in_flight_slots.release()
+            raise
+
+        self._in_flight.append(_InFlightRequest(messages, task))
+        self.max_in_flight_seen = max(self.max_in_flight_seen, len(self._in_flight))
+        if self._result_publisher is None:
+            self._result_publisher = asyncio.create_task(self._publish_in_order())
+
+    async def _events_in_process(self, messages: list[RawFrameEvent]) -> list[LatentSpaceEvent]:
+        if len(messages) == 1:
+            event = await self.dispatch(messages[0])
+            return [event] if event is not None else []
+        return await self.dispatch_batch(messages)
+
+    async def _events_from_pool(self, messages: list[RawFrameEvent], future: asyncio.Future) -> list[LatentSpaceEvent]:
+        return self._events_from_reply(messages, await future)
+
+    async def _publish_in_order(self) -> None:
+        """Publish the events of in-flight requests in submission order"""
+        try:
+            while self._in_flight:
+                request = self._in_flight[0]
+                try:
+                    events = await asyncio.wait_for(asyncio.shield(request.task), self.reorder_timeout)
+                except asyncio.TimeoutError:
+                    # A straggler: let the requests behind it through and publish it when it is done
+                    self._in_flight.popleft()
+                    self._in_flight_slots.release()
+                    self.late_frames += len(request.messages)
+                    logger.warning(
+                        f"Frames {[m.frame_number for m in request.messages]} not reduced after "
+                        f"{self.reorder_timeout}s, publishing them out of order"
+                    )
+                    late_publisher = asyncio.create_task(self._publish_late(request))
+                    self._late_publishers.add(late_publisher)
+                    late_publisher.add_done_callback(self._late_publishers.discard)
+                    continue
+                except Exception as e:
+                    logger.error(f"Error reducing frames: {e}")
+                    self._count_dropped("dispatch_error", len(request.messages))
+                    events = []
+
+                self._in_flight.popleft()
+                self._in_flight_slots.release()
+                wait = time.monotonic() - request.completed_at
+                self.reorder_wait_count += 1
+                self.reorder_wait_total += wait
+                self.reorder_wait_max = max(self.reorder_wait_max, wait)
+                metrics.REORDER_WAIT_SECONDS.observe(wait)
+                await self._publish_events(events)
+                self._record_lag(request.messages)
+        finally:
+            self._result_publisher = None
+
+    async def _publish_late(self, request: _InFlightRequest) -> None:
+        try:
+            await self._publish_events(await request.task)
+        except Exception as e:
+            logger.error(f"Error reducing frames: {e}")
+            self._count_dropped("dispatch_error", len(request.messages))
+        finally:
+            self._record_lag(request.messages)
+
+    async def drain_in_flight(self) -> None:
+        """Wait until the events of all submitted frames have been published"""
+        while self._result_publisher is not None or self._late_publishers:
+            await asyncio.gather(
+                *([asyncio.shield(self._result_publisher)] if self._result_publisher else []),
+                *self._late_publishers,
+            )
+
+    def _events_from_reply(self, messages: list[RawFrameEvent], reply: dict) -> list[LatentSpaceEvent]:
+        """Turn a worker reply into one event per frame, counting the frames of failed requests"""
+        if "error" in reply:
+            logger.debug(f"Worker reported an error for {len(messages)} frames: {reply['error']}")
+            self._count_dropped(reply["error"], len(messages))
+            return []
+
+        feature_vectors = reply["feature_vectors"]
+        if len(feature_vectors) != len(messages):
+            logger.error(f"Worker returned {len(feature_vectors)} feature vectors for {len(messages)} frames")
+            self._count_dropped("reduce_error", len(messages))
+            return []
+
+        for stage, seconds in reply.get("timings", {}).items():
+            metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+        if reply.get("time_to_first_result") is not None:
+            metrics.MODEL_TIME_TO_FIRST_RESULT.observe(reply["time_to_first_result"])
+
+        models = (reply["autoencoder_model"], None, reply["dimred_model"], None)
+        return [
+            self._build_event(message, np.asarray(feature_vector), models)
+            for message, feature_vector in zip(messages, feature_vectors)
+        ]
+
+    async def dispatch_workers(self, message: RawFrameEvent) -> LatentSpaceEvent:
+        """Dispatch a single frame to the worker pool and wait for its event"""
+        try:
+            future = await self.worker_pool.submit([message])
+            events = self._events_from_reply([message], await future)
+            return events[0] if events else None
         except Exception as e:
             logger.error(f"Error sending message to broker {e}")
+            self._count_dropped("dispatch_error")
+            return None
 
     @classmethod
     def from_settings(cls, settings, reducer_settings=None):
-        # Connect to the ZMQ Router/Dealer as a client
-        context = zmq.asyncio.Context()
-        socket = context.socket(zmq.REQ)
-        socket.setsockopt(zmq.SNDHWM, 10000)  # Allow up to 10,000 messages
-        socket.setsockopt(zmq.RCVHWM, 10000)
-        # socket.connect(settings.zmq_broker.router_address)
-        # logger.info(f"Connected to broker at {settings.zmq_broker.router_address}")
-        reducer = LatentSpaceReducer()
-        return cls(socket, reducer)
\ No newline at end of file
+        pool_settings = settings.get("worker_pool", {})
+        if pool_settings.get("num_workers", 0) > 0:
+            # Reduce in worker processes behind a ROUTER/DEALER broker; the
+            # models are loaded by the workers, not in this process
+            worker_pool = ReducerWorkerPool.from_settings(pool_settings)
+            worker_pool.start()
+            socket, reducer = worker_pool.socket, None
+        else:
+            worker_pool = None
+            socket, reducer = None, LatentSpaceReducer()
+
+        backpressure_settings = settings.get("backpressure", {})
+        kwargs = dict(
+            selection_reconcile_interval=settings.get("selection_reconcile_interval_s", 30),
+            worker_pool=worker_pool,
+            max_in_flight=settings.get("max_in_flight", 1),
+            reorder_timeout_ms=settings.get("reorder_timeout_ms", 1000),
+            backpressure=make_policy(
+                backpressure_settings.get("policy"),
+                max_pending=backpressure_settings.get("max_pending", 32),
+                max_stride=backpressure_settings.get("max_stride", 64),
+            ),
+            max_lag_ms=backpressure_settings.get("max_lag_ms", 0),
+        )
+        if reducer_settings is not None:
+            queue_settings = reducer_settings.get("pending_queue", {})
+            kwargs.update(
+                batch_size=reducer_settings.get("batch_size", 1),
+                batch_max_wait_ms=reducer_settings.get("batch_max_wait_ms", 50),
+                pending_queue=PendingFrameQueue(
+                    max_memory_frames=queue_settings.get("max_memory_frames", 100),
+                    max_disk_frames=queue_settings.get("max_disk_frames", 1000),
+                    spill_dir=queue_settings.get("spill_dir"),
+                ),
+                max_hold_s=queue_settings.get("max_hold_s", 600),
+            )
+        return cls(socket, reducer, **kwargs)
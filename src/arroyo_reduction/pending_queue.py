@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import weakref
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+logger = logging.getLogger("arroyo_reduction.pending_queue")
+
+# Returned by a spill read when the frame could not be written in the first place
+_WRITE_FAILED = object()
+
+
+class PendingFrameQueue:
+    """
+    Bounded FIFO of frames waiting for models to become available.
+
+    The first max_memory_frames frames are kept in memory, the next
+    max_disk_frames are pickled to a directory of their own, created in
+    spill_dir or in the system temp directory. When both are full the oldest
+    frame is dropped to make room, so the queue always holds the most recent
+    frames in arrival order. Every dropped frame is counted by reason in
+    `dropped`.
+
+    Spill files are written, read and removed by a single I/O thread, so the
+    event loop never blocks on the disk. The thread runs its jobs in order,
+    a frame is therefore always read after it was written.
+    """
+
+    def __init__(
+        self,
+        max_memory_frames: int = 100,
+        max_disk_frames: int = 1000,
+        spill_dir: str = None,
+    ):
+        self.max_memory_frames = max(0, int(max_memory_frames))
+        self.max_disk_frames = max(0, int(max_disk_frames))
+        self.spill_dir = spill_dir
+        # Directory of this queue's spill files, created on the first spill
+        self.spill_path = None
+        self.dropped = Counter()
+
+        # Entries are ("memory", message) or ("disk", (path, write_future)), in arrival order
+        self._entries = deque()
+        self._memory_count = 0
+        self._disk_count = 0
+        self._io = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def capacity(self) -> int:
+        return self.max_memory_frames + self.max_disk_frames
+
+    def put(self, message) -> None:
+        """Append a frame, dropping the oldest frame if the queue is full"""
+        if self.capacity == 0:
+            self._drop("queue_disabled")
+            return
+
+        if len(self._entries) >= self.capacity:
+            self._discard(self._entries.popleft())
+            self._drop("queue_full")
+
+        # Order is kept by the entries deque, so a frame can go to whichever tier has room
+        if self._memory_count < self.max_memory_frames:
+            self._entries.append(("memory", message))
+            self._memory_count += 1
+        else:
+            self._spill(message)
+
+    def get(self):
+        """Pop the oldest frame, or return None if the queue is empty"""
+        while self._entries:
+            kind, value = self._entries.popleft()
+            if kind == "memory":
+                self._memory_count -= 1
+                return value
+            self._disk_count -= 1
+            message = self._unspilled(value, self._io.submit(self._read, *value).result())
+            if message is not None:
+                return message
+        return None
+
+    async def get_async(self):
+        """Like get, reading a spilled frame in the I/O thread rather than in the event loop"""
+        while self._entries:
+            kind, value = self._entries.popleft()
+            if kind == "memory":
+                self._memory_count -= 1
+                return value
+            self._disk_count -= 1
+            result = await asyncio.wrap_future(self._io.submit(self._read, *value))
+            message = self._unspilled(value, result)
+            if message is not None:
+                return message
+        return None
+
+    def clear(self, reason: str = None) -> None:
+        """Remove all pending frames, counting them as dropped if a reason is given"""
+        while self._entries:
+            self._discard(self._entries.popleft())
+            if reason:
+                self._drop(reason)
+
+    def flush(self) -> None:
+        """Wait until every spill file submitted so far has been written"""
+        if self._io is not None:
+            self._io.submit(lambda: None).result()
+
+    def close(self) -> None:
+        """Stop the I/O thread and remove this queue's spill directory"""
+        self._entries.clear()
+        self._memory_count = 0
+        self._disk_count = 0
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        if self.spill_path is not None:
+            self._finalizer()
+            self.spill_path = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._entries),
+            "in_memory": self._memory_count,
+            "on_disk": self._disk_count,
+            "dropped": dict(self.dropped),
+        }
+
+    def _spill(self, message) -> None:
+        if self._io is None:
+            try:
+                self._open_spill_dir()
+            except Exception as e:
+                logger.error(f"Could not create a directory for pending frames: {e}")
+                self._drop("spill_write_error")
+                return
+        path = os.path.join(self.spill_path, f"{uuid.uuid4().hex}.pkl")
+        self._entries.append(("disk", (path, self._io.submit(self._write, path, message))))
+        self._disk_count += 1
+
+    def _open_spill_dir(self) -> None:
+        # A directory per queue: several operators or workers on one host never share spill files
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        self.spill_path = tempfile.mkdtemp(prefix="lse_pending_frames-", dir=self.spill_dir)
+        # Spill files do not survive a restart, the directory goes with the queue
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.spill_path, ignore_errors=True)
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pending-frames-io")
+
+    def _unspilled(self, entry, result):
+        """The frame read back from a spill file, or None counting why it was lost"""
+        if result is _WRITE_FAILED:
+            self._drop("spill_write_error")
+            return None
+        if isinstance(result, Exception):
+            logger.error(f"Could not read spilled frame {entry[0]}: {result}")
+            self._drop("spill_read_error")
+            return None
+        return result
+
+    @staticmethod
+    def _write(path, message) -> bool:
+        try:
+            with open(path, "wb") as f:
+                pickle.dump(message, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return True
+        except Exception as e:
+            logger.error(f"Could not spill pending frame to disk: {e}")
+            PendingFrameQueue._remove_file(path)
+            return False
+
+    @staticmethod
+    def _read(path, write_future):
+        # Runs in the I/O thread after the write of the same frame, so its result is known
+        try:
+            if not write_future.result():
+                return _WRITE_FAILED
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            return e
+        finally:
+            PendingFrameQueue._remove_file(path)
+
+    def _discard(self, entry) -> None:
+        kind, value = entry
+        if kind == "memory":
+            self._memory_count -= 1
+        else:
+            self._disk_count -= 1
+            # Queued behind the frame's write, so the file is gone once both ran
+            self._io.submit(self._remove_file, value[0])
+
+    def _drop(self, reason: str) -> None:
+        self.dropped[reason] += 1
+        metrics.FRAMES_DROPPED.inc(reason=reason)
+        # Log the first drop of each kind and then every 100th, a full queue drops one frame per arrival
+        if self.dropped[reason] % 100 == 1:
+            logger.warning(f"Dropped pending frame ({reason}), total dropped: {dict(self.dropped)}")
+
+    @staticmethod
+    def _remove_file(path) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
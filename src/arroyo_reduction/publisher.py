@@ -1,14 +1,14 @@
 import asyncio
-import json
 import logging
-from typing import Union
 
-# import msgpack
-# import numpy as np
 import websockets
 from arroyopy.publisher import Publisher
-from arroyosas.schemas import SASStart, SASStop
+from arroyopy.schemas import Start
+from arroyosas.schemas import SASStart
 
+from . import metrics, ws_protocol
+from .client_queue import POLICY_COALESCE, ClientSendQueue, OutboundFrame
+from .replay_buffer import ReplayBuffer
 from .schemas import LatentSpaceEvent
 
 logger = logging.getLogger("arroyo_reduction.publisher")
@@ -18,18 +18,49 @@ class LSEWSResultPublisher(Publisher):
     """
     A publisher class for sending dimensionality reduction information
 
+    Clients that negotiate one of the ws_protocol subprotocols get the events
+    coalesced over flush_interval_ms into one binary (or base64) batch frame,
+    with the tiled_url and model names sent once per session. Other clients
+    get one JSON text frame per event.
+
+    Every client has its own bounded send queue and writer task (see
+    ClientSendQueue), so a slow client never holds up the others.
+
+    The points of the current session are kept in a ReplayBuffer, a client
+    that connects mid-run gets them in one snapshot frame before the batches.
     """
 
     websocket_server = None
     connected_clients = set()
     current_start_message = None
 
-    def __init__(self, host: str = "localhost", port: int = 8765, path="/lse"):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8765,
+        path="/lse",
+        flush_interval_ms: float = 50,
+        client_queue_size: int = 64,
+        client_queue_policy: str = POLICY_COALESCE,
+        replay_buffer: ReplayBuffer = None,
+    ):
 
         super().__init__()
         self.host = host
         self.port = port
         self.path = path
+        self.flush_interval = max(0.0, flush_interval_ms / 1000)
+        self.client_queue_size = client_queue_size
+        self.client_queue_policy = client_queue_policy
+        # Send queue of each connected client
+        self.client_queues = {}
+        self._session_id = 0
+        self._session_key = None
+        self._session = None
+        self._batch = []
+        self.replay_buffer = replay_buffer if replay_buffer is not None else ReplayBuffer()
+        self._flush_task = None
+        metrics.CONNECTED_CLIENTS.set_function(lambda: len(self.connected_clients))
         logger.info(f"Initialized LSEWSResultPublisher on {self.host}:{self.port}{self.path}")
 
     async def start(
@@ -40,51 +71,123 @@ class LSEWSResultPublisher(Publisher):
             self.websocket_handler,
             self.host,
             self.port,
+            subprotocols=list(ws_protocol.SUBPROTOCOLS),
+            select_subprotocol=ws_protocol.select_subprotocol,
         )
         logger.info(f"Websocket server started at ws://{self.host}:{self.port}")
         await server.wait_closed()
 
     async def publish(self, message: LatentSpaceEvent) -> None:
-        if self.connected_clients:  # Only send if there are clients connected
-            asyncio.gather(
-                *(self.publish_ws(client, message) for client in self.connected_clients)
-            )
-
-    async def publish_ws(
-        self,
-        client,
-        message: Union[LatentSpaceEvent | SASStart | SASStop],
-    ) -> None:
-        if isinstance(message, SASStop):
-            # logger.info(f"WS Sending Stop {message}")
-            # self.current_start_message = None
-            # await client.send(json.dumps(message.model_dump()))
+        if isinstance(message, LatentSpaceEvent):
+            legacy_queues = [queue for queue in self.client_queues.values() if queue.protocol is None]
+            if legacy_queues:
+                # Serialize once for all clients rather than once per client
+                with metrics.STAGE_SECONDS.time(stage="serialize"):
+                    frame = OutboundFrame(text=message.model_dump_json())
+                for queue in legacy_queues:
+                    queue.put(frame)
+            # Batched even without clients, for the replay buffer
+            self._add_to_batch(message)
             return
 
-        if isinstance(message, SASStart):
-            # self.current_start_message = message
-            # logger.info(f"WS Sending Start {message}")
-            # await client.send(json.dumps(message.model_dump()))
+        if isinstance(message, (Start, SASStart)):
+            # A new run starts a new session, late joiners must not see the previous run
+            self.flush()
+            self.current_start_message = message
+            self._session_key = None
+            self.replay_buffer.reset()
+        # Start and Stop are not forwarded, clients learn of a new run from its session frame
+
+    def _add_to_batch(self, message: LatentSpaceEvent) -> None:
+        session_key = (
+            message.tiled_url,
+            message.autoencoder_model,
+            message.dimred_model,
+            len(message.feature_vector),
+        )
+        if session_key != self._session_key:
+            # A batch only holds events of one session, send what we have first
+            self.flush()
+            self._session_key = session_key
+            self._session_id += 1
+            self._session = ws_protocol.session_frame(
+                self._session_id, message.tiled_url, message.autoencoder_model, message.dimred_model
+            )
+            self.replay_buffer.reset()
+        self._batch.append(message)
+
+        if self.flush_interval == 0:
+            self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Send the events coalesced so far as one batch frame"""
+        if not self._batch:
             return
-
-        if isinstance(message, LatentSpaceEvent):
-            # send image data separately to client memory issues
-           
-            logger.debug(f"WS Sending LatentSpaceEvent {message.feature_vector}")
-            await client.send(message.model_dump_json())
+        events, self._batch = self._batch, []
+
+        with metrics.STAGE_SECONDS.time(stage="serialize"):
+            batch = ws_protocol.batch_frame(self._session_id, events)
+        self.replay_buffer.append(batch["index"], batch["feature_vector"])
+        # Encoded by the client writers, once per protocol in use
+        frame = OutboundFrame(session=self._session, batch=batch)
+        for queue in self.client_queues.values():
+            if queue.protocol is not None:
+                queue.put(frame)
+
+    def snapshot_frame(self) -> OutboundFrame:
+        """The points of the current session flushed so far, or None if there are none"""
+        if not len(self.replay_buffer):
+            return None
+        index, feature_vectors = self.replay_buffer.snapshot()
+        return OutboundFrame(
+            session=self._session,
+            batch=ws_protocol.snapshot_frame(self._session_id, index, feature_vectors),
+        )
 
     async def websocket_handler(self, websocket):
-        logger.info(f"New connection from {websocket.remote_address}")
-        
+        logger.info(
+            f"New connection from {websocket.remote_address}, protocol {websocket.subprotocol or 'json'}"
+        )
+
+        queue = ClientSendQueue(websocket, self.client_queue_size, self.client_queue_policy)
+        self.client_queues[websocket] = queue
         self.connected_clients.add(websocket)
+        snapshot = self.snapshot_frame() if queue.protocol is not None else None
+        if snapshot is not None:
+            # Everything published so far in one frame, the batches flushed from now on follow it
+            queue.put(snapshot)
+        queue.start()
         try:
             # Keep the connection open and do nothing until the client disconnects
             await websocket.wait_closed()
         finally:
             # Remove the client when it disconnects
             self.connected_clients.remove(websocket)
-            logger.info("Client disconnected")
+            self.client_queues.pop(websocket).stop()
+            if queue.dropped:
+                logger.info(f"Client {queue.name} disconnected, {queue.dropped} events were dropped for it")
+            else:
+                logger.info("Client disconnected")
 
     @classmethod
     def from_settings(cls, settings: dict) -> "LSEWSResultPublisher":
-        return cls(settings.host, settings.port)
+        client_queue = settings.get("client_queue", {})
+        replay = settings.get("replay", {})
+        return cls(
+            settings.host,
+            settings.port,
+            flush_interval_ms=settings.get("flush_interval_ms", 50),
+            client_queue_size=client_queue.get("max_frames", 64),
+            client_queue_policy=client_queue.get("policy", POLICY_COALESCE),
+            replay_buffer=ReplayBuffer(
+                max_points=replay.get("max_points", 200_000),
+                max_bytes=replay.get("max_mb", 32) * 2**20,
+            ),
+        )
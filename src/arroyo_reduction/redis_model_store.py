@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import queue
 import threading
 import time
 
@@ -8,6 +9,111 @@ import redis
 
 logger = logging.getLogger(__name__)
 
+# Connection pools and pub/sub listeners shared by every RedisModelStore of the process
+_pools = {}
+_subscribers = {}
+_shared_lock = threading.Lock()
+
+
+def get_connection_pool(host: str, port: int, decode_responses: bool = True) -> redis.ConnectionPool:
+    """The process-wide connection pool for a Redis server"""
+    key = (host, port, decode_responses)
+    with _shared_lock:
+        if key not in _pools:
+            _pools[key] = redis.ConnectionPool(host=host, port=port, decode_responses=decode_responses)
+        return _pools[key]
+
+
+class ModelUpdateSubscriber:
+    """
+    A single subscription to the model updates channel per Redis server,
+    dispatching every update to the registered callbacks.
+
+    Each callback runs in its own thread, in the order the updates arrive,
+    so a callback that loads a model does not hold up the others.
+    """
+
+    def __init__(self, host: str, port: int, channel: str):
+        self.host = host
+        self.port = port
+        self.channel = channel
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def shared(cls, host: str, port: int, channel: str) -> "ModelUpdateSubscriber":
+        key = (host, port, channel)
+        with _shared_lock:
+            if key not in _subscribers:
+                _subscribers[key] = cls(host, port, channel)
+            return _subscribers[key]
+
+    def add_callback(self, callback) -> None:
+        updates = queue.Queue()
+        thread = threading.Thread(target=self._run_callback, args=(callback, updates), daemon=True)
+        thread.start()
+        with self._lock:
+            self._callbacks.append((callback, updates))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, daemon=True)
+                self._thread.start()
+                logger.info("Started model update listener thread")
+
+    def remove_callback(self, callback) -> None:
+        with self._lock:
+            for registered in list(self._callbacks):
+                if registered[0] == callback:
+                    self._callbacks.remove(registered)
+                    # Stops the callback thread
+                    registered[1].put(None)
+
+    def dispatch(self, update: dict) -> None:
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for _, updates in callbacks:
+            updates.put(update)
+
+    @staticmethod
+    def _run_callback(callback, updates: queue.Queue) -> None:
+        while True:
+            update = updates.get()
+            if update is None:
+                return
+            try:
+                callback(update)
+            except Exception as e:
+                logger.error(f"Error processing model update: {e}")
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                redis_client = redis.Redis(connection_pool=get_connection_pool(self.host, self.port))
+                pubsub = redis_client.pubsub()
+                pubsub.subscribe(self.channel)
+                logger.info(f"Subscribed to channel: {self.channel}")
+
+                for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message.get("data")
+                    try:
+                        payload = json.loads(data)
+                    except (TypeError, json.JSONDecodeError):
+                        logger.warning(f"Received invalid JSON in model update: {message}")
+                        continue
+                    logger.debug(f"Received model update: {payload}")
+                    self.dispatch(payload)
+
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                logger.warning(f"Redis connection error in listener: {e}. Retrying in 5 seconds...")
+                time.sleep(5)
+
+            except Exception as e:
+                logger.error(f"Unexpected error in model update listener: {e}")
+                # For unexpected errors, wait a bit longer before retrying
+                time.sleep(10)
+
 class RedisModelStore:
     """
     Redis integration for model selections that supports both:
@@ -18,9 +124,40 @@ class RedisModelStore:
     # Redis Key Constants
     KEY_AUTOENCODER_MODEL = "selected_mlflow_model"
     KEY_DIMRED_MODEL = "selected_dim_reduction_model"
+    # Hash with the autoencoder and dimred of the selected pair and its generation
+    KEY_MODEL_PAIR = "selected_model_pair"
     
     # Redis Channel Constants
     CHANNEL_MODEL_UPDATES = "model_updates"
+
+    # Update type published when both models are set at once
+    MODEL_TYPE_PAIR = "pair"
+
+    # Stores the pair, bumps its generation and publishes the update atomically.
+    # KEYS: pair hash, autoencoder key, dimred key
+    # ARGV: channel, timestamp, then for the autoencoder and the dimred a "1"/"0"
+    # flag telling whether to set it, followed by its name
+    _STORE_PAIR_SCRIPT = """
+    local generation = redis.call('HINCRBY', KEYS[1], 'generation', 1)
+    if ARGV[3] == '1' then
+        redis.call('HSET', KEYS[1], 'autoencoder', ARGV[4])
+        redis.call('SET', KEYS[2], ARGV[4])
+    end
+    if ARGV[5] == '1' then
+        redis.call('HSET', KEYS[1], 'dimred', ARGV[6])
+        redis.call('SET', KEYS[3], ARGV[6])
+    end
+    local pair = redis.call('HMGET', KEYS[1], 'autoencoder', 'dimred')
+    local message = cjson.encode({
+        model_type = 'pair',
+        autoencoder_model = pair[1] or cjson.null,
+        dimred_model = pair[2] or cjson.null,
+        generation = generation,
+        timestamp = tonumber(ARGV[2]),
+    })
+    local receivers = redis.call('PUBLISH', ARGV[1], message)
+    return {generation, receivers}
+    """
     
     def __init__(
         self, 
@@ -32,14 +169,13 @@ class RedisModelStore:
         """Initialize Redis client for key-value operations"""
         self.host = host or os.getenv("REDIS_HOST", "kvrocks")
         self.port = port or int(os.getenv("REDIS_PORT", 6666))
+        self._store_pair = None
 
         
-        # Initialize Redis client
+        # Initialize Redis client on the connection pool shared by the process
         try:
             self.redis_client = redis.Redis(
-                host=self.host, 
-                port=self.port,
-                decode_responses=decode_responses
+                connection_pool=get_connection_pool(self.host, self.port, decode_responses)
             )
             logger.info(f"Connected to Redis at {self.host}:{self.port}")
         except Exception as e:
@@ -86,6 +222,58 @@ class RedisModelStore:
             logger.error(f"Error storing dimension reduction model in Redis: {e}")
             return False
     
+    def store_models(self, autoencoder_model: str = None, dimred_model: str = None) -> int:
+        """
+        Store both model names in the pair key, bump its generation and publish
+        a single "pair" update, atomically and in one round trip, so subscribers
+        never see half of a new pair. A model given as None is left unchanged.
+
+        Returns the generation of the stored pair, or None on error. Subscribers
+        compare generations to ignore updates superseded by a newer selection.
+        """
+        if self.redis_client is None:
+            logger.warning("Redis client not available")
+            return None
+
+        try:
+            logger.info(f"Storing models: {autoencoder_model}, {dimred_model}")
+            if self._store_pair is None:
+                self._store_pair = self.redis_client.register_script(self._STORE_PAIR_SCRIPT)
+            generation, receivers = self._store_pair(
+                keys=[self.KEY_MODEL_PAIR, self.KEY_AUTOENCODER_MODEL, self.KEY_DIMRED_MODEL],
+                args=[
+                    self.CHANNEL_MODEL_UPDATES,
+                    time.time(),
+                    int(autoencoder_model is not None),
+                    autoencoder_model or "",
+                    int(dimred_model is not None),
+                    dimred_model or "",
+                ],
+            )
+            logger.info(f"Published model pair generation {generation}, received by {receivers} subscribers")
+            return int(generation)
+        except Exception as e:
+            logger.error(f"Error storing models in Redis: {e}")
+            return None
+
+    def get_model_pair(self) -> tuple:
+        """
+        Get the (autoencoder, dimred, generation) of the stored pair in one round trip.
+        Returns None if Redis could not be read.
+        """
+        if self.redis_client is None:
+            logger.warning("Redis client not available")
+            return None
+
+        try:
+            autoencoder_model, dimred_model, generation = self.redis_client.hmget(
+                self.KEY_MODEL_PAIR, ["autoencoder", "dimred", "generation"]
+            )
+            return autoencoder_model, dimred_model, int(generation or 0)
+        except Exception as e:
+            logger.error(f"Error retrieving model pair from Redis: {e}")
+            return None
+
     def get_autoencoder_model(self) -> str:
         """Get autoencoder model name from Redis"""
         if self.redis_client is None:
@@ -94,7 +282,7 @@ class RedisModelStore:
         
         try:
             model_name = self.redis_client.get(self.KEY_AUTOENCODER_MODEL)
-            logger.info(f"Retrieved autoencoder model: {model_name}")
+            logger.debug(f"Retrieved autoencoder model: {model_name}")
             return model_name
         except Exception as e:
             logger.error(f"Error retrieving autoencoder model from Redis: {e}")
@@ -108,11 +296,30 @@ class RedisModelStore:
         
         try:
             model_name = self.redis_client.get(self.KEY_DIMRED_MODEL)
-            logger.info(f"Retrieved dimension reduction model: {model_name}")
+            logger.debug(f"Retrieved dimension reduction model: {model_name}")
             return model_name
         except Exception as e:
             logger.error(f"Error retrieving dimension reduction model from Redis: {e}")
             return None
+
+    def get_selected_models(self) -> tuple:
+        """
+        Get the (autoencoder, dimred) model names in a single round trip.
+        Returns None if Redis could not be read, as opposed to (None, None) when nothing is selected.
+        """
+        if self.redis_client is None:
+            logger.warning("Redis client not available")
+            return None
+
+        try:
+            autoencoder_model, dimred_model = self.redis_client.mget(
+                [self.KEY_AUTOENCODER_MODEL, self.KEY_DIMRED_MODEL]
+            )
+            logger.debug(f"Retrieved selected models: {autoencoder_model}, {dimred_model}")
+            return autoencoder_model, dimred_model
+        except Exception as e:
+            logger.error(f"Error retrieving selected models from Redis: {e}")
+            return None
     
     # =====================================================================
     # Pub/Sub Methods for Real-time Model Updates
@@ -160,49 +367,86 @@ class RedisModelStore:
         if self.redis_client is None:
             logger.warning("Redis client not available for subscribing to model updates")
             return
-        
-        # Create a new thread for listening to Redis Pub/Sub
-        def listener_thread():
-            while True:
-                try:
-                    # Create a new Redis connection for Pub/Sub
-                    redis_client = redis.Redis(
-                        host=self.host, 
-                        port=self.port,
-                        decode_responses=True
-                    )
-                    pubsub = redis_client.pubsub()
-                    pubsub.subscribe(self.CHANNEL_MODEL_UPDATES)
-                    logger.info(f"Subscribed to channel: {self.CHANNEL_MODEL_UPDATES}")
-                    
-                    # Listen for messages
-                    for message in pubsub.listen():
-                        if message["type"] == "message":
-                            try:
-                                data = message.get("data")
-                                if isinstance(data, str):
-                                    payload = json.loads(data)
-                                    logger.debug(f"Received model update: {payload}")
-                                    callback(payload)
-                            except json.JSONDecodeError:
-                                logger.warning(f"Received invalid JSON in model update: {message}")
-                            except Exception as e:
-                                logger.error(f"Error processing model update: {e}")
-                                # Continue processing other messages even if one fails
-                
-                except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
-                    logger.warning(f"Redis connection error in listener: {e}. Retrying in 5 seconds...")
-                    import time
-                    time.sleep(5)
-                    
-                except Exception as e:
-                    logger.error(f"Unexpected error in model update listener: {e}")
-                    # For unexpected errors, wait a bit longer before retrying
-                    time.sleep(10)
-                    # Don't break out of the loop - keep trying to reconnect
-        
-        # Start the listener thread
-        thread = threading.Thread(target=listener_thread, daemon=True)
-        thread.start()
-        logger.info("Started model update listener thread")
 
+        # All callbacks of the process share one subscription
+        subscriber = ModelUpdateSubscriber.shared(self.host, self.port, self.CHANNEL_MODEL_UPDATES)
+        subscriber.add_callback(callback)
+
+
+class ModelSelectionCache:
+    """
+    In-process snapshot of the selected model pair.
+
+    The snapshot is updated from the model_updates pub/sub channel and
+    reconciled against the stored keys every reconcile_interval seconds, which
+    covers updates published while the subscriber was disconnected. Reading the
+    selection does no network I/O.
+    """
+
+    def __init__(self, model_store: RedisModelStore, reconcile_interval: float = 30.0):
+        self.model_store = model_store
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._autoencoder_model = None
+        self._dimred_model = None
+        # Generation of the last pair update applied
+        self.generation = 0
+        self.last_reconciled = None
+
+        self.reconcile()
+        self.model_store.subscribe_to_model_updates(self._on_model_update)
+        if self.reconcile_interval and self.reconcile_interval > 0:
+            thread = threading.Thread(target=self._reconcile_loop, daemon=True)
+            thread.start()
+            logger.info(f"Reconciling model selection every {self.reconcile_interval}s")
+
+    def get(self) -> tuple:
+        """The current (autoencoder, dimred) model names"""
+        with self._lock:
+            return self._autoencoder_model, self._dimred_model
+
+    def reconcile(self) -> bool:
+        """Refresh the snapshot from the stored keys, keeping it unchanged if Redis cannot be read"""
+        selected = self.model_store.get_selected_models()
+        if selected is None:
+            return False
+
+        with self._lock:
+            if selected != (self._autoencoder_model, self._dimred_model):
+                logger.info(f"Model selection reconciled to {selected}")
+            self._autoencoder_model, self._dimred_model = selected
+        self.last_reconciled = time.time()
+        return True
+
+    def _on_model_update(self, update: dict) -> None:
+        model_type = update.get("model_type")
+        model_name = update.get("model_name")
+        with self._lock:
+            if model_type == RedisModelStore.MODEL_TYPE_PAIR:
+                generation = update.get("generation") or 0
+                if generation and generation < self.generation:
+                    logger.info(f"Ignoring model pair generation {generation}, already at {self.generation}")
+                    return
+                self.generation = max(self.generation, generation)
+                # Both models change together, never leaving a half-updated pair
+                if update.get("autoencoder_model") is not None:
+                    self._autoencoder_model = update["autoencoder_model"]
+                if update.get("dimred_model") is not None:
+                    self._dimred_model = update["dimred_model"]
+                model_name = (self._autoencoder_model, self._dimred_model)
+            elif model_type == "autoencoder":
+                self._autoencoder_model = model_name
+            elif model_type == "dimred":
+                self._dimred_model = model_name
+            else:
+                logger.warning(f"Ignoring model update of unknown type: {update}")
+                return
+        logger.info(f"Model selection updated: {model_type} = {model_name}")
+
+    def _reconcile_loop(self) -> None:
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Error reconciling model selection: {e}")
@@ -1,11 +1,13 @@
 import logging
 import os
 import sys
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
-import redis
 import torch
 import torchvision.transforms as transforms
 from arroyosas.schemas import RawFrameEvent
@@ -13,6 +15,7 @@ from PIL import Image
 
 from src.utils.mlflow_utils import MLflowClient
 
+from . import metrics
 from .redis_model_store import RedisModelStore
 
 logger = logging.getLogger("arroyo_reduction.reducer")
@@ -48,10 +51,21 @@ class Reducer(ABC):
     @abstractmethod
     def reduce(self, message: RawFrameEvent) -> np.ndarray:
         """
-        Reduce the image to a feature vector.
+        Reduce the image to a feature vector, or return None if it could not be reduced.
         """
         pass
 
+    def reduce_batch(self, messages: list[RawFrameEvent]) -> np.ndarray:
+        """
+        Reduce a batch of images to feature vectors, one row per message.
+        Subclasses that can run batched inference should override this.
+        Returns None if any frame could not be reduced.
+        """
+        results = [self.reduce(message) for message in messages]
+        if any(result is None for result in results):
+            return None
+        return np.concatenate(results)
+
 class LatentSpaceReducer(Reducer):
     """
     Responsible for taking an image, encoding it into a
@@ -60,9 +74,27 @@ class LatentSpaceReducer(Reducer):
 
     def __init__(self):
         """Initialize the reducer with models from Redis"""
-        # Initialize model loading status flags
+        # Initialize model loading status flags. While a new model loads in the
+        # background the current models keep serving, so these are informational.
         self.is_loading_model = False
         self.loading_model_type = None
+
+        # Guards the active model pair so a swap is atomic between frames
+        self._model_lock = threading.Lock()
+        # Shape and dtype of the last frame seen, used to warm up new models
+        self._last_frame_shape = None
+        self._last_frame_dtype = None
+        # Hot-swap metrics: seconds from receiving an update to serving the new model
+        self.swap_count = 0
+        self.last_swap_latency = None
+        self.max_swap_latency = 0.0
+        # Generation of the model pair being served and of the newest pair selected,
+        # pair updates older than either are stale and are not loaded or swapped in
+        self.model_generation = 0
+        self._requested_generation = 0
+        # When the pair being served was requested, until it reduces its first frame
+        self._awaiting_first_result = time.monotonic()
+        self.time_to_first_result = None
         
         # Initialize Redis model store
         self.redis_model_store = RedisModelStore(host=REDIS_HOST, port=REDIS_PORT)
@@ -86,6 +118,8 @@ class LatentSpaceReducer(Reducer):
         # Load models from MLflow
         mlflow_client = MLflowClient()
         self.mlflow_client = mlflow_client  # Store for later use
+        for stat in ("hits", "misses", "evictions", "entries", "bytes"):
+            metrics.MODEL_CACHE.set_function(lambda stat=stat: MLflowClient.memory_cache_stats()[stat], stat=stat)
         
         # Set loading flags before loading models
         self.is_loading_model = True
@@ -95,6 +129,9 @@ class LatentSpaceReducer(Reducer):
             self.current_torch_model = mlflow_client.load_model(self.autoencoder_model_name)
             self.current_dim_reduction_model = mlflow_client.load_model(self.dimred_model_name)
             logger.info("Initial models loaded successfully")
+            if self.is_ready():
+                # Pay the first-call costs before the first frame rather than on it
+                self._warm_up(self.current_torch_model, self.current_dim_reduction_model)
         finally:
             # Reset loading flags
             self.is_loading_model = False
@@ -103,125 +140,284 @@ class LatentSpaceReducer(Reducer):
         # Subscribe to model update channel if supported
         self._subscribe_to_model_updates()
 
-    def reduce(self, message: RawFrameEvent) -> np.ndarray:
-        """Process an image through the models to get feature vectors"""
-        
-        # Check if models are currently being loaded
-        if self.is_loading_model:
-            logger.info(f"Waiting for {self.loading_model_type} model to finish loading...")
-            # Return a placeholder while models are loading
-            return np.zeros((1, 2))  # Return empty vector during loading
-            
+    def is_ready(self) -> bool:
+        """Whether both models are loaded and frames can be reduced"""
+        return self.current_torch_model is not None and self.current_dim_reduction_model is not None
+
+    def model_snapshot(self) -> tuple:
+        """
+        Return the active (autoencoder_name, autoencoder, dimred_name, dimred) pair.
+        Taken under the model lock so it never mixes models from before and after a swap.
+        """
+        with self._model_lock:
+            return (
+                self.autoencoder_model_name,
+                self.current_torch_model,
+                self.dimred_model_name,
+                self.current_dim_reduction_model,
+            )
+
+    def reduce(self, message: RawFrameEvent, models: tuple = None, timings: dict = None) -> np.ndarray:
+        """
+        Process an image through the models to get feature vectors.
+        Returns None if a stage fails, so no placeholder point is published.
+
+        models is an optional snapshot from model_snapshot(); by default the
+        currently active pair is used. If timings is given, the seconds spent in
+        each stage are added to it, on top of the stage duration metrics.
+        """
+        _, autoencoder, _, dimred = models or self.model_snapshot()
+
+        start = time.perf_counter()
         try:
             # Get numpy array from message
             img_array = message.image.array
-
-            # Additional debugging for the image data
-            logger.info(f"Get input image shape: {img_array.shape}, dtype: {img_array.dtype}. Image min: {img_array.min()}, max: {img_array.max()}")
-            
+            self._last_frame_shape = img_array.shape
+            self._last_frame_dtype = img_array.dtype
+            logger.debug(f"Input image shape: {img_array.shape}, dtype: {img_array.dtype}")
         except Exception as e:
             logger.error(f"Error in image preparation: {e}")
-            return np.zeros((1, 2))  # Return empty vector on error
-        
+            return None
+        self._record_stage("preprocess", time.perf_counter() - start, timings)
+
+        return self._run_models(img_array, autoencoder, dimred, timings)
+
+    def reduce_batch(self, messages: list[RawFrameEvent], models: tuple = None, timings: dict = None) -> np.ndarray:
+        """
+        Process a batch of images through the models with a single forward pass
+        and a single dimension reduction call.
+
+        Returns an array of shape (len(messages), n_components) whose i-th row
+        belongs to messages[i], or None if the batch could not be processed.
+        """
+        _, autoencoder, _, dimred = models or self.model_snapshot()
+
+        start = time.perf_counter()
+        try:
+            # Stack frames into a (B, H, W) or (B, H, W, C) array
+            img_batch = np.stack([message.image.array for message in messages])
+            self._last_frame_shape = img_batch.shape[1:]
+            self._last_frame_dtype = img_batch.dtype
+            logger.debug(f"Batch input shape: {img_batch.shape}, dtype: {img_batch.dtype}")
+        except Exception as e:
+            logger.error(f"Error in batch image preparation: {e}")
+            return None
+        self._record_stage("preprocess", time.perf_counter() - start, timings)
+
+        f_vecs = self._run_models(img_batch, autoencoder, dimred, timings)
+        if f_vecs is None:
+            return None
+        if len(f_vecs) != len(messages):
+            logger.error(
+                f"Batch size mismatch: got {len(f_vecs)} feature vectors for {len(messages)} frames"
+            )
+            return None
+        return f_vecs
+
+    def _run_models(self, images: np.ndarray, autoencoder, dimred, timings: dict = None) -> np.ndarray:
+        """Run images through the autoencoder and the dimension reduction, timing each stage"""
         # Process with autoencoder to get latent features
+        start = time.perf_counter()
         try:
-            # Pass numpy array directly to model, the predict() API will handle data preprocessing 
-            autoencoder_result = self.current_torch_model.predict(img_array)  
+            # Pass numpy array directly to model, the predict() API will handle data preprocessing
+            autoencoder_result = autoencoder.predict(images)
             latent_features = autoencoder_result["latent_features"]
-            logger.info(f"Latent features shape: {latent_features.shape}")
-            
+            logger.debug(f"Latent features shape: {latent_features.shape}")
         except Exception as e:
             logger.error(f"Error in autoencoder processing: {e}")
-            return np.zeros((1, 2))  # Return empty vector on error
-        
+            return None
+        elapsed = time.perf_counter() - start
+        # Wrappers that report their own preprocessing time get it split out of the forward pass
+        preprocess_seconds = autoencoder_result.get("preprocess_seconds") if isinstance(autoencoder_result, dict) else None
+        if isinstance(preprocess_seconds, (int, float)):
+            self._record_stage("preprocess", preprocess_seconds, timings)
+            elapsed -= preprocess_seconds
+        self._record_stage("autoencoder", elapsed, timings)
+
         # Apply dimension reduction directly with latent features
-        try:            
-            umap_result = self.current_dim_reduction_model.predict(latent_features)  
-            f_vec = umap_result["umap_coords"]
-            logger.info(f"Feature vector shape: {f_vec.shape}")
-            return f_vec
+        start = time.perf_counter()
+        try:
+            umap_result = dimred.predict(latent_features)
+            f_vecs = umap_result["umap_coords"]
+            logger.debug(f"Feature vector shape: {f_vecs.shape}")
         except Exception as e:
             logger.error(f"Error in dimension reduction: {e}")
-            return np.zeros((1, 2))  # Return empty vector on error
-            
-    
+            return None
+        self._record_stage("dimred", time.perf_counter() - start, timings)
+        self._note_first_result(autoencoder, dimred)
+        return f_vecs
+
+    def _note_first_result(self, autoencoder, dimred) -> None:
+        """Record the time to first result when the pair being served reduces its first frame"""
+        since = self._awaiting_first_result
+        if since is None or autoencoder is not self.current_torch_model or dimred is not self.current_dim_reduction_model:
+            return
+        self._awaiting_first_result = None
+        self.time_to_first_result = time.monotonic() - since
+        metrics.MODEL_TIME_TO_FIRST_RESULT.observe(self.time_to_first_result)
+        logger.info(f"First result of {self.autoencoder_model_name}/{self.dimred_model_name} after {self.time_to_first_result:.2f}s")
+
+    def take_time_to_first_result(self):
+        """The time to first result recorded since the last call, or None"""
+        seconds, self.time_to_first_result = self.time_to_first_result, None
+        return seconds
+
+    @staticmethod
+    def _record_stage(stage: str, seconds: float, timings: dict = None) -> None:
+        metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
     def _subscribe_to_model_updates(self):
         """
-        Subscribe to model update notifications through Redis PubSub
-        This runs in a separate thread to listen for model updates
+        Subscribe to model update notifications through the process-wide
+        Redis PubSub listener. Updates are handled in a separate thread.
         """
         try:
-            import threading
-            
-            def listen_for_updates():
-                """Listen for model updates in a separate thread"""
-                try:
-                    redis_client = redis.Redis(
-                        host=REDIS_HOST, 
-                        port=REDIS_PORT, 
-                        decode_responses=True
-                    )
-                    pubsub = redis_client.pubsub()
-                    pubsub.subscribe("model_updates")
-                    
-                    logger.info("Subscribed to model updates channel")
-                    
-                    # Listen for messages
-                    for message in pubsub.listen():
-                        if message["type"] == "message":
-                            data = message["data"]
-                            try:
-                                import json
-                                update = json.loads(data)
-                                self._handle_model_update(update)
-                            except Exception as e:
-                                logger.error(f"Error processing model update: {e}")
-                except Exception as e:
-                    logger.error(f"Error in model update listener: {e}")
-            
-            # Start listener thread
-            thread = threading.Thread(target=listen_for_updates, daemon=True)
-            thread.start()
-            logger.info("Started model update listener thread")
+            # Generations are noted as soon as they arrive, while a previous pair may still be loading
+            self.redis_model_store.subscribe_to_model_updates(self._note_model_generation)
+            self.redis_model_store.subscribe_to_model_updates(self._handle_model_update)
         except Exception as e:
             logger.warning(f"Could not start model update listener: {e}")
     
+    def _note_model_generation(self, update):
+        generation = update.get("generation")
+        if generation:
+            self._requested_generation = max(self._requested_generation, generation)
+
+    def _is_superseded(self, generation) -> bool:
+        """Whether a pair update is older than the pair served or a newer selection"""
+        return bool(generation) and (
+            generation <= self.model_generation or generation < self._requested_generation
+        )
+
+    def _load_models(self, requested: dict) -> dict:
+        """
+        Load the requested models, given as {model_type: model_name}, concurrently.
+        Returns {model_type: (model_name, model)}, or None if any of them failed.
+        """
+        with ThreadPoolExecutor(max_workers=len(requested)) as executor:
+            futures = {
+                model_type: executor.submit(self.mlflow_client.load_model, model_name)
+                for model_type, model_name in requested.items()
+            }
+        new_models = {}
+        for model_type, future in futures.items():
+            try:
+                model = future.result()
+            except Exception as e:
+                logger.error(f"Error loading {model_type} model {requested[model_type]}: {e}")
+                model = None
+            if model is None:
+                logger.error(f"Could not load {model_type} model {requested[model_type]}, keeping the current models")
+                return None
+            new_models[model_type] = (requested[model_type], model)
+        return new_models
+
+    def _warm_up(self, autoencoder, dimred):
+        """
+        Run a synthetic frame through a candidate model pair so that first-call
+        costs (torch dispatch, numba JIT in UMAP) are paid before the swap.
+        """
+        shape = self._last_frame_shape or (512, 512)
+        dtype = self._last_frame_dtype or np.float32
+        dummy_frame = np.zeros(shape, dtype=dtype)
+        try:
+            latent_features = autoencoder.predict(dummy_frame)["latent_features"]
+            dimred.predict(latent_features)
+            logger.info("Warm-up of new model pair complete")
+        except Exception as e:
+            # A warm-up failure is not fatal, e.g. while only half of a new pair is selected
+            logger.warning(f"Warm-up of new model pair failed: {e}")
+
+    def _swap_models(self, new_models: dict, requested_at):
+        """
+        Atomically replace the active models, given as {model_type: (model_name, model)},
+        and record the swap latency
+        """
+        with self._model_lock:
+            if "autoencoder" in new_models:
+                self.autoencoder_model_name, self.current_torch_model = new_models["autoencoder"]
+            if "dimred" in new_models:
+                self.dimred_model_name, self.current_dim_reduction_model = new_models["dimred"]
+
+        latency = time.monotonic() - requested_at
+        self._awaiting_first_result = requested_at
+        metrics.MODEL_SWAP_SECONDS.observe(latency)
+        self.swap_count += 1
+        self.last_swap_latency = latency
+        self.max_swap_latency = max(self.max_swap_latency, latency)
+        swapped = ", ".join(f"{model_type} model {name}" for model_type, (name, _) in new_models.items())
+        logger.info(f"Swapped in {swapped} after {latency:.2f}s")
+
     def _handle_model_update(self, update):
-        """Handle a model update from Redis PubSub"""
+        """
+        Handle a model update from Redis PubSub.
+
+        The new model is loaded and warmed up while the current one keeps serving
+        frames; it is then swapped in atomically between two frames.
+        """
+        requested_at = time.monotonic()
         try:
             model_type = update.get("model_type")
-            model_name = update.get("model_name")
-            
-            if not model_type or not model_name:
-                logger.warning(f"Invalid model update: {update}")
-                return
-            
-            # Check if this is a duplicate update for the same model
-            if (model_type == "autoencoder" and model_name == self.autoencoder_model_name) or \
-            (model_type == "dimred" and model_name == self.dimred_model_name):
-                logger.info(f"Ignoring duplicate model update: {model_type} = {model_name} (already loaded)")
+            generation = update.get("generation")
+
+            if model_type == "pair":
+                if self._is_superseded(generation):
+                    logger.info(f"Ignoring model pair generation {generation}, superseded")
+                    return
+                # Both models were selected at once, they are loaded concurrently and swapped in together
+                requested = {
+                    "autoencoder": update.get("autoencoder_model"),
+                    "dimred": update.get("dimred_model"),
+                }
+                requested = {model_type: name for model_type, name in requested.items() if name}
+                if not requested:
+                    logger.info(f"Ignoring model update without models: {update}")
+                    return
+            else:
+                model_name = update.get("model_name")
+                if not model_type or not model_name:
+                    logger.warning(f"Invalid model update: {update}")
+                    return
+                if model_type not in ("autoencoder", "dimred"):
+                    logger.warning(f"Unknown model type: {model_type}")
+                    return
+                requested = {model_type: model_name}
+
+            # Check if this is a duplicate update for the models already loaded
+            loaded = {"autoencoder": self.autoencoder_model_name, "dimred": self.dimred_model_name}
+            requested = {model_type: name for model_type, name in requested.items() if name != loaded[model_type]}
+            if not requested:
+                logger.info(f"Ignoring duplicate model update: {update} (already loaded)")
+                if model_type == "pair" and generation:
+                    self.model_generation = max(self.model_generation, generation)
                 return
-                
-            logger.info(f"Received model update: {model_type} = {model_name}")
+
+            logger.info(f"Received model update: {requested}")
             
-            # Set loading flags before updating models
+            # Set loading flags; frames keep being served by the current models
             self.is_loading_model = True
-            self.loading_model_type = model_type
+            self.loading_model_type = next(iter(requested)) if len(requested) == 1 else "pair"
             
             try:
-                # Update the appropriate model
-                if model_type == "autoencoder":
-                    logger.info(f"Loading new autoencoder model: {model_name}...")
-                    self.autoencoder_model_name = model_name
-                    self.current_torch_model = self.mlflow_client.load_model(model_name)
-                    logger.info(f"Successfully loaded new autoencoder model: {model_name}")
-                elif model_type == "dimred":
-                    logger.info(f"Loading new dimension reduction model: {model_name}...")
-                    self.dimred_model_name = model_name
-                    self.current_dim_reduction_model = self.mlflow_client.load_model(model_name)
-                    logger.info(f"Successfully loaded new dimension reduction model: {model_name}")
-                else:
-                    logger.warning(f"Unknown model type: {model_type}")
+                new_models = self._load_models(requested)
+                if new_models is None:
+                    return
+
+                # Warm up the pair that will be live after the swap
+                _, autoencoder, _, dimred = self.model_snapshot()
+                autoencoder = new_models.get("autoencoder", (None, autoencoder))[1]
+                dimred = new_models.get("dimred", (None, dimred))[1]
+                if autoencoder is not None and dimred is not None:
+                    self._warm_up(autoencoder, dimred)
+
+                if model_type == "pair" and generation and generation < self._requested_generation:
+                    logger.info(f"Model pair generation {generation} was superseded while loading, not swapping it in")
+                    return
+                self._swap_models(new_models, requested_at)
+                if model_type == "pair" and generation:
+                    self.model_generation = generation
             finally:
                 # Reset loading flags
                 self.is_loading_model = False
@@ -232,4 +428,3 @@ class LatentSpaceReducer(Reducer):
             self.is_loading_model = False
             self.loading_model_type = None
             logger.error(f"Error handling model update: {e}")
-
@@ -0,0 +1,85 @@
+import logging
+
+import numpy as np
+
+from .ws_protocol import FEATURE_DTYPE, INDEX_DTYPE
+
+logger = logging.getLogger("arroyo_reduction.replay_buffer")
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the indices and feature vectors published in the current
+    session, so a client that connects mid-run gets every point so far in a
+    single snapshot frame. Bounded by max_points and by max_bytes, whichever
+    is smaller: once full, the oldest points are overwritten.
+    """
+
+    def __init__(self, max_points: int = 200_000, max_bytes: int = 32 * 2**20):
+        self.max_points = max(1, int(max_points))
+        self.max_bytes = max(1, int(max_bytes))
+        self.reset()
+
+    def reset(self) -> None:
+        self._index = None
+        self._features = None
+        self._start = 0
+        self._count = 0
+        self.overwritten = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._index is None else len(self._index)
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._index is None else self._index.nbytes + self._features.nbytes
+
+    def _allocate(self, dims: int) -> None:
+        row_bytes = INDEX_DTYPE.itemsize + dims * FEATURE_DTYPE.itemsize
+        capacity = max(1, min(self.max_points, self.max_bytes // row_bytes))
+        self._index = np.empty(capacity, dtype=INDEX_DTYPE)
+        self._features = np.empty((capacity, dims), dtype=FEATURE_DTYPE)
+
+    def append(self, index: np.ndarray, feature_vectors: np.ndarray) -> None:
+        """Add the points of a batch, overwriting the oldest ones when full"""
+        count = len(index)
+        if count == 0:
+            return
+        if self._features is None:
+            self._allocate(feature_vectors.shape[1])
+        elif feature_vectors.shape[1] != self._features.shape[1]:
+            logger.warning("Feature vector size changed within a session, resetting the replay buffer")
+            self.reset()
+            self._allocate(feature_vectors.shape[1])
+
+        capacity = self.capacity
+        if count > capacity:
+            index, feature_vectors = index[-capacity:], feature_vectors[-capacity:]
+            self.overwritten += count - capacity
+            count = capacity
+
+        # Write at the end of the ring, in two parts if it wraps around
+        end = (self._start + self._count) % capacity
+        first = min(count, capacity - end)
+        self._index[end:end + first] = index[:first]
+        self._features[end:end + first] = feature_vectors[:first]
+        self._index[:count - first] = index[first:]
+        self._features[:count - first] = feature_vectors[first:]
+
+        overflow = max(0, self._count + count - capacity)
+        if overflow and not self.overwritten:
+            logger.info(f"Replay buffer full at {capacity} points, dropping the oldest ones")
+        self.overwritten += overflow
+        self._start = (self._start + overflow) % capacity
+        self._count = min(capacity, self._count + count)
+
+    def snapshot(self) -> tuple:
+        """(index, feature_vectors) of the buffered points, oldest first"""
+        if self._count == 0:
+            return np.empty(0, dtype=INDEX_DTYPE), np.empty((0, 0), dtype=FEATURE_DTYPE)
+        order = (self._start + np.arange(self._count)) % self.capacity
+        return self._index[order], self._features[order]
@@ -37,4 +37,6 @@ class LatentSpaceEvent(Event):
     feature_vector: list[float]
     index: int
     autoencoder_model: str = None  # Add autoencoder model name
-    dimred_model: str = None       # Add dimension reduction model name
\ No newline at end of file
+    dimred_model: str = None       # Add dimension reduction model name
+    sampling_policy: str | None = None  # Load shedding policy applied when the reducer fell behind
+    frames_skipped: int = 0             # Frames shed since the previous published event
\ No newline at end of file
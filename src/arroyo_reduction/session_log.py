@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import redis
+from arroyopy.publisher import Publisher
+from arroyopy.schemas import Stop
+
+from . import metrics, session_reader
+from .schemas import LatentSpaceEvent
+from .session_reader import FEATURE_DTYPE, KEY_PREFIX, RUNS_PREFIX, parse_id, runs_key, stream_key
+
+logger = logging.getLogger("arroyo_reduction.session_log")
+
+
+class LiveSessionLog(Publisher):
+    """
+    Durable log of the live results in kvrocks streams, one stream per run
+    (tiled_url) of an (autoencoder, dimred) pair, so a reloaded page or an
+    offline tool can get the points back without running inference again.
+    The runs of a pair are kept in a sorted set, in the order they were first
+    logged.
+
+    publish() only buffers the events. Every batch_size events, or after
+    flush_interval_ms, the batch is written by a background thread with one
+    pipelined round trip of XADDs, so the event loop never waits on kvrocks.
+    Each entry holds the frame index, its tiled_url and the feature vector as
+    little-endian float32 bytes.
+
+    Entry IDs are "{frame index}-{seq}", so an index range of a run is an
+    XRANGE of that range. A frame logged after a later frame of its run, e.g.
+    one published late, is filed under the ID following the latest one.
+    """
+
+    KEY_PREFIX = KEY_PREFIX
+    RUNS_PREFIX = RUNS_PREFIX
+
+    def __init__(
+        self,
+        host: str = None,
+        port: int = None,
+        batch_size: int = 256,
+        flush_interval_ms: float = 200,
+        maxlen: int = None,
+        max_pending_batches: int = 64,
+    ):
+        super().__init__()
+        self.host = host or os.getenv("REDIS_HOST", "kvrocks")
+        self.port = port or int(os.getenv("REDIS_PORT", 6666))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval_ms / 1000
+        self.maxlen = maxlen
+        self.dropped = 0
+
+        try:
+            # Feature vectors are stored as bytes, so responses are not decoded
+            self.redis_client = redis.Redis(host=self.host, port=self.port, decode_responses=False)
+            logger.info(f"Logging live sessions to Redis at {self.host}:{self.port}")
+        except Exception as e:
+            self.redis_client = None
+            logger.warning(f"Could not connect to Redis: {e}")
+
+        self._batch = []
+        self._flush_task = None
+        self._writes = queue.Queue(maxsize=max_pending_batches)
+        self._writer = None
+        # Last (index, seq) entry ID of each run stream written by this process
+        self._last_ids = {}
+
+    # =====================================================================
+    # Writing
+    # =====================================================================
+
+    async def publish(self, message) -> None:
+        if isinstance(message, LatentSpaceEvent):
+            self._batch.append(message)
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.ensure_future(self._flush_later())
+        elif isinstance(message, Stop):
+            self.flush()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Hand the buffered events to the writer thread"""
+        if not self._batch or self.redis_client is None:
+            self._batch = []
+            return
+        batch, self._batch = self._batch, []
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True, name="lse-session-log")
+            self._writer.start()
+        try:
+            self._writes.put_nowait(batch)
+        except queue.Full:
+            # Never hold up the live results because kvrocks is slow or down
+            self.dropped += len(batch)
+            logger.warning(f"Session log is behind, {self.dropped} events not logged so far")
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = self._writes.get()
+            try:
+                self.write(batch)
+            finally:
+                self._writes.task_done()
+
+    def write(self, events: list) -> bool:
+        """Append events to their streams in a single pipelined round trip"""
+        start = time.perf_counter()
+        keys = [stream_key(event.autoencoder_model, event.dimred_model, event.tiled_url) for event in events]
+        try:
+            self._register_runs(events, keys)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, event in zip(keys, events):
+                fields = {
+                    "index": event.index,
+                    "tiled_url": event.tiled_url,
+                    "feature_vector": np.asarray(event.feature_vector, dtype=FEATURE_DTYPE).tobytes(),
+                }
+                pipe.xadd(
+                    key,
+                    fields,
+                    id=self._next_entry_id(key, event.index),
+                    maxlen=self.maxlen or None,
+                    approximate=True,
+                )
+            pipe.execute()
+        except Exception as e:
+            # The streams may be ahead of what this process knows, read their last IDs again
+            for key in keys:
+                self._last_ids.pop(key, None)
+            self.dropped += len(events)
+            logger.error(f"Error writing {len(events)} events to the session log: {e}")
+            return False
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="session_log_write")
+        return True
+
+    def _register_runs(self, events: list, keys: list) -> None:
+        """Add the runs this process has not written yet to their pair and read their last entry ID"""
+        new_runs = {}
+        for key, event in zip(keys, events):
+            if key not in self._last_ids:
+                new_runs.setdefault(key, event)
+        if not new_runs:
+            return
+        now_ms = int(time.time() * 1000)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key, event in new_runs.items():
+            pipe.xrevrange(key, max="+", min="-", count=1)
+            pipe.zadd(runs_key(event.autoencoder_model, event.dimred_model), {event.tiled_url: now_ms}, nx=True)
+        results = pipe.execute()
+        for key, last in zip(new_runs, results[::2]):
+            self._last_ids[key] = parse_id(last[0][0]) if last else (0, 0)
+
+    def _next_entry_id(self, key: str, index) -> str:
+        last_index, last_seq = self._last_ids[key]
+        index = int(index)
+        entry_id = (index, 0) if index > last_index else (last_index, last_seq + 1)
+        self._last_ids[key] = entry_id
+        return f"{entry_id[0]}-{entry_id[1]}"
+
+    def join(self, timeout: float = 5.0) -> None:
+        """Wait until the batches handed to the writer thread are written"""
+        deadline = time.monotonic() + timeout
+        while self._writes.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    # =====================================================================
+    # Reading
+    # =====================================================================
+
+    def list_sessions(self) -> list:
+        """(autoencoder, dimred) pairs that have a logged session"""
+        if self.redis_client is None:
+            return []
+        try:
+            sessions = []
+            for key in self.redis_client.scan_iter(match=f"{self.RUNS_PREFIX}:*", count=1000):
+                _, autoencoder_model, dimred_model = key.decode().split(":", 2)
+                sessions.append((autoencoder_model, dimred_model))
+            return sorted(sessions)
+        except Exception as e:
+            logger.error(f"Error listing logged sessions: {e}")
+            return []
+
+    def list_runs(self, autoencoder_model: str, dimred_model: str) -> list:
+        """tiled_urls of the runs logged for a pair, in the order they were first logged"""
+        if self.redis_client is None:
+            return []
+        try:
+            return session_reader.list_runs(self.redis_client, autoencoder_model, dimred_model)
+        except Exception as e:
+            logger.error(f"Error listing the runs of {autoencoder_model}/{dimred_model}: {e}")
+            return []
+
+    def session_length(self, autoencoder_model: str, dimred_model: str, tiled_url: str = None) -> int:
+        if self.redis_client is None:
+            return 0
+        try:
+            runs = [tiled_url] if tiled_url is not None else self.list_runs(autoencoder_model, dimred_model)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for run in runs:
+                pipe.xlen(stream_key(autoencoder_model, dimred_model, run))
+            return sum(pipe.execute()) if runs else 0
+        except Exception as e:
+            logger.error(f"Error reading the session log length: {e}")
+            return 0
+
+    def iter_pages(
+        self,
+        autoencoder_model: str,
+        dimred_model: str,
+        tiled_url: str,
+        page_size: int = 10000,
+        after: str = None,
+    ):
+        """Yield the raw entries of a run, page_size (entry_id, fields) pairs at a time"""
+        return session_reader.iter_pages(
+            self.redis_client, autoencoder_model, dimred_model, tiled_url, page_size, after
+        )
+
+    def read_session(
+        self,
+        autoencoder_model: str,
+        dimred_model: str,
+        start_index: int = 0,
+        end_index: int = None,
+        tiled_url: str = None,
+        page_size: int = 10000,
+    ) -> dict:
+        """
+        Read the points of a session with start_index <= index < end_index,
+        optionally only those of one tiled_url. Only the entries within the
+        range are read from each run. Points come in index order within a run
+        and runs in the order they were first logged.
+        Returns a dict with "index" (int32 array), "feature_vector" (float32
+        array, one row per point) and "tiled_url" (list), or None on error.
+        """
+        if self.redis_client is None:
+            logger.warning("Redis client not available")
+            return None
+
+        indices, feature_vectors, tiled_urls = [], [], []
+        try:
+            runs = [tiled_url] if tiled_url is not None else session_reader.list_runs(
+                self.redis_client, autoencoder_model, dimred_model
+            )
+            for run in runs:
+                for page in session_reader.iter_pages(
+                    self.redis_client,
+                    autoencoder_model,
+                    dimred_model,
+                    run,
+                    page_size,
+                    start_index=start_index,
+                    end_index=end_index,
+                ):
+                    for _, fields in page:
+                        # A frame logged late is filed under a later ID than its index
+                        index = int(fields[b"index"])
+                        if index < start_index or (end_index is not None and index >= end_index):
+                            continue
+                        indices.append(index)
+                        tiled_urls.append(run)
+                        feature_vectors.append(np.frombuffer(fields[b"feature_vector"], dtype=FEATURE_DTYPE))
+        except Exception as e:
+            logger.error(f"Error reading the session log of {autoencoder_model}/{dimred_model}: {e}")
+            return None
+
+        return {
+            "index": np.asarray(indices, dtype=np.int32),
+            "feature_vector": np.vstack(feature_vectors) if feature_vectors else np.empty((0, 0), FEATURE_DTYPE),
+            "tiled_url": tiled_urls,
+        }
+
+    def delete_session(self, autoencoder_model: str, dimred_model: str) -> bool:
+        if self.redis_client is None:
+            return False
+        try:
+            runs = session_reader.list_runs(self.redis_client, autoencoder_model, dimred_model)
+            keys = [stream_key(autoencoder_model, dimred_model, run) for run in runs]
+            self.redis_client.delete(*keys, runs_key(autoencoder_model, dimred_model))
+            for key in keys:
+                self._last_ids.pop(key, None)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting the session log: {e}")
+            return False
+
+    @classmethod
+    def from_settings(cls, settings) -> "LiveSessionLog":
+        return cls(
+            batch_size=settings.get("batch_size", 256),
+            flush_interval_ms=settings.get("flush_interval_ms", 200),
+            maxlen=settings.get("maxlen"),
+        )
@@ -0,0 +1,80 @@
+import numpy as np
+
+# Only numpy and a Redis client are needed to read the live sessions back, so
+# the Dash app can do it without the arroyo dependencies of session_log
+
+FEATURE_DTYPE = np.dtype("<f4")
+KEY_PREFIX = "live_session"
+RUNS_PREFIX = "live_session_runs"
+
+
+def stream_key(autoencoder_model: str, dimred_model: str, tiled_url: str) -> str:
+    """The kvrocks stream holding the live results of one run for a model pair"""
+    return f"{KEY_PREFIX}:{autoencoder_model}:{dimred_model}:{tiled_url}"
+
+
+def runs_key(autoencoder_model: str, dimred_model: str) -> str:
+    """The sorted set of the runs logged for a model pair, scored by when they were first logged"""
+    return f"{RUNS_PREFIX}:{autoencoder_model}:{dimred_model}"
+
+
+def parse_id(entry_id) -> tuple:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    ms, seq = entry_id.split("-")
+    return int(ms), int(seq)
+
+
+def _next_id(entry_id) -> str:
+    """The smallest stream ID after entry_id, to page with an inclusive XRANGE"""
+    ms, seq = parse_id(entry_id)
+    return f"{ms}-{seq + 1}"
+
+
+def list_runs(redis_client, autoencoder_model: str, dimred_model: str) -> list:
+    """tiled_urls of the runs logged for a model pair, in the order they were first logged"""
+    return [
+        run.decode() if isinstance(run, bytes) else run
+        for run in redis_client.zrange(runs_key(autoencoder_model, dimred_model), 0, -1)
+    ]
+
+
+def iter_pages(
+    redis_client,
+    autoencoder_model: str,
+    dimred_model: str,
+    tiled_url: str,
+    page_size: int = 10000,
+    after: str = None,
+    start_index: int = None,
+    end_index: int = None,
+):
+    """
+    Yield the raw entries of a run, page_size (entry_id, fields) pairs at a
+    time, from start_index or only those after the entry ID after.
+
+    Entry IDs are "{frame index}-{seq}", so start_index <= index < end_index
+    is the XRANGE from "{start_index}" to "{end_index - 1}" and only the
+    entries of that range are read.
+    """
+    key = stream_key(autoencoder_model, dimred_model, tiled_url)
+    if after is not None:
+        start = _next_id(after)
+    elif start_index is not None:
+        start = str(max(0, start_index))
+    else:
+        start = "-"
+    if end_index is None:
+        end = "+"
+    elif end_index <= 0:
+        return
+    else:
+        end = str(end_index - 1)
+    while True:
+        page = redis_client.xrange(key, min=start, max=end, count=page_size)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        start = _next_id(page[-1][0])
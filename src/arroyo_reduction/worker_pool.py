@@ -0,0 +1,249 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+
+import msgpack
+import zmq
+import zmq.asyncio
+
+logger = logging.getLogger("arroyo_reduction.worker_pool")
+
+# Requests are [seq, payload] multipart messages. The payload is a msgpack list of
+# RawFrameEvent dumps; the reply is a msgpack dict with either the feature vectors,
+# the names of the models that produced them and the stage timings, or an "error" reason.
+ERROR_NOT_READY = "worker_not_ready"
+ERROR_REDUCE = "reduce_error"
+ERROR_REQUEST = "bad_request"
+
+
+def run_broker(frontend_address: str, backend_address: str) -> None:
+    """
+    Forward requests from operator clients (ROUTER) to reducer workers (DEALER).
+    The DEALER side fans requests out round-robin, replies are routed back to
+    the client that sent the request. Blocks until the context is terminated.
+    """
+    context = zmq.Context.instance()
+    frontend = context.socket(zmq.ROUTER)
+    frontend.bind(frontend_address)
+    backend = context.socket(zmq.DEALER)
+    backend.bind(backend_address)
+    logger.info(f"Worker pool broker forwarding {frontend_address} -> {backend_address}")
+    try:
+        zmq.proxy(frontend, backend)
+    except zmq.ContextTerminated:
+        pass
+    finally:
+        frontend.close(linger=0)
+        backend.close(linger=0)
+
+
+def wait_for_models(reducer, model_selection, timeout: float) -> bool:
+    """
+    Wait until the reducer serves the selected model pair, so that frames are
+    not reduced with a pair the UI is about to discard. Returns False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        autoencoder_name, _, dimred_name, _ = reducer.model_snapshot()
+        selected = model_selection.get() if model_selection is not None else None
+        if reducer.is_ready() and (selected is None or (autoencoder_name, dimred_name) == selected):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+
+
+def handle_request(reducer, model_selection, payload: bytes, ready_timeout: float) -> dict:
+    """Reduce the frames of one request and build the reply"""
+    from arroyosas.schemas import RawFrameEvent
+
+    # Stage timings travel back with the reply, the operator process exports them
+    timings = {}
+    start = time.perf_counter()
+    try:
+        messages = [RawFrameEvent(**frame) for frame in msgpack.unpackb(payload)]
+    except Exception as e:
+        logger.error(f"Could not decode request: {e}")
+        return {"error": ERROR_REQUEST}
+    timings["deserialize"] = time.perf_counter() - start
+
+    if not wait_for_models(reducer, model_selection, ready_timeout):
+        logger.warning(f"Models not ready after {ready_timeout}s, rejecting {len(messages)} frames")
+        return {"error": ERROR_NOT_READY}
+
+    models = reducer.model_snapshot()
+    if len(messages) == 1:
+        feature_vectors = reducer.reduce(messages[0], models, timings)
+    else:
+        feature_vectors = reducer.reduce_batch(messages, models, timings)
+    if feature_vectors is None:
+        return {"error": ERROR_REDUCE}
+
+    reply = {
+        "feature_vectors": feature_vectors.tolist(),
+        "autoencoder_model": models[0],
+        "dimred_model": models[2],
+        "timings": timings,
+    }
+    time_to_first_result = reducer.take_time_to_first_result()
+    if time_to_first_result is not None:
+        reply["time_to_first_result"] = time_to_first_result
+    return reply
+
+
+def serve_requests(socket: zmq.Socket, reducer, model_selection=None, ready_timeout: float = 60.0) -> None:
+    """Answer requests from the broker one at a time, forever"""
+    while True:
+        frames = socket.recv_multipart()
+        # The routing envelope added by the broker is sent back unchanged
+        envelope, (seq, payload) = frames[:-2], frames[-2:]
+        try:
+            reply = handle_request(reducer, model_selection, payload, ready_timeout)
+        except Exception as e:
+            logger.error(f"Error handling request: {e}")
+            reply = {"error": ERROR_REDUCE}
+        socket.send_multipart(envelope + [seq, msgpack.packb(reply, use_bin_type=True)])
+
+
+def run_worker(backend_address: str, worker_index: int, ready_timeout: float = 60.0, prefetch: int = 2) -> None:
+    """Entry point of a worker process: load the models and serve requests from the broker"""
+    from .reducer import LatentSpaceReducer
+    from .redis_model_store import ModelSelectionCache
+
+    reducer = LatentSpaceReducer()
+    model_selection = ModelSelectionCache(reducer.redis_model_store)
+
+    context = zmq.Context()
+    socket = context.socket(zmq.DEALER)
+    # Only take a few requests at a time, so the broker hands the rest to idle workers
+    socket.setsockopt(zmq.RCVHWM, prefetch)
+    socket.connect(backend_address)
+    logger.info(f"Reducer worker {worker_index} connected to {backend_address}")
+    serve_requests(socket, reducer, model_selection, ready_timeout)
+
+
+class ReducerWorkerPool:
+    """
+    Runs LatentSpaceReducer instances in num_workers processes behind a
+    ROUTER/DEALER broker, and submits requests to them from the operator.
+
+    Requests are pipelined: submit() returns a future right away and up to
+    max_in_flight requests can be outstanding. Replies are matched to their
+    request by a sequence number, the caller decides in which order to use them.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        frontend_address: str = "tcp://127.0.0.1:5601",
+        backend_address: str = "tcp://127.0.0.1:5602",
+        max_in_flight: int = None,
+        ready_timeout: float = 60.0,
+    ):
+        self.num_workers = num_workers
+        self.frontend_address = frontend_address
+        self.backend_address = backend_address
+        self.max_in_flight = max_in_flight or 2 * num_workers
+        self.ready_timeout = ready_timeout
+
+        self.socket = zmq.asyncio.Context.instance().socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.SNDHWM, 10000)
+        self.socket.setsockopt(zmq.RCVHWM, 10000)
+
+        self._seq = itertools.count()
+        self._futures = {}
+        self._receiver = None
+        self._slots = None
+        self.processes = []
+
+    def start(self, start_broker: bool = True, start_workers: bool = True) -> None:
+        """Start the broker thread and the worker processes, then connect to the broker"""
+        if start_broker:
+            thread = threading.Thread(
+                target=run_broker, args=(self.frontend_address, self.backend_address), daemon=True
+            )
+            thread.start()
+
+        if start_workers:
+            # Spawn rather than fork: the operator process already runs threads and an event loop
+            mp_context = multiprocessing.get_context("spawn")
+            for worker_index in range(self.num_workers):
+                process = mp_context.Process(
+                    target=run_worker,
+                    args=(self.backend_address, worker_index, self.ready_timeout),
+                    daemon=True,
+                    name=f"lse-reducer-worker-{worker_index}",
+                )
+                process.start()
+                self.processes.append(process)
+            logger.info(f"Started {self.num_workers} reducer worker processes")
+
+        self.socket.connect(self.frontend_address)
+
+    def stop(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        self.processes = []
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        self.socket.close(linger=0)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._futures)
+
+    async def submit(self, messages: list) -> asyncio.Future:
+        """
+        Send a request for the given frames, waiting for a free slot if
+        max_in_flight requests are outstanding. Returns a future that
+        resolves to the worker's reply dict.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self._receiver is None:
+            self._receiver = asyncio.create_task(self._receive_replies())
+
+        await self._slots.acquire()
+        seq = next(self._seq)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[seq] = future
+        try:
+            payload = msgpack.packb([message.model_dump() for message in messages], use_bin_type=True)
+            await self.socket.send_multipart([seq.to_bytes(8, "big"), payload])
+        except Exception as e:
+            logger.error(f"Error sending request to worker pool: {e}")
+            self._resolve(seq, {"error": ERROR_REQUEST})
+        return future
+
+    def _resolve(self, seq: int, reply: dict) -> None:
+        future = self._futures.pop(seq, None)
+        if future is None:
+            logger.warning(f"Received reply for unknown request {seq}")
+            return
+        self._slots.release()
+        if not future.done():
+            future.set_result(reply)
+
+    async def _receive_replies(self) -> None:
+        while True:
+            try:
+                seq, payload = await self.socket.recv_multipart()
+                self._resolve(int.from_bytes(seq, "big"), msgpack.unpackb(payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error receiving reply from worker pool: {e}")
+
+    @classmethod
+    def from_settings(cls, settings) -> "ReducerWorkerPool":
+        return cls(
+            num_workers=settings.get("num_workers", 0),
+            frontend_address=settings.get("frontend_address", "tcp://127.0.0.1:5601"),
+            backend_address=settings.get("backend_address", "tcp://127.0.0.1:5602"),
+            max_in_flight=settings.get("max_in_flight"),
+            ready_timeout=settings.get("ready_timeout_s", 60),
+        )
@@ -0,0 +1,111 @@
+import base64
+import json
+
+import msgpack
+import numpy as np
+
+# Websocket subprotocols understood by LSEWSResultPublisher. Clients that do not
+# ask for one get the legacy format: one LatentSpaceEvent JSON text frame per event.
+#
+# Both protocols send a "session" frame with the tiled_url and model names once,
+# then "batch" frames that reference it by id. A batch holds every event produced
+# within the flush interval: the frame indices as little-endian int32 and the
+# feature vectors as a row-major count x dims little-endian float32 array.
+# A client that connects mid-session first gets a "snapshot" frame: a batch with
+# every point of the session so far, replacing whatever the client had drawn.
+#   - lse.v2.msgpack: binary msgpack frames, the arrays as raw bytes
+#   - lse.v2.b64: JSON text frames, the arrays base64 encoded. For the browser,
+#     where dash-extensions hands binary frames to callbacks as a Blob.
+PROTOCOL_MSGPACK = "lse.v2.msgpack"
+PROTOCOL_BASE64 = "lse.v2.b64"
+SUBPROTOCOLS = (PROTOCOL_MSGPACK, PROTOCOL_BASE64)
+
+INDEX_DTYPE = np.dtype("<i4")
+FEATURE_DTYPE = np.dtype("<f4")
+
+
+def select_subprotocol(connection, subprotocols):
+    """Pick the first protocol we support, or None for a legacy JSON client"""
+    for subprotocol in SUBPROTOCOLS:
+        if subprotocol in subprotocols:
+            return subprotocol
+    return None
+
+
+def session_frame(session_id: int, tiled_url: str, autoencoder_model: str, dimred_model: str) -> dict:
+    return {
+        "type": "session",
+        "session": session_id,
+        "tiled_url": tiled_url,
+        "autoencoder_model": autoencoder_model,
+        "dimred_model": dimred_model,
+    }
+
+
+def batch_frame(session_id: int, events: list) -> dict:
+    """Build a batch from LatentSpaceEvents that share a session and dimensionality"""
+    return {
+        "type": "batch",
+        "session": session_id,
+        "count": len(events),
+        "dims": len(events[0].feature_vector) if events else 0,
+        "index": np.fromiter((event.index for event in events), dtype=INDEX_DTYPE, count=len(events)),
+        "feature_vector": np.asarray([event.feature_vector for event in events], dtype=FEATURE_DTYPE),
+        "frames_skipped": sum(event.frames_skipped for event in events),
+        "sampling_policy": events[-1].sampling_policy if events else None,
+    }
+
+
+def snapshot_frame(session_id: int, index: np.ndarray, feature_vectors: np.ndarray) -> dict:
+    return {
+        "type": "snapshot",
+        "session": session_id,
+        "count": len(index),
+        "dims": feature_vectors.shape[1] if len(index) else 0,
+        "index": index,
+        "feature_vector": feature_vectors,
+        "frames_skipped": 0,
+        "sampling_policy": None,
+    }
+
+
+def encode(frame: dict, protocol: str):
+    """Serialize a session or batch frame, bytes for msgpack and str for base64"""
+    frame = dict(frame)
+    for key in ("index", "feature_vector"):
+        if key in frame:
+            raw = np.ascontiguousarray(frame[key], dtype=INDEX_DTYPE if key == "index" else FEATURE_DTYPE).tobytes()
+            frame[key] = raw if protocol == PROTOCOL_MSGPACK else base64.b64encode(raw).decode("ascii")
+    if protocol == PROTOCOL_MSGPACK:
+        return msgpack.packb(frame, use_bin_type=True)
+    return json.dumps(frame, separators=(",", ":"))
+
+
+def decode(payload) -> dict:
+    """Inverse of encode, e.g. for Python clients: arrays are returned as numpy arrays"""
+    if isinstance(payload, (bytes, bytearray)):
+        frame = msgpack.unpackb(payload)
+    else:
+        frame = json.loads(payload)
+        for key in ("index", "feature_vector"):
+            if key in frame:
+                frame[key] = base64.b64decode(frame[key])
+    if frame.get("type") in ("batch", "snapshot"):
+        frame["index"] = np.frombuffer(frame["index"], dtype=INDEX_DTYPE)
+        frame["feature_vector"] = np.frombuffer(frame["feature_vector"], dtype=FEATURE_DTYPE).reshape(
+            frame["count"], frame["dims"]
+        )
+    return frame
+
+
+def merge_batches(first: dict, second: dict) -> dict:
+    """Concatenate two batches of the same session into one"""
+    return {
+        **second,
+        # A snapshot followed by a batch is still a snapshot
+        "type": first["type"],
+        "count": first["count"] + second["count"],
+        "index": np.concatenate([first["index"], second["index"]]),
+        "feature_vector": np.concatenate([first["feature_vector"], second["feature_vector"]]),
+        "frames_skipped": first["frames_skipped"] + second["frames_skipped"],
+    }
@@ -1,9 +1,227 @@
 // Set this in your HTML or another script to configure log level
 // window.DASH_LOG_LEVEL = 3; // INFO level by default
 
+// Decode a base64 string holding a little-endian typed array
+function decodeBase64Array(b64, ArrayType) {
+    const binary = atob(b64);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new ArrayType(bytes.buffer);
+}
+
+// Encode a typed array as base64 of its little-endian bytes, the inverse of decodeBase64Array
+function encodeBase64Array(array) {
+    const bytes = new Uint8Array(array.buffer, array.byteOffset, array.byteLength);
+    let binary = "";
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return btoa(binary);
+}
+
+// The events of a message as columns: {tiled_url, autoencoder_model, dimred_model, count, dims, index, coords}.
+// A "batch" or "snapshot" frame (protocol lse.v2.b64) already is columnar and takes the tiled_url
+// and model names from the session frame it references, a legacy JSON message holds one event
+function liveMessageColumns(data, log) {
+    if (data.type !== "batch" && data.type !== "snapshot") {
+        const feature_vector = data.feature_vector || [];
+        const index = parseInt(data.index);
+        return {
+            "tiled_url": data.tiled_url,
+            "autoencoder_model": data.autoencoder_model,
+            "dimred_model": data.dimred_model,
+            "count": feature_vector.length > 0 ? 1 : 0,
+            "dims": feature_vector.length,
+            "index": Int32Array.of(Number.isNaN(index) ? -1 : index),
+            "coords": Float32Array.from(feature_vector),
+        };
+    }
+    const session = (window.lseLiveSessions || {})[data.session];
+    if (!session) {
+        log.warn(`Dropping batch of ${data.count} events from unknown session ${data.session}`);
+        return null;
+    }
+    return {
+        "tiled_url": session.tiled_url,
+        "autoencoder_model": session.autoencoder_model,
+        "dimred_model": session.dimred_model,
+        "count": data.count,
+        "dims": data.dims,
+        "index": decodeBase64Array(data.index, Int32Array),
+        "coords": decodeBase64Array(data.feature_vector, Float32Array),
+    };
+}
+
+// Remember a "session" frame, whether or not live mode is on, as the batches that follow reference it
+function rememberLiveSession(message) {
+    if (!message || typeof message.data !== "string" || !message.data.startsWith('{"type":"session"')) {
+        return false;
+    }
+    const session = JSON.parse(message.data);
+    window.lseLiveSessions = window.lseLiveSessions || {};
+    window.lseLiveSessions[session.session] = session;
+    return true;
+}
+
+// Spinner shown while waiting for the points of newly selected models
+function liveSpinnerStyle(display) {
+    return {
+        "position": "fixed",
+        "top": 0,
+        "left": 0,
+        "width": "100%",
+        "height": "100%",
+        "backgroundColor": "rgba(0, 0, 0, 0.7)",
+        "zIndex": 9998,
+        "display": display
+    };
+}
+
+// Every point of the live plot, kept in window.lseLiveColumns: the coordinates in a Float32Array
+// of dims values per point and the data project index of each point in an Int32Array, in plot order.
+// Both double in capacity when full. plotted counts the points already sent to Plotly and datasets
+// holds one data project entry per tiled run rather than one per message.
+function newLiveColumns(models, dims) {
+    const capacity = 1024;
+    return {
+        "models": models,
+        "dims": dims,
+        "count": 0,
+        "plotted": 0,
+        "capacity": capacity,
+        "coords": new Float32Array(capacity * dims),
+        "index": new Int32Array(capacity),
+        "datasets": [],
+    };
+}
+
+function appendLiveColumns(columns, batch) {
+    const needed = columns.count + batch.count;
+    if (needed > columns.capacity) {
+        let capacity = columns.capacity;
+        while (capacity < needed) {
+            capacity *= 2;
+        }
+        const coords = new Float32Array(capacity * columns.dims);
+        coords.set(columns.coords.subarray(0, columns.count * columns.dims));
+        const index = new Int32Array(capacity);
+        index.set(columns.index.subarray(0, columns.count));
+        columns.coords = coords;
+        columns.index = index;
+        columns.capacity = capacity;
+    }
+    columns.coords.set(batch.coords.subarray(0, batch.count * columns.dims), columns.count * columns.dims);
+    columns.index.set(batch.index.subarray(0, batch.count), columns.count);
+    columns.count = needed;
+}
+
+// Coordinates of the points start to end as column arrays, z only for three dimensional feature vectors
+function liveColumnPoints(columns, start, end) {
+    const dims = columns.dims;
+    const coords = columns.coords;
+    let points = {"x": new Array(end - start), "y": new Array(end - start), "z": dims >= 3 ? new Array(end - start) : null};
+    for (let i = start; i < end; i++) {
+        points.x[i - start] = coords[i * dims];
+        points.y[i - start] = coords[i * dims + 1];
+        if (points.z) {
+            points.z[i - start] = coords[i * dims + 2];
+        }
+    }
+    return points;
+}
+
+// A scatter figure holding the given points, laid out like plot_utils.generate_scatter_data
+function liveScatterFigure(points) {
+    let trace = {"x": points.x, "y": points.y, "mode": "markers", "type": "scattergl"};
+    if (points.z) {
+        trace = {...trace, "z": points.z, "type": "scatter3d", "marker": {"size": 3}};
+    }
+    return {
+        "data": [trace],
+        "layout": {
+            "dragmode": "lasso",
+            "margin": {"l": 20, "r": 20, "b": 20, "t": 20, "pad": 0},
+            "showlegend": false
+        }
+    };
+}
+
+// Whether the figure holds the live trace, rather than e.g. the empty scatter the server sets on a model change
+function hasLiveTrace(figure, columns) {
+    const trace = figure && figure.data && figure.data[0];
+    return Boolean(trace) && Array.isArray(trace.x) && trace.type === (columns.dims >= 3 ? "scatter3d" : "scattergl");
+}
+
+// Plot the points not plotted yet: [figure, extendData]. Only these go to Plotly.extendTraces,
+// unless the plot has no live trace yet or must start over, then the figure is rebuilt from all points
+function plotLiveColumns(columns, figure, replace) {
+    const no_update = window.dash_clientside.no_update;
+    if (replace || !hasLiveTrace(figure, columns)) {
+        columns.plotted = columns.count;
+        return [liveScatterFigure(liveColumnPoints(columns, 0, columns.count)), no_update];
+    }
+    if (columns.plotted === columns.count) {
+        return [no_update, no_update];
+    }
+    const points = liveColumnPoints(columns, columns.plotted, columns.count);
+    columns.plotted = columns.count;
+    let update = {"x": [points.x], "y": [points.y]};
+    if (points.z) {
+        update["z"] = [points.z];
+    }
+    return [no_update, [update, [0]]];
+}
+
+// Add the events of a message to the live columns, mapping their frame index in the tiled run to a
+// data project index: the runs follow each other, so each only needs a cumulative_data_count entry
+function addLiveEvents(columns, batch, log) {
+    let url = new URL(batch.tiled_url);
+    let path_parts = url.pathname.split('/');
+    let root_uri = batch.tiled_url;
+    let uri = "";
+
+    if (path_parts.length > 1 && path_parts[path_parts.length - 1] !== '') {
+        let root_path = path_parts.slice(0, -1).join('/') + '/';
+        root_uri = url.protocol + '//' + url.host + root_path;
+        uri = path_parts[path_parts.length - 1];
+    }
+    log.debug("Root URI:", root_uri, "URI:", uri);
+
+    let datasets = columns.datasets;
+    let dataset = datasets[datasets.length - 1];
+    if (!dataset || dataset.uri !== uri) {
+        const offset = dataset ? dataset.cumulative_data_count : 0;
+        dataset = {"uri": uri, "cumulative_data_count": offset, "offset": offset};
+        datasets.push(dataset);
+        log.info(`Live points from ${uri} start at data project index ${offset}`);
+    }
+    columns.root_uri = root_uri;
+
+    // Frames without an index are plotted but cannot be selected
+    let index = new Int32Array(batch.count);
+    for (let i = 0; i < batch.count; i++) {
+        const frame = batch.index[i];
+        index[i] = frame >= 0 ? dataset.offset + frame : -1;
+        dataset.cumulative_data_count = Math.max(dataset.cumulative_data_count, index[i] + 1);
+    }
+    appendLiveColumns(columns, {...batch, "index": index});
+}
+
+// The data project of the live points, with the dataset entries of the live columns
+function liveDataProject(data_project_dict, columns) {
+    return {
+        ...data_project_dict,
+        "root_uri": columns.root_uri,
+        "data_type": "tiled",
+        "datasets": columns.datasets.map(d => ({"uri": d.uri, "cumulative_data_count": d.cumulative_data_count})),
+    };
+}
+
 window.dash_clientside = Object.assign({}, window.dash_clientside, {
     liveWS: {
-        updateLiveData: function(message, buffer_data, n_clicks, data_project_dict, live_indices, selected_models) {
+        updateLiveData: function(message, pause_n_clicks, n_clicks, data_project_dict, selected_models, figure) {
             // Initialize log level if not set
             window.DASH_LOG_LEVEL = window.DASH_LOG_LEVEL || 3;
 
@@ -22,14 +240,34 @@ window.dash_clientside = Object.assign({}, window.dash_clientside, {
                 debug: (msg, ...args) => window.DASH_LOG_LEVEL >= LOG_LEVELS.DEBUG && console.log('[DEBUG]', msg, ...args)
             };
 
-            if (n_clicks !== null && n_clicks % 2 === 1) {
+            const no_update = window.dash_clientside.no_update;
+            const live = n_clicks !== null && n_clicks !== undefined && n_clicks % 2 === 1;
+            const paused = pause_n_clicks !== null && pause_n_clicks !== undefined && pause_n_clicks % 2 === 1;
+            const models = selected_models ? `${selected_models.autoencoder}/${selected_models.dimred}` : null;
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+
+            // Resuming the live display plots what arrived while it was paused
+            if (triggered.includes("pause-button.n_clicks")) {
+                const columns = window.lseLiveColumns;
+                if (!live || paused || !columns || columns.models !== models || columns.plotted === columns.count) {
+                    return [no_update, no_update, no_update, no_update, no_update];
+                }
+                log.info(`Plotting ${columns.count - columns.plotted} points received while paused`);
+                return [...plotLiveColumns(columns, figure, false), no_update, no_update, no_update];
+            }
+
+            // A session frame carries no points, nothing to update
+            if (rememberLiveSession(message)) {
+                log.info("Live session:", message.data);
+                return [no_update, no_update, no_update, no_update, no_update];
+            }
+
+            if (live) {
                 try {
                     log.info("Clientside callback triggered with message:", message);
-                    log.debug("Current buffer_data:", buffer_data, "Type:", typeof buffer_data);
                     log.debug("Selected models:", selected_models);
 
                     // Initialize default values
-                    if (!Array.isArray(buffer_data)) buffer_data = [];
                     if (Object.keys(data_project_dict).length === 0) {
                         data_project_dict = {
                             "root_uri": "",
@@ -39,198 +277,135 @@ window.dash_clientside = Object.assign({}, window.dash_clientside, {
                         };
                         log.debug("Initialized data_project_dict:", data_project_dict);
                     }
-                    if (!Array.isArray(live_indices)) live_indices = [];
 
                     // Check if selected_models is None/null - if so, prevent the update
                     if (selected_models === null || selected_models === undefined) {
                         log.warn("Selected models is None/null - preventing update");
-                        return [buffer_data, data_project_dict, live_indices,
-                               {
-                                   "position": "fixed",
-                                   "top": 0,
-                                   "left": 0,
-                                   "width": "100%",
-                                   "height": "100%",
-                                   "backgroundColor": "rgba(0, 0, 0, 0.7)",
-                                   "zIndex": 9998,
-                                   "display": "none"  // Hide the spinner when no models selected
-                               },
-                               false];
+                        // Hide the spinner when no models selected
+                        return [no_update, no_update, data_project_dict, liveSpinnerStyle("none"), false];
                     }
 
                     // Default spinner and transition states
-                    let spinner_style = {
-                        "position": "fixed",
-                        "top": 0,
-                        "left": 0,
-                        "width": "100%",
-                        "height": "100%",
-                        "backgroundColor": "rgba(0, 0, 0, 0.7)",
-                        "zIndex": 9998,
-                        "display": "block"
-                    };
+                    let spinner_style = liveSpinnerStyle("block");
                     let transition_state = true;
 
-                    if (message && message.data) {
-                        let data = message.data;
-                        log.debug("Raw message data:", data);
-
-                        if (typeof data === "string") {
-                            try {
-                                data = JSON.parse(data);
-                                log.debug("Parsed message data:", data);
-                            } catch (e) {
-                                log.error("Failed to parse message data:", e);
-                                return [buffer_data, data_project_dict, live_indices, spinner_style, transition_state];
-                            }
-                        }
+                    if (!message || !message.data) {
+                        return [no_update, no_update, data_project_dict, spinner_style, transition_state];
+                    }
 
-                        // Extract model information from message
-                        let autoencoder_model = data.autoencoder_model;
-                        let dimred_model = data.dimred_model;
-                        log.debug("Message models - Autoencoder:", autoencoder_model, "Dimred:", dimred_model);
-
-                        // Check if model names match currently selected models
-                        if (selected_models !== null && selected_models !== undefined) {
-                            let current_autoencoder = selected_models.autoencoder;
-                            let current_dimred = selected_models.dimred;
-                            log.debug("Current selected models - Autoencoder:", current_autoencoder, "Dimred:", current_dimred);
-
-                            // Skip buffer entries from different models
-                            if ((autoencoder_model && autoencoder_model !== current_autoencoder) ||
-                                (dimred_model && dimred_model !== current_dimred)) {
-                                log.info(`Skipping buffer entries from different models: got ${autoencoder_model}/${dimred_model}, expected ${current_autoencoder}/${current_dimred}`);
-
-                                // Return current state without modifications when models don't match
-                                return [buffer_data, data_project_dict, live_indices, spinner_style, transition_state];
-                            }
-
-                            // If we got a matching model message, hide the spinner
-                            log.info("Models match - hiding spinner");
-                            spinner_style = {
-                                "position": "fixed",
-                                "top": 0,
-                                "left": 0,
-                                "width": "100%",
-                                "height": "100%",
-                                "backgroundColor": "rgba(0, 0, 0, 0.7)",
-                                "zIndex": 9998,
-                                "display": "none"  // Hide the spinner
-                            };
-                            transition_state = false;
-                        }
+                    let data = message.data;
+                    log.debug("Raw message data:", data);
 
-                        // Process the data (existing logic)
-                        let new_entry = {};
-                        if (data.feature_vector) {
-                            log.debug("Feature vector found:", data.feature_vector);
-                            new_entry["feature_vector"] = data.feature_vector;
-                            new_entry["num_components"] = data.feature_vector.length;
-                        } else {
-                            log.debug("No feature vector in data.");
+                    if (typeof data === "string") {
+                        try {
+                            data = JSON.parse(data);
+                            log.debug("Parsed message data:", data);
+                        } catch (e) {
+                            log.error("Failed to parse message data:", e);
+                            return [no_update, no_update, data_project_dict, spinner_style, transition_state];
                         }
+                    }
 
-                        buffer_data = [...buffer_data, new_entry];
-                        log.debug("Updated buffer_data:", buffer_data);
+                    // A batch holds several events, the legacy format one event per message
+                    let batch = liveMessageColumns(data, log);
+                    if (!batch || batch.count === 0) {
+                        return [no_update, no_update, data_project_dict, spinner_style, transition_state];
+                    }
 
-                        let tiled_url = data.tiled_url;
-                        let index = parseInt(data.index);
-                        log.debug("Tiled URI:", tiled_url, "Index:", index);
+                    // Extract model information from message
+                    let autoencoder_model = batch.autoencoder_model;
+                    let dimred_model = batch.dimred_model;
+                    log.debug("Message models - Autoencoder:", autoencoder_model, "Dimred:", dimred_model);
 
-                        let url = new URL(tiled_url);
-                        let path_parts = url.pathname.split('/');
-                        let root_uri = tiled_url;
-                        let uri = "";
+                    // Skip events from different models
+                    if ((autoencoder_model && autoencoder_model !== selected_models.autoencoder) ||
+                        (dimred_model && dimred_model !== selected_models.dimred)) {
+                        log.info(`Skipping events from different models: got ${autoencoder_model}/${dimred_model}, expected ${models}`);
 
-                        if (path_parts.length > 1 && path_parts[path_parts.length - 1] !== '') {
-                            let root_path = path_parts.slice(0, -1).join('/') + '/';
-                            root_uri = url.protocol + '//' + url.host + root_path;
-                            uri = path_parts[path_parts.length - 1];
-                        }
+                        // Return current state without modifications when models don't match
+                        return [no_update, no_update, data_project_dict, spinner_style, transition_state];
+                    }
 
-                        log.debug("Root URI:", root_uri, "URI:", uri);
+                    // If we got a matching model message, hide the spinner
+                    log.info("Models match - hiding spinner");
+                    spinner_style = liveSpinnerStyle("none");
+                    transition_state = false;
 
-                        if (index >= 0) {
-                            live_indices = [...live_indices, index];
-                            log.debug("Updated live_indices:", live_indices);
-                        }
-
-                        let cum_size = Math.max(...live_indices) + 1;
-                        log.debug("Cumulative size:", cum_size);
+                    // Every point of the session so far, e.g. after a reconnect: start over from it.
+                    // So do other models, and a plot the server cleared, e.g. when continuing with models
+                    let replace = data.type === "snapshot";
+                    let columns = window.lseLiveColumns;
+                    if (replace || !columns || columns.models !== models || columns.dims !== batch.dims ||
+                        (columns.plotted > 0 && !hasLiveTrace(figure, columns))) {
+                        log.info(`Starting live columns for ${models} with ${batch.count} points`);
+                        columns = newLiveColumns(models, batch.dims);
+                        window.lseLiveColumns = columns;
+                        replace = true;
+                    }
 
-                        if (data_project_dict["root_uri"] !== root_uri) {
-                            data_project_dict = {
-                                ...data_project_dict,
-                                "root_uri": root_uri,
-                                "data_type": "tiled"
-                            };
-                            log.info("Updated data_project_dict root_uri and data_type:", data_project_dict);
-                        }
+                    addLiveEvents(columns, batch, log);
+                    data_project_dict = liveDataProject(data_project_dict, columns);
+                    log.debug("Updated datasets in data_project_dict:", data_project_dict["datasets"]);
 
-                        if (data_project_dict["datasets"].length === 0) {
-                            data_project_dict = {
-                                ...data_project_dict,
-                                "datasets": [{
-                                    "uri": uri,
-                                    "cumulative_data_count": cum_size
-                                }]
-                            };
-                            log.debug("Initialized datasets in data_project_dict:", data_project_dict["datasets"]);
-                        } else {
-                            data_project_dict = {
-                                ...data_project_dict,
-                                "datasets": [
-                                    ...data_project_dict["datasets"],
-                                    {
-                                        "uri": uri,
-                                        "cumulative_data_count": cum_size
-                                    }
-                                ]
-                            };
-                            log.debug("Appended to datasets in data_project_dict:", data_project_dict["datasets"]);
-                        }
-                    }
+                    // Only the new points go to the plot, while paused they wait in the columns
+                    let plot = paused ? [no_update, no_update] : plotLiveColumns(columns, figure, replace);
 
-                    return [buffer_data, data_project_dict, live_indices, spinner_style, transition_state];
+                    return [...plot, data_project_dict, spinner_style, transition_state];
 
                 } catch (error) {
                     log.error("Error in clientside callback:", error);
                     return [
-                        Array.isArray(buffer_data) ? buffer_data : [],
+                        no_update,
+                        no_update,
                         data_project_dict || { "root_uri": "", "data_type": "", "datasets": [], "project_id": "live" },
-                        Array.isArray(live_indices) ? live_indices : [],
-                        {
-                            "position": "fixed",
-                            "top": 0,
-                            "left": 0,
-                            "width": "100%",
-                            "height": "100%",
-                            "backgroundColor": "rgba(0, 0, 0, 0.7)",
-                            "zIndex": 9998,
-                            "display": "block"
-                        },
+                        liveSpinnerStyle("block"),
                         true
                     ];
                 }
             }
 
             // Return current state when not in live mode (n_clicks is even or null)
-            return [
-                buffer_data,
-                data_project_dict,
-                live_indices,
-                {
-                    "position": "fixed",
-                    "top": 0,
-                    "left": 0,
-                    "width": "100%",
-                    "height": "100%",
-                    "backgroundColor": "rgba(0, 0, 0, 0.7)",
-                    "zIndex": 9998,
-                    "display": "none"
-                },
-                false
-            ];
+            return [no_update, no_update, data_project_dict, liveSpinnerStyle("none"), false];
+        },
+
+        selectLivePoints: function(selected_data, click_data, go_live_n_clicks) {
+            // Offline, display.update_heatmap reads the point indices from the selection itself
+            if (go_live_n_clicks === null || go_live_n_clicks === undefined || go_live_n_clicks % 2 === 0) {
+                return window.dash_clientside.no_update;
+            }
+            let positions = [];
+            if (selected_data && selected_data.points && selected_data.points.length > 0) {
+                positions = selected_data.points.map(p => p.pointIndex);
+            } else if (click_data && click_data.points && click_data.points.length > 0) {
+                positions = [click_data.points[0].pointIndex];
+            }
+
+            // Only the data project indices of the selected points are sent to the server
+            const columns = window.lseLiveColumns;
+            let index = new Int32Array(positions.length);
+            let count = 0;
+            for (const position of positions) {
+                if (columns && position >= 0 && position < columns.count && columns.index[position] >= 0) {
+                    index[count++] = columns.index[position];
+                }
+            }
+            if (count === 0) {
+                return null;
+            }
+            return {"count": count, "index": encodeBase64Array(index.subarray(0, count))};
+        },
+
+        clearLiveSelection: function(n_clicks, go_live_n_clicks) {
+            // Offline, display.clear_selections patches the figure on the server
+            if (!n_clicks || go_live_n_clicks === null || go_live_n_clicks === undefined || go_live_n_clicks % 2 === 0) {
+                return window.dash_clientside.no_update;
+            }
+            const graph = document.querySelector("#scatter .js-plotly-plot");
+            if (graph && window.Plotly) {
+                window.Plotly.restyle(graph, {"selectedpoints": [null]});
+                window.Plotly.relayout(graph, {"selections": []});
+            }
+            return null;
         }
     }
 });
@@ -1,22 +1,62 @@
+import functools
 import io
 import math
-from base64 import b64encode
+import os
+from base64 import b64decode, b64encode
 
 import numpy as np
-from dash import ALL, Input, Output, Patch, State, callback, no_update
+from dash import ALL, Input, Output, Patch, State, callback, ctx, no_update
 from dash.exceptions import PreventUpdate
 from file_manager.data_project import DataProject
 from mlex_utils.prefect_utils.core import get_children_flow_run_ids
 from PIL import Image
 
-from src.app_layout import DATA_TILED_KEY, NUM_IMGS_OVERVIEW, USER
+from src.app_layout import DATA_TILED_KEY, NUM_IMGS_OVERVIEW, USER, cache
 from src.utils.data_utils import hash_list_of_strings, tiled_results
+from src.utils.lod_utils import use_lod, viewport_from_relayout
 from src.utils.plot_utils import (
     generate_heatmap_plot,
+    generate_lod_scatter_data,
     generate_scatter_data,
     plot_empty_heatmap,
     plot_empty_scatter,
 )
+from src.utils.spatial_index import LatentIndex, LiveSessionIndexes
+
+
+# Spatial indexes over the points of the live sessions, read from the session log
+live_indexes = LiveSessionIndexes()
+
+# Results are immutable once written, they only expire to bound the cache's size
+LATENT_CACHE_EXPIRE = int(os.getenv("LATENT_CACHE_EXPIRE", 3600))
+
+
+@cache.memoize(name="latent-vectors", expire=LATENT_CACHE_EXPIRE)
+def read_latent_vectors(result_uri):
+    """
+    Read the latent vectors of a dimension reduction result. They are kept in the
+    app's disk cache, shared by the workers, as the level of detail callbacks
+    need them on every zoom and selection.
+    Args:
+        result_uri:             trimmed uri of the result in tiled_results
+    Returns:
+        latent_vectors, n_components
+    """
+    result = tiled_results.get_data_by_trimmed_uri(result_uri)
+    return result.read().to_numpy(), result.metadata["model_parameters"]["n_components"]
+
+
+@cache.memoize(name="cluster-labels", expire=LATENT_CACHE_EXPIRE)
+def read_cluster_labels(result_uri):
+    """
+    Read the cluster labels of a clustering result
+    Args:
+        result_uri:             trimmed uri of the result in tiled_results
+    Returns:
+        numpy.ndarray of the cluster label of each point
+    """
+    cluster_df = tiled_results.get_data_by_trimmed_uri(result_uri).read()
+    return cluster_df["cluster_label"].to_numpy()
 
 
 def get_empty_image():
@@ -192,6 +232,7 @@ def update_project_name(data_project_dict, go_live):
 
 @callback(
     Output("scatter", "figure"),
+    Output("scatter-result", "data"),
     Input("show-feature-vectors", "value"),
     Input(
         {
@@ -218,36 +259,43 @@ def show_feature_vectors(
     show_clusters,
 ):
     if show_clusters:
-        return no_update
+        return no_update, no_update
     if show_feature_vectors is False:
-        return plot_empty_scatter()
+        return plot_empty_scatter(), None
 
     child_job_id = get_children_flow_run_ids(job_id)[1]
     expected_result_uri = f"{USER}/{project_name}/{child_job_id}"
-    latent_vectors = (
-        tiled_results.get_data_by_trimmed_uri(expected_result_uri).read().to_numpy()
-    )
-    metadata = tiled_results.get_data_by_trimmed_uri(expected_result_uri).metadata
+    latent_vectors, n_components = read_latent_vectors(expected_result_uri)
 
-    scatter_data = generate_scatter_data(
-        latent_vectors, metadata["model_parameters"]["n_components"]
-    )
-    return scatter_data
+    result = {
+        "latent_uri": expected_result_uri,
+        "cluster_uri": None,
+        "lod": use_lod(latent_vectors.shape[0], n_components),
+    }
+    if result["lod"]:
+        return generate_lod_scatter_data(latent_vectors), result
+
+    scatter_data = generate_scatter_data(latent_vectors, n_components)
+    return scatter_data, result
 
 
 @callback(
     Output("scatter", "figure", allow_duplicate=True),
     Input("clear-selection-button", "n_clicks"),
     State("scatter", "figure"),
+    State("go-live", "n_clicks"),
     prevent_initial_call=True,
 )
-def clear_selections(n_clicks, current_fig):
+def clear_selections(n_clicks, current_fig, go_live):
     """
     Clears any 'selectedpoints' in the figure's traces using a Dash Patch,
     so we don't have to re-plot from scratch.
     """
     if not n_clicks:
         return no_update
+    if go_live is not None and go_live % 2 == 1:
+        # Live points are only in the browser, liveWS.clearLiveSelection handles it
+        raise PreventUpdate
 
     # Create a Patch object to mutate the figure incrementally
     fig_patch = Patch()
@@ -266,6 +314,77 @@ def clear_selections(n_clicks, current_fig):
     return fig_patch
 
 
+@callback(
+    Output("scatter", "figure", allow_duplicate=True),
+    Input("scatter", "relayoutData"),
+    State("scatter-result", "data"),
+    State("go-live", "n_clicks"),
+    prevent_initial_call=True,
+)
+def rebin_lod_scatter(relayout_data, result, go_live):
+    """
+    Re-bins the density raster and re-samples the points of the visible region
+    when a scatter drawn at a reduced level of detail is zoomed or panned
+    """
+    if result is None or not result["lod"] or (go_live is not None and go_live % 2 == 1):
+        raise PreventUpdate
+    viewport = viewport_from_relayout(relayout_data)
+    if viewport is None:
+        raise PreventUpdate
+
+    latent_vectors, _ = read_latent_vectors(result["latent_uri"])
+    clusters = None
+    if result["cluster_uri"] is not None:
+        clusters = read_cluster_labels(result["cluster_uri"])
+    x_range, y_range = viewport
+    scatter_figure = generate_lod_scatter_data(
+        latent_vectors, x_range, y_range, clusters=clusters
+    )
+
+    # Only the traces change, the layout keeps the user's zoom
+    fig_patch = Patch()
+    fig_patch["data"] = scatter_figure.to_dict()["data"]
+    return fig_patch
+
+
+def decode_live_indices(live_indices):
+    """
+    Decode the data project indices of the selected live points
+    Args:
+        live_indices:           {"count": n, "index": base64 of little-endian int32} or None
+    Returns:
+        indices:                list of data project indices
+    """
+    if not live_indices:
+        return []
+    indices = np.frombuffer(b64decode(live_indices["index"]), dtype="<i4")
+    return indices[: live_indices["count"]].tolist()
+
+
+@functools.lru_cache(maxsize=4)
+def latent_index(latent_uri):
+    """The spatial index over the latent vectors of a result"""
+    latent_vectors, n_components = read_latent_vectors(latent_uri)
+    return LatentIndex(latent_vectors[:, :n_components])
+
+
+def result_selection_indices(result, selected_data, click_data):
+    """
+    Resolve a selection of an offline result's scatter against every point of
+    the result, whether the figure holds all of them or a subsample
+    Args:
+        result:                 scatter-result data, the uri of the latent vectors
+        selected_data:          lasso or rect selected data points on scatter figure
+        click_data:             clicked data on scatter figure
+    Returns:
+        indices:                list of rows of the latent vectors
+    """
+    positions = latent_index(result["latent_uri"]).select(selected_data, click_data)
+    if positions is None:
+        return []
+    return positions.tolist()
+
+
 @callback(
     Output("heatmap", "figure"),
     Output("stats-div", "children", allow_duplicate=True),
@@ -274,8 +393,11 @@ def clear_selections(n_clicks, current_fig):
     Input("mean-std-toggle", "value"),
     Input("log-transform", "value"),
     Input("min-max-percentile", "value"),
+    Input("live-indices", "data"),
     State({"base_id": "file-manager", "name": "data-project-dict"}, "data"),
-    State("live-indices", "data"),
+    State("go-live", "n_clicks"),
+    State("scatter-result", "data"),
+    State("selected-live-models", "data"),
     prevent_initial_call=True,
 )
 def update_heatmap(
@@ -284,8 +406,11 @@ def update_heatmap(
     display_option,
     log_transform,
     percentiles,
-    data_project_dict,
     live_indices,
+    data_project_dict,
+    go_live,
+    result,
+    selected_models,
 ):
     """
     This callback update the heatmap
@@ -295,12 +420,49 @@ def update_heatmap(
         display_option:         option to display mean or std
         log_transform:          log transform option
         percentiles:            percentiles for min-max scaling
+        live_indices:           data project indices of the selected live points
         data_project_dict:      data project dictionary
+        go_live:                number of clicks on the go-live button
+        result:                 offline result in the scatter, if any
+        selected_models:        models of the live session
     Returns:
         fig:                    updated heatmap
     """
+    # In live mode the selection is resolved against the points in the session
+    # log. Without it, the browser maps the selected points to data project
+    # indices and the selection is handled once liveWS.selectLivePoints sets them.
+    if go_live is not None and go_live % 2 == 1:
+        selected_indices = None
+        if selected_models is not None:
+            selected_indices = live_indexes.select(
+                selected_models,
+                (data_project_dict or {}).get("datasets", []),
+                selected_data,
+                click_data,
+            )
+        if selected_indices is None:
+            if ctx.triggered_id == "scatter":
+                raise PreventUpdate
+            selected_indices = decode_live_indices(live_indices)
+        elif ctx.triggered_id == "live-indices":
+            raise PreventUpdate
+        if len(selected_indices) == 0:
+            return (
+                plot_empty_heatmap(),
+                "Number of images selected: 0",
+            )
+
+    # Resolved on the server, as the scatter may only hold a subsample of the points
+    elif result is not None:
+        selected_indices = result_selection_indices(result, selected_data, click_data)
+        if len(selected_indices) == 0:
+            return (
+                plot_empty_heatmap(),
+                "Number of images selected: 0",
+            )
+
     # user select a group of points
-    if selected_data is not None and len(selected_data["points"]) > 0:
+    elif selected_data is not None and len(selected_data["points"]) > 0:
         selected_indices = [point["pointIndex"] for point in selected_data["points"]]
 
     # user click on a single point
@@ -316,9 +478,6 @@ def update_heatmap(
     if percentiles is None:
         percentiles = [0, 100]
 
-    if len(live_indices) > 0:
-        selected_indices = [live_indices[i] for i in selected_indices]
-
     data_project = DataProject.from_dict(data_project_dict, api_key=DATA_TILED_KEY)
     selected_images, _ = data_project.read_datasets(
         selected_indices,
@@ -345,6 +504,7 @@ def update_heatmap(
     Output("scatter", "figure", allow_duplicate=True),
     Output("show-feature-vectors", "disabled", allow_duplicate=True),
     Output("show-feature-vectors", "value", allow_duplicate=True),
+    Output("scatter-result", "data", allow_duplicate=True),
     Input("show-clusters", "value"),
     State(
         {
@@ -383,33 +543,40 @@ def show_clusters(
         raise PreventUpdate
 
     if not show_clusters:
-        return plot_empty_scatter(), False, False
+        return plot_empty_scatter(), False, False, None
 
     # Retrieve latent vectors
     dim_red_child_id = get_children_flow_run_ids(dimension_reduction_job_id)[1]
     dim_red_uri = f"{USER}/{project_name}/{dim_red_child_id}"
-    dim_red_data = tiled_results.get_data_by_trimmed_uri(dim_red_uri)
-    latent_vectors = dim_red_data.read().to_numpy()
-    metadata = dim_red_data.metadata
+    latent_vectors, n_components = read_latent_vectors(dim_red_uri)
 
     # Retrieve clustering results
     cluster_child_id = get_children_flow_run_ids(clustering_job_id)[0]
     cluster_uri = f"{USER}/{project_name}/{cluster_child_id}"
-    cluster_df = tiled_results.get_data_by_trimmed_uri(cluster_uri).read()
-    clusters = cluster_df["cluster_label"].tolist()
-
+    clusters = read_cluster_labels(cluster_uri)
+
+    result = {
+        "latent_uri": dim_red_uri,
+        "cluster_uri": cluster_uri,
+        "lod": use_lod(latent_vectors.shape[0], n_components),
+    }
+    if result["lod"]:
+        scatter_figure = generate_lod_scatter_data(latent_vectors, clusters=clusters)
+        return scatter_figure, True, True, result
+
+    clusters = clusters.tolist()
     cluster_names = {label: label for label in np.unique(clusters).astype(int)}
 
     # Build a brand-new scatter figure
     scatter_figure = generate_scatter_data(
         latent_vectors,
-        metadata["model_parameters"]["n_components"],
+        n_components,
         clusters=clusters,
         color_by="cluster",
         cluster_names=cluster_names,
     )
 
-    return scatter_figure, True, True
+    return scatter_figure, True, True, result
 
 
 @callback(
@@ -69,6 +69,8 @@ def load_mlflow_models_on_render(active_item):
 def refresh_mlflow_models(n_clicks):
     """Refresh the MLflow models dropdown when the refresh button is clicked"""
     if n_clicks:
+        # The user expects newly registered models to show up
+        MLflowClient.invalidate_registry_cache()
         options = mlflow_client.get_mlflow_models()
         return options, options[0]["value"] if options else None
     return [], None
@@ -87,15 +89,10 @@ def store_dialog_models_in_redis_on_continue(n_clicks, autoencoder_model, dim_re
     if not n_clicks:
         raise PreventUpdate
     
-    # Store autoencoder model if provided
-    if autoencoder_model:
-        logger.info(f"Storing autoencoder model from dialog: {autoencoder_model}")
-        redis_model_store.store_autoencoder_model(autoencoder_model)
-    
-    # Store dimension reduction model if provided    
-    if dim_reduction_model:
-        logger.info(f"Storing dimension reduction model from dialog: {dim_reduction_model}")
-        redis_model_store.store_dimred_model(dim_reduction_model)
+    # Store the models provided in one atomic update, so the operator never sees half of the pair
+    if autoencoder_model or dim_reduction_model:
+        logger.info(f"Storing models from dialog: {autoencoder_model}, {dim_reduction_model}")
+        redis_model_store.store_models(autoencoder_model or None, dim_reduction_model or None)
     
     # Return the same n_clicks value (this won't change the button state)
     return n_clicks
@@ -113,15 +110,10 @@ def store_sidebar_models_in_redis_on_update(n_clicks, autoencoder_model, dim_red
     if not n_clicks:
         raise PreventUpdate
     
-    # Store autoencoder model if provided
-    if autoencoder_model:
-        logger.info(f"Storing autoencoder model from sidebar: {autoencoder_model}")
-        redis_model_store.store_autoencoder_model(autoencoder_model)
-    
-    # Store dimension reduction model if provided
-    if dim_reduction_model:
-        logger.info(f"Storing dimension reduction model from sidebar: {dim_reduction_model}")
-        redis_model_store.store_dimred_model(dim_reduction_model)
+    # Store the models provided in one atomic update, so the operator never sees half of the pair
+    if autoencoder_model or dim_reduction_model:
+        logger.info(f"Storing models from sidebar: {autoencoder_model}, {dim_reduction_model}")
+        redis_model_store.store_models(autoencoder_model or None, dim_reduction_model or None)
     
     # Return "secondary" color to indicate success
     return "secondary"
@@ -1,12 +1,10 @@
 import logging
 import os
 
-import numpy as np
 from dash import (
     ClientsideFunction,
     Input,
     Output,
-    Patch,
     State,
     callback,
     clientside_callback,
@@ -19,11 +17,7 @@ from src.arroyo_reduction.redis_model_store import (  # Import the RedisModelSto
     RedisModelStore,
 )
 from src.utils.mlflow_utils import MLflowClient
-from src.utils.plot_utils import (
-    generate_scatter_data,
-    plot_empty_heatmap,
-    plot_empty_scatter,
-)
+from src.utils.plot_utils import plot_empty_heatmap, plot_empty_scatter
 
 # Initialize Redis model store instead of direct Redis client
 REDIS_HOST = os.getenv("REDIS_HOST", "kvrocks")
@@ -94,7 +88,6 @@ def show_model_selection_dialog(n_clicks, last_selected_models):
     Output("scatter", "figure", allow_duplicate=True),
     Output("heatmap", "figure", allow_duplicate=True),
     Output("stats-div", "children", allow_duplicate=True),
-    Output("buffer", "data", allow_duplicate=True),
     Output("live-indices", "data", allow_duplicate=True),
     Output(
         "model-loading-spinner", "style", allow_duplicate=True
@@ -102,6 +95,7 @@ def show_model_selection_dialog(n_clicks, last_selected_models):
     Output(
         "in-model-transition", "data", allow_duplicate=True
     ),  # Add transition state output
+    Output("scatter-result", "data", allow_duplicate=True),
     Input("live-model-continue", "n_clicks"),
     State("live-autoencoder-dropdown", "value"),
     State("live-dimred-dropdown", "value"),
@@ -169,10 +163,10 @@ def handle_model_continue(
             plot_empty_scatter(),  # Clear scatter when continuing
             plot_empty_heatmap(),  # Clear heatmap when continuing
             "Number of images selected: 0",  # Reset stats text
-            {},  # Clear buffer
-            [],  # Clear indices
+            None,  # Clear the live selection
             spinner_style,  # Show the loading spinner
             True,  # Set transition state to True
+            None,  # The scatter no longer shows an offline result
         )
     raise PreventUpdate
 
@@ -262,11 +256,8 @@ def toggle_controls(n_clicks, selected_models, mode_canceled):
         # Going back to offline mode - send Redis messages to reset models
         if selected_models is not None:
             try:
-                # Reset autoencoder model to empty string
-                redis_model_store.store_autoencoder_model("")
-
-                # Reset dimension reduction model to empty string
-                redis_model_store.store_dimred_model("")
+                # Reset both models to empty strings in one update
+                redis_model_store.store_models("", "")
 
                 logger.info("Published model reset messages to Redis")
             except Exception as e:
@@ -297,7 +288,7 @@ def toggle_controls(n_clicks, selected_models, mode_canceled):
             {  # Hide pause button
                 "display": "none",
             },
-            [],  # Clear live indices
+            None,  # Clear the live selection
             False,  # Reset canceled flag
             None,  # Reset selected_models to None
         )
@@ -330,7 +321,7 @@ def toggle_controls(n_clicks, selected_models, mode_canceled):
                 "font-size": "1.5rem",
                 "padding": "5px",
             },
-            [],  # Initialize empty live indices
+            None,  # Clear the live selection
             False,  # Reset canceled flag
             selected_models,  # Keep selected_models unchanged
         )
@@ -342,7 +333,6 @@ def toggle_controls(n_clicks, selected_models, mode_canceled):
     Output("scatter", "figure", allow_duplicate=True),
     Output("heatmap", "figure", allow_duplicate=True),
     Output("stats-div", "children", allow_duplicate=True),
-    Output("buffer", "data", allow_duplicate=True),
     Input("go-live", "n_clicks"),
     State("selected-live-models", "data"),
     prevent_initial_call=True,
@@ -357,7 +347,6 @@ def reset_panels_on_exit_live_mode(n_clicks, selected_models):
             plot_empty_scatter(),
             plot_empty_heatmap(),
             "Number of images selected: 0",
-            {},
         )
 
     # Don't reset panels when just opening the dialog
@@ -423,7 +412,6 @@ def update_data_project_dict(n_clicks, selected_models):
     Output(
         "in-model-transition", "data", allow_duplicate=True
     ),  # Add transition state output
-    Output("buffer", "data", allow_duplicate=True),
     Input("update-live-models-button", "n_clicks"),
     State("live-mode-autoencoder-dropdown", "value"),
     State("live-mode-dimred-dropdown", "value"),
@@ -498,7 +486,6 @@ def update_live_models(n_clicks, autoencoder_model, dimred_model, data_project_d
         empty_indices,
         spinner_style,
         True,
-        [],
     )
 
 
@@ -528,94 +515,6 @@ def reset_update_button(autoencoder_model, dimred_model, selected_models):
     return "secondary", "Updated"
 
 
-@callback(
-    Output("scatter", "figure", allow_duplicate=True),
-    Input("buffer-debounce", "n_intervals"),
-    State("scatter", "figure"),
-    State("pause-button", "n_clicks"),
-    State("buffer", "data"),
-    prevent_initial_call=True,
-)
-def set_live_latent_vectors(n_intervals, current_figure, pause_n_clicks, buffer_data):
-    # Only process if in live mode
-    if pause_n_clicks is not None and pause_n_clicks % 2 == 1 or not buffer_data:
-        raise PreventUpdate
-
-    logging.debug(f"Received data: {buffer_data}")
-
-    try:
-        # Rebuild the latent vector array from the buffer
-        vectors = []
-        for entry in buffer_data:
-            vector = entry.get("feature_vector")
-            if vector is not None:
-                vectors.append(vector)
-
-        latent_vectors = np.array(vectors, dtype=float)
-
-        n_components = latent_vectors.shape[1]
-
-        # If figure is empty (no customdata yet), return a new figure.
-        if (
-            not current_figure["data"]
-            or len(current_figure["data"]) == 0
-            or "customdata" not in current_figure["data"][0]
-        ):
-            return generate_scatter_data(latent_vectors, n_components)
-
-        # Incremental update logic
-        current_n_points = len(current_figure["data"][0]["x"])
-        total_n_vectors = len(latent_vectors)
-
-        if total_n_vectors <= current_n_points:
-            logging.debug("No new latent vectors to append.")
-            raise PreventUpdate
-
-        # Use Patch for incremental update
-        try:
-            # Get only new vectors
-            new_vectors = latent_vectors[current_n_points:]
-
-            # Create patch
-            figure_patch = Patch()
-
-            # Update data arrays
-            if "x" in current_figure["data"][0]:
-                figure_patch["data"][0]["x"] = (
-                    current_figure["data"][0]["x"] + new_vectors[:, 0].tolist()
-                )
-            else:
-                figure_patch["data"][0]["x"] = new_vectors[:, 0].tolist()
-
-            if "y" in current_figure["data"][0]:
-                figure_patch["data"][0]["y"] = (
-                    current_figure["data"][0]["y"] + new_vectors[:, 1].tolist()
-                )
-            else:
-                figure_patch["data"][0]["y"] = new_vectors[:, 1].tolist()
-
-            if "customdata" in current_figure["data"][0]:
-                figure_patch["data"][0]["customdata"] = current_figure["data"][0][
-                    "customdata"
-                ] + [[0]] * len(new_vectors)
-            else:
-                figure_patch["data"][0]["customdata"] = [[0]] * len(new_vectors)
-
-            return figure_patch
-
-        except Exception as e:
-            logging.warning(
-                f"Error patching scatter plot: {e}, preserving current figure"
-            )
-            return current_figure
-    except PreventUpdate:
-        # This is expected behavior, just re-raise
-        raise
-    except Exception as e:
-        logging.error(f"Error updating scatter plot: {e}")
-        raise PreventUpdate
-
-
 @callback(
     Output("pause-button", "children", allow_duplicate=True),
     Output("tooltip-pause-button", "children", allow_duplicate=True),
@@ -648,13 +547,16 @@ def toggle_pause_button_go_live(go_live_n_clicks):
 clientside_callback(
     ClientsideFunction(namespace="liveWS", function_name="updateLiveData"),
     output=[
-        Output("buffer", "data"),
+        # The points are kept in typed arrays in the browser and only the new ones
+        # are appended with Plotly.extendTraces, the figure is only replaced for
+        # the first points of a plot or a snapshot
+        Output("scatter", "figure", allow_duplicate=True),
+        Output("scatter", "extendData"),
         Output(
             {"base_id": "file-manager", "name": "data-project-dict"},
             "data",
             allow_duplicate=True,
         ),
-        Output("live-indices", "data", allow_duplicate=True),
         Output(
             "model-loading-spinner", "style", allow_duplicate=True
         ),  # Add spinner output
@@ -662,13 +564,39 @@ clientside_callback(
             "in-model-transition", "data", allow_duplicate=True
         ),  # Add transition state output
     ],
-    inputs=[Input("ws-live", "message")],
+    inputs=[
+        Input("ws-live", "message"),
+        # Points received while paused are plotted on resume
+        Input("pause-button", "n_clicks"),
+    ],
     state=[
-        State("buffer", "data"),
         State("go-live", "n_clicks"),
         State({"base_id": "file-manager", "name": "data-project-dict"}, "data"),
-        State("live-indices", "data"),
         State("selected-live-models", "data"),  # Added selected models state
+        State("scatter", "figure"),
     ],
     prevent_initial_call=True,
 )
+
+
+# The server never sees the points added with extendData, so a figure Patch
+# would drop them. In live mode the selection is cleared in the browser instead.
+clientside_callback(
+    ClientsideFunction(namespace="liveWS", function_name="clearLiveSelection"),
+    Output("scatter", "selectedData"),
+    Input("clear-selection-button", "n_clicks"),
+    State("go-live", "n_clicks"),
+    prevent_initial_call=True,
+)
+
+
+# The data project index of every live point stays in the browser, only those
+# of the selected points are sent to display.update_heatmap, base64 encoded
+clientside_callback(
+    ClientsideFunction(namespace="liveWS", function_name="selectLivePoints"),
+    Output("live-indices", "data", allow_duplicate=True),
+    Input("scatter", "selectedData"),
+    Input("scatter", "clickData"),
+    State("go-live", "n_clicks"),
+    prevent_initial_call=True,
+)
@@ -216,11 +216,13 @@ def main_display():
             ),
             # Add model selection dialog for live mode
             create_model_selection_dialog(),
+            # Offline result in the scatter, selections are resolved against its points on the server
+            dcc.Store(id="scatter-result", data=None),
             dcc.Store(id="selected-live-models", data=None),
-            dcc.Store(id="buffer", data={}),
-            dcc.Interval(id="buffer-debounce", interval=100, n_intervals=0),  # 100ms
-            dcc.Store(id="live-indices", data=[]),
-            WebSocket(id="ws-live", url=WEBSOCKET_URL),
+            # Data project indices of the selected live points, see liveWS.selectLivePoints
+            dcc.Store(id="live-indices", data=None),
+            # Batched frames with base64 arrays, see arroyo_reduction.ws_protocol
+            WebSocket(id="ws-live", url=WEBSOCKET_URL, protocols=["lse.v2.b64"]),
         ],
     )
     return main_display
@@ -0,0 +1,65 @@
+from src.arroyo_reduction.backpressure import (
+    DropOldestPolicy,
+    KeepLatestPolicy,
+    StridePolicy,
+    make_policy,
+)
+
+
+def drain(policy):
+    items = []
+    while (item := policy.take()) is not None:
+        items.append(item)
+    return items
+
+
+class TestBackpressurePolicies:
+
+    def test_drop_oldest(self):
+        """The newest max_pending frames are kept and the first one taken reports the gap"""
+        policy = DropOldestPolicy(max_pending=3)
+        shed = sum(policy.offer(frame, float(frame)) for frame in range(5))
+
+        assert shed == 2
+        assert policy.shed == 2
+        assert [(message, skipped) for message, _, skipped in drain(policy)] == [(2, 2), (3, 0), (4, 0)]
+
+    def test_keep_latest(self):
+        """Only the newest frame is kept"""
+        policy = KeepLatestPolicy()
+        for frame in range(4):
+            policy.offer(frame, 0.0)
+
+        assert [(message, skipped) for message, _, skipped in drain(policy)] == [(3, 3)]
+
+    def test_stride_adapts(self):
+        """The stride grows while the buffer overflows and shrinks as the pipeline catches up"""
+        policy = StridePolicy(max_pending=3, max_stride=2)
+        for frame in range(4):
+            policy.offer(frame, 0.0)
+        assert policy.stride == 2
+        assert policy.describe() == "stride:2"
+
+        # Only every second frame is admitted now, and the oldest is still shed when full
+        policy.offer(4, 0.0)
+        policy.offer(5, 0.0)
+        assert [message for message, _, _ in drain(policy)] == [2, 3, 5]
+        assert policy.shed == 3
+        assert policy.stride == 1
+
+    def test_skip_is_reported_on_next_frame(self):
+        """Frames skipped after leaving the buffer are reported by the next frame"""
+        policy = DropOldestPolicy(max_pending=4)
+        policy.offer(0, 0.0)
+        policy.offer(1, 0.0)
+        _, _, skipped = policy.take()
+        policy.skip(skipped + 1)
+
+        assert policy.take()[2] == 1
+
+    def test_make_policy(self):
+        assert make_policy("none") is None
+        assert make_policy(None) is None
+        assert make_policy("bogus") is None
+        assert isinstance(make_policy("keep_latest"), KeepLatestPolicy)
+        assert make_policy("stride", max_pending=8, max_stride=16).max_stride == 16
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from src.utils.lod_utils import (
+    density_raster,
+    subsample_indices,
+    use_lod,
+    viewport_from_relayout,
+)
+
+
+@pytest.fixture
+def latent_vectors():
+    rng = np.random.default_rng(1)
+    dense = rng.normal(0, 0.1, size=(50_000, 2))
+    outliers = np.array([[5.0, 5.0], [-5.0, 5.0]])
+    return np.vstack([dense, outliers]).astype(np.float32)
+
+
+class TestLevelOfDetail:
+
+    def test_use_lod(self):
+        """Only large 2D spaces are drawn at a reduced level of detail"""
+        assert use_lod(10_000_000, 2)
+        assert not use_lod(10, 2)
+        assert not use_lod(10_000_000, 3)
+
+    def test_viewport_from_relayout(self):
+        """Zooms give a viewport, autorange resets it, other relayouts are ignored"""
+        assert viewport_from_relayout(
+            {"xaxis.range[0]": 2, "xaxis.range[1]": 1, "yaxis.range[0]": 0, "yaxis.range[1]": 3}
+        ) == ([1.0, 2.0], [0.0, 3.0])
+        assert viewport_from_relayout({"xaxis.autorange": True, "yaxis.autorange": True}) == (None, None)
+        assert viewport_from_relayout({"dragmode": "zoom"}) is None
+        assert viewport_from_relayout(None) is None
+
+    def test_density_raster_counts_visible_points(self, latent_vectors):
+        """The raster counts the points of the viewport, indexed [y, x]"""
+        counts = density_raster(latent_vectors, [4, 6], [-6, 6], n_bins=4)
+        assert counts.sum() == 1
+        assert counts[3, 2] == 1
+
+    def test_subsample_keeps_sparse_regions(self, latent_vectors):
+        """The subsample is bounded, repeatable and keeps the outliers"""
+        indices = subsample_indices(latent_vectors, [-6, 6], [-6, 6], max_points=1000)
+        assert len(indices) <= 1000
+        assert {50_000, 50_001} <= set(indices.tolist())
+        assert np.array_equal(
+            indices, subsample_indices(latent_vectors, [-6, 6], [-6, 6], max_points=1000)
+        )
@@ -0,0 +1,70 @@
+import asyncio
+import socket
+
+import pytest
+
+from src.arroyo_reduction.metrics import MetricsRegistry, start_metrics_server
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+class TestMetrics:
+
+    def test_counter_and_gauge(self, registry):
+        """Counters accumulate per label set and gauges can be read from a function"""
+        dropped = registry.counter("frames_dropped_total", "Dropped frames", ["reason"])
+        dropped.inc(reason="queue_full")
+        dropped.inc(2, reason="queue_full")
+        clients = registry.gauge("clients", "Connected clients")
+        clients.set_function(lambda: 3)
+
+        assert dropped.get(reason="queue_full") == 3
+        assert clients.get() == 3
+        text = registry.render()
+        assert 'frames_dropped_total{reason="queue_full"} 3.0' in text
+        assert "clients 3.0" in text
+        assert "# TYPE frames_dropped_total counter" in text
+
+    def test_histogram_buckets(self, registry):
+        """Histogram buckets are cumulative and include +Inf"""
+        stages = registry.histogram("stage_seconds", "Stage time", ["stage"], buckets=(0.01, 0.1))
+        stages.observe(0.005, stage="dimred")
+        stages.observe(0.05, stage="dimred")
+        stages.observe(1.0, stage="dimred")
+
+        assert stages.get(stage="dimred") == (3, pytest.approx(1.055))
+        text = registry.render()
+        assert 'stage_seconds_bucket{stage="dimred",le="0.01"} 1' in text
+        assert 'stage_seconds_bucket{stage="dimred",le="0.1"} 2' in text
+        assert 'stage_seconds_bucket{stage="dimred",le="+Inf"} 3' in text
+        assert 'stage_seconds_count{stage="dimred"} 3' in text
+
+    def test_wrong_labels(self, registry):
+        counter = registry.counter("frames_total", "Frames", ["reason"])
+        with pytest.raises(ValueError):
+            counter.inc(stage="dimred")
+
+    def test_metrics_endpoint(self, registry):
+        """The registry is served over HTTP in the Prometheus text format"""
+        registry.counter("frames_total", "Frames").inc()
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        async def scrape():
+            server = asyncio.create_task(start_metrics_server("127.0.0.1", port, registry))
+            await asyncio.sleep(0.1)
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            server.cancel()
+            return response.decode()
+
+        response = asyncio.run(scrape())
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert "frames_total 1.0" in response
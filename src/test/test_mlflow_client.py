@@ -2,6 +2,11 @@ import pytest
 from unittest.mock import patch, MagicMock, call
 import os
 import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import mlflow
 
 from src.test.test_utils import (
@@ -9,7 +14,37 @@ from src.test.test_utils import (
     mock_os_makedirs,
     mlflow_test_client
 )
-from src.utils.mlflow_utils import MLflowClient
+from src.utils import mlflow_utils
+from src.utils.mlflow_utils import MLflowClient, ModelDiskCache, ModelMemoryCache
+
+
+def fake_download(dst_path, artifact_uri=None):
+    """Write a 1000 byte model into dst_path/model, as download_artifacts would"""
+    model_path = os.path.join(dst_path, "model")
+    os.makedirs(model_path, exist_ok=True)
+    with open(os.path.join(model_path, "MLmodel"), "w") as f:
+        f.write("flavors: {}\n")
+    with open(os.path.join(model_path, "model.pkl"), "wb") as f:
+        f.write(b"0" * (1000 - len("flavors: {}\n")))
+    return model_path
+
+
+def make_run(run_id, tags):
+    run = MagicMock()
+    run.info.run_id = run_id
+    run.data.tags = tags
+    return run
+
+
+def temp_entries(client):
+    return [name for name in os.listdir(client.cache_dir) if name.startswith(ModelDiskCache.TEMP_PREFIX)]
+
+
+@pytest.fixture
+def cached_client(mock_mlflow_client, tmp_path):
+    """MLflowClient with a real disk cache in a temporary directory"""
+    with patch('mlflow.set_tracking_uri'):
+        return MLflowClient(tracking_uri="http://mock-mlflow:5000", cache_dir=str(tmp_path))
 
 class TestMLflowClient:
     
@@ -17,15 +52,21 @@ class TestMLflowClient:
     def setup_and_teardown(self):
         """Reset MLflowClient._model_cache before and after each test"""
         # Save original cache
-        original_cache = MLflowClient._model_cache.copy()
+        original_cache = MLflowClient._model_cache
         
         # Clear cache before test
-        MLflowClient._model_cache = {}
+        MLflowClient._model_cache = ModelMemoryCache()
+        MLflowClient.invalidate_registry_cache()
+        MLflowClient._run_tags_cache = {}
+        MLflowClient._label_cache = {}
         
         yield
         
         # Restore original cache after test
         MLflowClient._model_cache = original_cache
+        MLflowClient.invalidate_registry_cache()
+        MLflowClient._run_tags_cache = {}
+        MLflowClient._label_cache = {}
     
     def test_init(self, mlflow_test_client, mock_os_makedirs):
         """Test initialization of MLflowClient"""
@@ -110,14 +151,12 @@ class TestMLflowClient:
         ]
         
         # Configure runs with tags
-        mock_run1 = MagicMock()
-        mock_run1.data.tags = {"exp_type": "dev"}
+        mock_run1 = make_run("run1", {"exp_type": "dev"})
         
-        mock_run2 = MagicMock()
-        mock_run2.data.tags = {"exp_type": "test"}
+        mock_run2 = make_run("run2", {"exp_type": "test"})
         
-        # Configure get_run to return our mock runs
-        mock_mlflow_client.get_run.side_effect = [mock_run1, mock_run2]
+        # Configure search_runs to return our mock runs in one call
+        mock_mlflow_client.search_runs.return_value = [mock_run1, mock_run2]
         
         # Mock the get_flow_run_name and get_flow_run_parent_id functions
         with patch('src.utils.mlflow_utils.get_flow_run_name', return_value="Flow Run 1"), \
@@ -155,14 +194,12 @@ class TestMLflowClient:
         ]
         
         # Configure runs with tags
-        mock_run1 = MagicMock()
-        mock_run1.data.tags = {"exp_type": "live_mode"}
+        mock_run1 = make_run("run1", {"exp_type": "live_mode"})
         
-        mock_run2 = MagicMock()
-        mock_run2.data.tags = {"exp_type": "dev"}
+        mock_run2 = make_run("run2", {"exp_type": "dev"})
         
-        # Configure get_run to return our mock runs
-        mock_mlflow_client.get_run.side_effect = [mock_run1, mock_run2]
+        # Configure search_runs to return our mock runs in one call
+        mock_mlflow_client.search_runs.return_value = [mock_run1, mock_run2]
         
         result = client.get_mlflow_models(livemode=True)
         
@@ -194,14 +231,12 @@ class TestMLflowClient:
         ]
         
         # Configure runs with tags
-        mock_run1 = MagicMock()
-        mock_run1.data.tags = {"exp_type": "dev", "model_type": "autoencoder"}
+        mock_run1 = make_run("run1", {"exp_type": "dev", "model_type": "autoencoder"})
         
-        mock_run2 = MagicMock()
-        mock_run2.data.tags = {"exp_type": "dev", "model_type": "dimension_reduction"}
+        mock_run2 = make_run("run2", {"exp_type": "dev", "model_type": "dimension_reduction"})
         
-        # Configure get_run to return our mock runs
-        mock_mlflow_client.get_run.side_effect = [mock_run1, mock_run2]
+        # Configure search_runs to return our mock runs in one call
+        mock_mlflow_client.search_runs.return_value = [mock_run1, mock_run2]
         
         # Mock the get_flow_run_name and get_flow_run_parent_id functions
         with patch('src.utils.mlflow_utils.get_flow_run_parent_id', return_value="parent-id"), \
@@ -214,6 +249,66 @@ class TestMLflowClient:
         assert result[0]["label"] == "Flow Run 1"
         assert result[0]["value"] == "model1"
     
+    def test_get_mlflow_models_reuses_registry_index(self, mlflow_test_client, mock_mlflow_client):
+        """Test that the live dialog's two calls make one listing and one run search"""
+        client = mlflow_test_client
+        mock_mlflow_client.search_model_versions.return_value = [
+            MagicMock(version="1", run_id=f"run{i}") for i in range(250)
+        ]
+        for i, version in enumerate(mock_mlflow_client.search_model_versions.return_value):
+            version.name = f"model{i}"
+        mock_mlflow_client.search_runs.side_effect = lambda experiment_ids, filter_string, **kwargs: [
+            make_run(run_id, {"exp_type": "live_mode", "model_type": "autoencoder" if int(run_id[3:]) % 2 else "dimension_reduction"})
+            for run_id in re.findall(r"'(run\d+)'", filter_string)
+        ]
+        
+        autoencoders = client.get_mlflow_models(livemode=True, model_type="autoencoder")
+        dimreds = client.get_mlflow_models(livemode=True, model_type="dimension_reduction")
+        
+        assert len(autoencoders) == len(dimreds) == 125
+        mock_mlflow_client.search_model_versions.assert_called_once()
+        # 250 runs in chunks of 100
+        assert mock_mlflow_client.search_runs.call_count == 3
+        mock_mlflow_client.get_run.assert_not_called()
+        
+        # A refresh lists the versions again, but known runs are not fetched again
+        MLflowClient.invalidate_registry_cache()
+        client.get_mlflow_models(livemode=True)
+        assert mock_mlflow_client.search_model_versions.call_count == 2
+        assert mock_mlflow_client.search_runs.call_count == 3
+    
+    def test_get_mlflow_models_falls_back_to_get_run(self, mlflow_test_client, mock_mlflow_client):
+        """Test that runs the batched search did not return are fetched one by one"""
+        client = mlflow_test_client
+        version = MagicMock(version="1", run_id="run1")
+        version.name = "model1"
+        mock_mlflow_client.search_model_versions.return_value = [version]
+        mock_mlflow_client.search_runs.side_effect = Exception("Bad filter")
+        mock_mlflow_client.get_run.return_value = make_run("run1", {"exp_type": "live_mode"})
+        
+        result = client.get_mlflow_models(livemode=True)
+        
+        assert result == [{"label": "model1", "value": "model1"}]
+        mock_mlflow_client.get_run.assert_called_once_with("run1")
+    
+    def test_offline_labels_resolved_once(self, mlflow_test_client, mock_mlflow_client):
+        """Test that flow run labels are cached once resolved"""
+        client = mlflow_test_client
+        versions = [MagicMock(version="1", run_id=f"run{i}") for i in range(3)]
+        for i, version in enumerate(versions):
+            version.name = f"model{i}"
+        mock_mlflow_client.search_model_versions.return_value = versions
+        mock_mlflow_client.search_runs.return_value = [make_run(f"run{i}", {"exp_type": "dev"}) for i in range(3)]
+        
+        with patch('src.utils.mlflow_utils.get_flow_run_parent_id', side_effect=lambda name: f"parent-{name}"), \
+             patch('src.utils.mlflow_utils.get_flow_run_name', side_effect=lambda parent: f"Run of {parent}") as mock_name:
+            first = client.get_mlflow_models()
+            second = client.get_mlflow_models()
+        
+        assert first == second
+        assert first[0] == {"label": "Run of parent-model0", "value": "model0"}
+        assert mock_name.call_count == 3
+    
     def test_get_cache_path(self, mlflow_test_client):
         """Test the _get_cache_path method"""
         client = mlflow_test_client
@@ -226,43 +321,68 @@ class TestMLflowClient:
         cache_path = client._get_cache_path("test-model", 2)
         assert cache_path == "/tmp/test_mlflow_cache/test-model_v2"
     
-    def test_load_model_from_memory_cache(self, mlflow_test_client):
+    def test_load_model_from_memory_cache(self, mlflow_test_client, mock_mlflow_client):
         """Test loading a model from memory cache"""
         client = mlflow_test_client
+        mock_version = MagicMock()
+        mock_version.version = "1"
+        mock_mlflow_client.search_model_versions.return_value = [mock_version]
         # Set up memory cache
         mock_model = MagicMock(name="memory_model")
-        MLflowClient._model_cache = {"test-model": mock_model}
+        MLflowClient._model_cache.put(("test-model", 1), mock_model, size=10)
         
         # Load model
-        result = client.load_model("test-model")
+        with patch('mlflow.pyfunc.load_model') as mock_load:
+            result = client.load_model("test-model")
         
         # Verify result is from cache
         assert result is mock_model
+        mock_load.assert_not_called()
+        assert MLflowClient.memory_cache_stats()["hits"] == 1
+    
+    def test_load_model_new_version_misses_memory_cache(self, cached_client, mock_mlflow_client):
+        """Test that a newly registered version is loaded rather than served from memory"""
+        client = cached_client
+        versions = [MagicMock(version="1"), MagicMock(version="2")]
+        mock_mlflow_client.search_model_versions.return_value = versions
+        MLflowClient._model_cache.put(("test-model", 1), MagicMock(name="old_model"), size=10)
+        new_model = MagicMock(name="new_model")
+        
+        with patch('mlflow.artifacts.download_artifacts', side_effect=fake_download), \
+             patch('mlflow.pyfunc.load_model', return_value=new_model):
+            result = client.load_model("test-model")
+        
+        assert result is new_model
+        assert ("test-model", 2) in MLflowClient._model_cache
+        assert MLflowClient.memory_cache_stats()["misses"] == 1
     
-    def test_load_model_from_disk_cache(self, mlflow_test_client, mock_mlflow_client):
+    def test_load_model_from_disk_cache(self, cached_client, mock_mlflow_client):
         """Test loading a model from disk cache"""
-        client = mlflow_test_client
+        client = cached_client
         # Setup mocks
         mock_version = MagicMock()
         mock_version.version = "1"
         mock_mlflow_client.search_model_versions.return_value = [mock_version]
+        cached_path = client.disk_cache.fetch("test-model", 1, fake_download)
         
         # Setup mock model
         mock_model = MagicMock(name="disk_cache_model")
         
         # Test disk cache path
-        with patch('os.path.exists', return_value=True), \
-             patch('mlflow.pyfunc.load_model', return_value=mock_model):
+        with patch('mlflow.artifacts.download_artifacts') as mock_download, \
+             patch('mlflow.pyfunc.load_model', return_value=mock_model) as mock_load:
             
             # Load model
             result = client.load_model("test-model")
             
             # Verify result is the mock model
             assert result is mock_model
+            mock_load.assert_called_once_with(cached_path)
+            mock_download.assert_not_called()
     
-    def test_load_model_download_artifacts(self, mlflow_test_client, mock_mlflow_client):
+    def test_load_model_download_artifacts(self, cached_client, mock_mlflow_client):
         """Test loading a model by downloading artifacts"""
-        client = mlflow_test_client
+        client = cached_client
         # Setup mocks
         mock_version = MagicMock()
         mock_version.version = "1"
@@ -270,23 +390,27 @@ class TestMLflowClient:
         
         # Setup mock model
         mock_model = MagicMock(name="download_model")
-        download_path = "/tmp/test_mlflow_cache/downloaded_model"
         
         # Test artifact download path
-        with patch('os.path.exists', return_value=False), \
-             patch('os.makedirs'), \
-             patch('mlflow.artifacts.download_artifacts', return_value=download_path), \
-             patch('mlflow.pyfunc.load_model', return_value=mock_model):
+        with patch('mlflow.artifacts.download_artifacts', side_effect=fake_download), \
+             patch('mlflow.pyfunc.load_model', return_value=mock_model) as mock_load:
             
             # Load model
             result = client.load_model("test-model")
             
             # Verify result is the mock model
             assert result is mock_model
+        
+        # Downloaded into a temporary directory and renamed into place
+        model_path = os.path.join(client.cache_dir, "test-model_v1", "model")
+        mock_load.assert_called_once_with(model_path)
+        assert os.path.exists(os.path.join(model_path, "MLmodel"))
+        assert temp_entries(client) == []
+        assert client.disk_cache.stats()["entries"] == 1
     
-    def test_load_model_fallback(self, mlflow_test_client, mock_mlflow_client):
+    def test_load_model_fallback(self, cached_client, mock_mlflow_client):
         """Test load_model fallback when download fails"""
-        client = mlflow_test_client
+        client = cached_client
         # Setup mocks
         mock_version = MagicMock()
         mock_version.version = "1"
@@ -295,10 +419,12 @@ class TestMLflowClient:
         # Setup mock model
         mock_model = MagicMock(name="fallback_model")
         
+        def failing_download(artifact_uri, dst_path):
+            fake_download(dst_path)
+            raise Exception("Download error")
+        
         # Test fallback path
-        with patch('os.path.exists', return_value=False), \
-             patch('os.makedirs'), \
-             patch('mlflow.artifacts.download_artifacts', side_effect=Exception("Download error")), \
+        with patch('mlflow.artifacts.download_artifacts', side_effect=failing_download), \
              patch('mlflow.pyfunc.load_model', return_value=mock_model):
             
             # Load model
@@ -306,6 +432,10 @@ class TestMLflowClient:
             
             # Verify result is the mock model
             assert result is mock_model
+        
+        # The partial download is not left in the cache
+        assert client.disk_cache.get("test-model", 1) is None
+        assert temp_entries(client) == []
     
     def test_load_model_no_versions(self, mlflow_test_client, mock_mlflow_client):
         """Test loading a model when no versions are found"""
@@ -333,29 +463,264 @@ class TestMLflowClient:
         # Verify result is None
         assert result is None
     
+    def test_load_model_registry_unreachable_uses_memory_cache(self, mlflow_test_client, mock_mlflow_client):
+        """Test that a model in memory is still served when the registry cannot be reached"""
+        client = mlflow_test_client
+        mock_mlflow_client.search_model_versions.side_effect = Exception("Connection refused")
+        old_model, new_model = MagicMock(name="v1"), MagicMock(name="v2")
+        MLflowClient._model_cache.put(("test-model", 1), old_model, size=10)
+        MLflowClient._model_cache.put(("test-model", 2), new_model, size=10)
+        
+        with patch('mlflow.pyfunc.load_model') as mock_load:
+            assert client.load_model("test-model") is new_model
+        mock_load.assert_not_called()
+    
+    def test_load_model_registry_unreachable_uses_disk_cache(self, cached_client, mock_mlflow_client):
+        """Test that the newest version on disk is loaded when the registry cannot be reached"""
+        client = cached_client
+        client.disk_cache.fetch("test-model", 1, fake_download)
+        cached_path = client.disk_cache.fetch("test-model", 2, fake_download)
+        mock_mlflow_client.search_model_versions.side_effect = Exception("Connection refused")
+        mock_model = MagicMock(name="disk_cache_model")
+        
+        with patch('mlflow.pyfunc.load_model', return_value=mock_model) as mock_load:
+            assert client.load_model("test-model") is mock_model
+        mock_load.assert_called_once_with(cached_path)
+    
+    def test_prefetch_model_only_downloads(self, cached_client, mock_mlflow_client):
+        """Test that prefetching fills the disk cache without loading the model"""
+        client = cached_client
+        mock_mlflow_client.search_model_versions.return_value = [MagicMock(version="3")]
+        
+        with patch('mlflow.artifacts.download_artifacts', side_effect=fake_download) as mock_download, \
+             patch('mlflow.pyfunc.load_model') as mock_load:
+            assert client.prefetch_model("test-model") is True
+            assert client.prefetch_model("test-model") is True
+        
+        mock_download.assert_called_once()
+        mock_load.assert_not_called()
+        assert client.disk_cache.get("test-model", 3) is not None
+        assert len(MLflowClient._model_cache) == 0
+    
+    def test_prefetch_model_never_evicts(self, cached_client, mock_mlflow_client):
+        """Test that prefetching only fills free room and keeps the models in use"""
+        client = cached_client
+        client.disk_cache.max_bytes = 2500
+        client.disk_cache.fetch("in-use", 1, fake_download)
+        last_used = client.disk_cache._read_manifest()["in-use_v1"]["last_used"]
+        mock_mlflow_client.search_model_versions.return_value = [MagicMock(version="1")]
+        
+        with patch('mlflow.artifacts.download_artifacts', side_effect=fake_download) as mock_download:
+            assert client.prefetch_model("first") is True
+            assert client.prefetch_model("second") is False
+            # The size of a model that did not fit is remembered, it is not downloaded again
+            assert client.prefetch_model("second") is False
+            assert client.prefetch_model("first") is True
+        
+        assert mock_download.call_count == 2
+        manifest = client.disk_cache._read_manifest()
+        assert sorted(manifest) == ["first_v1", "in-use_v1"]
+        assert manifest["in-use_v1"]["last_used"] == last_used
+        # Prefetched models are the first to go once a model is actually loaded
+        assert manifest["first_v1"]["last_used"] < last_used
+        client.disk_cache.fetch("loaded", 1, fake_download)
+        assert sorted(client.disk_cache._read_manifest()) == ["in-use_v1", "loaded_v1"]
+    
     def test_clear_memory_cache(self):
         """Test clearing the memory cache"""
         # Set up memory cache
-        MLflowClient._model_cache = {"test-model": MagicMock()}
+        MLflowClient._model_cache.put(("test-model", 1), MagicMock(), size=10)
         
         # Clear memory cache
         MLflowClient.clear_memory_cache()
         
         # Verify memory cache is empty
         assert len(MLflowClient._model_cache) == 0
+        assert MLflowClient.memory_cache_stats()["bytes"] == 0
     
-    def test_clear_disk_cache(self, mlflow_test_client):
-        """Test clearing the disk cache"""
-        client = mlflow_test_client
-        # Mock shutil.rmtree and os.makedirs
-        with patch('shutil.rmtree') as mock_rmtree, \
-             patch('os.makedirs') as mock_makedirs:
-            
-            # Clear disk cache
-            client.clear_disk_cache()
-            
-            # Verify rmtree was called with the cache directory
-            mock_rmtree.assert_called_once_with(client.cache_dir)
-            
-            # Verify makedirs was called with the cache directory
-            mock_makedirs.assert_called_once_with(client.cache_dir, exist_ok=True)
\ No newline at end of file
+    def test_memory_cache_evicts_least_recently_used(self):
+        """Test that the memory cache stays within its byte budget"""
+        cache = ModelMemoryCache(max_bytes=100)
+        cache.put(("a", 1), "model-a", size=40)
+        cache.put(("b", 1), "model-b", size=40)
+        # Touch a so that b is the least recently used
+        assert cache.get(("a", 1)) == "model-a"
+        cache.put(("c", 1), "model-c", size=40)
+        
+        assert ("b", 1) not in cache
+        assert cache.get(("b", 1)) is None
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] == 80
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+    
+    def test_memory_cache_skips_model_over_budget(self):
+        """Test that a model larger than the budget is not cached"""
+        cache = ModelMemoryCache(max_bytes=100)
+        cache.put(("a", 1), "model-a", size=40)
+        assert cache.put(("big", 1), "model-big", size=200) is False
+        assert ("a", 1) in cache
+        assert cache.stats()["evictions"] == 0
+    
+    def test_shrinking_budget_evicts(self):
+        """Test that lowering the budget evicts models down to it"""
+        MLflowClient._model_cache.put(("a", 1), "model-a", size=40)
+        MLflowClient._model_cache.put(("b", 1), "model-b", size=40)
+        MLflowClient.set_memory_cache_budget(50)
+        assert ("a", 1) not in MLflowClient._model_cache
+        assert ("b", 1) in MLflowClient._model_cache
+    
+    def test_estimate_model_bytes_from_torch_module(self):
+        """Test the memory estimate of a pyfunc model wrapping a torch module"""
+        import torch
+        from src.utils.mlflow_utils import estimate_model_bytes
+        
+        module = torch.nn.Linear(100, 10)
+        model = MagicMock(spec=["_model_impl"])
+        model._model_impl = MagicMock(spec=["python_model"])
+        model._model_impl.python_model = type("PythonModel", (), {})()
+        model._model_impl.python_model.model = module
+        
+        assert estimate_model_bytes(model) == (100 * 10 + 10) * 4
+    
+    def test_clear_disk_cache(self, cached_client):
+        """Test clearing the disk cache, all of it or one model"""
+        client = cached_client
+        for name, version in [("a", 1), ("a", 2), ("b", 1)]:
+            client.disk_cache.fetch(name, version, fake_download)
+        
+        assert client.clear_disk_cache("a", 1) == 1
+        assert client.disk_cache.get("a", 1) is None
+        assert client.disk_cache.get("a", 2) is not None
+        
+        assert client.clear_disk_cache() == 2
+        assert client.disk_cache.stats()["entries"] == 0
+        assert not os.path.exists(os.path.join(client.cache_dir, "b_v1"))
+
+
+class TestModelDiskCache:
+    
+    @pytest.fixture(autouse=True)
+    def reset_verified(self):
+        ModelDiskCache._verified = set()
+        yield
+        ModelDiskCache._verified = set()
+    
+    def test_corrupt_entry_removed(self, tmp_path):
+        """Test that an entry whose files changed is not trusted"""
+        cache = ModelDiskCache(str(tmp_path))
+        path = cache.fetch("m", 1, fake_download)
+        with open(os.path.join(path, "model.pkl"), "wb") as f:
+            f.write(b"truncated")
+        
+        # A new process has not verified the entry yet
+        ModelDiskCache._verified = set()
+        assert cache.get("m", 1) is None
+        assert not os.path.exists(os.path.join(str(tmp_path), "m_v1"))
+    
+    def test_unmanaged_directory_removed(self, tmp_path):
+        """Test that a directory without a manifest entry, e.g. from a crash, is removed"""
+        os.makedirs(os.path.join(str(tmp_path), "m_v1"))
+        cache = ModelDiskCache(str(tmp_path))
+        assert cache.get("m", 1) is None
+        assert not os.path.exists(os.path.join(str(tmp_path), "m_v1"))
+    
+    def test_least_recently_used_evicted(self, tmp_path):
+        """Test that the cache stays under its size cap"""
+        # Each fake model is 1000 bytes
+        cache = ModelDiskCache(str(tmp_path), max_bytes=2500)
+        cache.fetch("a", 1, fake_download)
+        cache.fetch("b", 1, fake_download)
+        # Used again after LAST_USED_RESOLUTION, a has been used since b
+        with patch("src.utils.mlflow_utils.time.time", return_value=time.time() + 3600):
+            assert cache.get("a", 1) is not None
+        cache.fetch("c", 1, fake_download)
+        
+        assert cache.get("b", 1) is None
+        assert cache.get("a", 1) is not None
+        assert cache.stats()["bytes"] <= 2500
+    
+    def test_concurrent_fetch_downloads_once(self, tmp_path):
+        """Test that workers sharing the cache do not download the same model twice"""
+        cache = ModelDiskCache(str(tmp_path))
+        downloads = []
+        
+        def slow_download(dst_path):
+            downloads.append(dst_path)
+            time.sleep(0.05)
+            return fake_download(dst_path)
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            paths = list(executor.map(lambda _: cache.fetch("m", 1, slow_download), range(4)))
+        
+        assert len(downloads) == 1
+        assert len(set(paths)) == 1
+    
+    def test_entry_in_use_not_evicted(self, tmp_path):
+        """Test that an entry held by use(), e.g. while it loads, is skipped by eviction"""
+        cache = ModelDiskCache(str(tmp_path), max_bytes=1500)
+        cache.fetch("a", 1, fake_download)
+        
+        with cache.use("a", 1) as path:
+            cache.fetch("b", 1, fake_download)
+            assert os.path.exists(os.path.join(path, "MLmodel"))
+            assert cache.evict("a") == 0
+        
+        # Once released it is the least recently used entry again
+        cache.fetch("c", 1, fake_download)
+        assert cache.get("a", 1) is None
+    
+    def test_hit_does_not_rewrite_manifest(self, tmp_path):
+        """Test that last_used is only rewritten once it is older than LAST_USED_RESOLUTION"""
+        cache = ModelDiskCache(str(tmp_path))
+        cache.fetch("m", 1, fake_download)
+        
+        with patch.object(cache, "_write_manifest", wraps=cache._write_manifest) as mock_write:
+            assert cache.get("m", 1) is not None
+            mock_write.assert_not_called()
+            with patch("src.utils.mlflow_utils.time.time", return_value=time.time() + 3600):
+                assert cache.get("m", 1) is not None
+            mock_write.assert_called_once()
+    
+    def test_checksum_not_verified_under_manifest_lock(self, tmp_path):
+        """Test that hashing one entry does not hold up the other entries"""
+        cache = ModelDiskCache(str(tmp_path))
+        cache.fetch("a", 1, fake_download)
+        cache.fetch("b", 1, fake_download)
+        ModelDiskCache._verified = {("b_v1", cache._read_manifest()["b_v1"]["checksum"])}
+        
+        hashing = threading.Event()
+        release = threading.Event()
+        real_checksum = mlflow_utils._directory_checksum
+        
+        def slow_checksum(path):
+            hashing.set()
+            release.wait(5)
+            return real_checksum(path)
+        
+        with patch("src.utils.mlflow_utils._directory_checksum", side_effect=slow_checksum), \
+             ThreadPoolExecutor(max_workers=1) as executor:
+            verifying = executor.submit(cache.get, "a", 1)
+            assert hashing.wait(5)
+            assert cache.get("b", 1) is not None
+            assert cache.stats()["entries"] == 2
+            release.set()
+            assert verifying.result() is not None
+    
+    def test_evicted_entries_leave_no_lock_files(self, tmp_path):
+        """Test that the lock file of an entry goes with it, and orphaned ones are swept"""
+        cache = ModelDiskCache(str(tmp_path), max_bytes=1500)
+        
+        def lock_files():
+            return sorted(name for name in os.listdir(str(tmp_path)) if name.endswith(".lock") and name != ".lock")
+        
+        cache.fetch("a", 1, fake_download)
+        cache.fetch("b", 1, fake_download)
+        assert lock_files() == [".b_v1.lock"]
+        assert cache.evict("b") == 1
+        assert lock_files() == []
+        
+        # e.g. left by a cache from before lock files were removed
+        open(os.path.join(str(tmp_path), ".gone_v1.lock"), "w").close()
+        cache.fetch("c", 1, fake_download)
+        assert lock_files() == [".c_v1.lock"]
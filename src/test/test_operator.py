@@ -0,0 +1,193 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from src.arroyo_reduction.backpressure import KeepLatestPolicy
+from src.arroyo_reduction.pending_queue import PendingFrameQueue
+
+
+class Frame:
+    """Stand-in for a RawFrameEvent"""
+
+    def __init__(self, frame_number):
+        self.frame_number = frame_number
+        self.tiled_url = "http://tiled/frames"
+
+
+class DelayedReducer:
+    """Reducer whose per-frame latency is given by a dict of frame_number -> seconds"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.autoencoder_model_name = "ae"
+        self.dimred_model_name = "dr"
+        self.ready = True
+
+    def is_ready(self):
+        return self.ready
+
+    def model_snapshot(self):
+        return (self.autoencoder_model_name, MagicMock(), self.dimred_model_name, MagicMock())
+
+    def reduce(self, message, models=None):
+        import time
+        time.sleep(self.delays.get(message.frame_number, 0))
+        return np.array([[message.frame_number, 0.0]])
+
+
+@pytest.fixture
+def operator_factory():
+    """Build a LatentSpaceOperator with Redis mocked out and publishing into a list"""
+    with patch("src.arroyo_reduction.operator.RedisModelStore"), \
+         patch("src.arroyo_reduction.operator.ModelSelectionCache") as mock_cache_cls, \
+         patch("src.arroyo_reduction.operator.RawFrameEvent", Frame):
+        from src.arroyo_reduction.operator import LatentSpaceOperator
+
+        mock_cache_cls.return_value.get.return_value = ("ae", "dr")
+
+        def factory(reducer, **kwargs):
+            operator = LatentSpaceOperator(None, reducer, **kwargs)
+            operator.published = []
+
+            async def publish(message):
+                operator.published.append(message)
+
+            operator.publish = publish
+            return operator
+
+        yield factory
+
+
+class TestLatentSpaceOperator:
+
+    def test_events_published_in_frame_order(self, operator_factory):
+        """Frames reduced concurrently are published in arrival order"""
+        operator = operator_factory(DelayedReducer({0: 0.2, 1: 0.1}), max_in_flight=4)
+
+        async def run():
+            for frame_number in range(6):
+                await operator.process(Frame(frame_number))
+            # Not blocked on frame 0 while the others are reduced
+            assert operator.pipeline_stats()["max_in_flight_seen"] > 1
+            await operator.drain_in_flight()
+
+        asyncio.run(run())
+
+        assert [event.index for event in operator.published] == list(range(6))
+        assert operator.published[0].autoencoder_model == "ae"
+        stats = operator.pipeline_stats()
+        assert stats["in_flight"] == 0
+        assert stats["reorder_wait_ms_max"] > 0
+
+    def test_straggler_published_late(self, operator_factory):
+        """A frame that exceeds the reorder timeout no longer blocks the frames behind it"""
+        operator = operator_factory(DelayedReducer({0: 0.5}), max_in_flight=4, reorder_timeout_ms=50)
+
+        async def run():
+            for frame_number in range(3):
+                await operator.process(Frame(frame_number))
+            await operator.drain_in_flight()
+
+        asyncio.run(run())
+
+        assert [event.index for event in operator.published] == [1, 2, 0]
+        assert operator.pipeline_stats()["late_frames"] == 1
+
+    def test_frames_held_until_models_ready(self, operator_factory, tmp_path):
+        """Frames arriving before the reducer has models are replayed in order, not reduced to zeros"""
+        reducer = DelayedReducer()
+        reducer.ready = False
+        operator = operator_factory(
+            reducer,
+            pending_queue=PendingFrameQueue(max_memory_frames=2, max_disk_frames=2, spill_dir=str(tmp_path)),
+            replay_poll_interval=0.01,
+        )
+
+        async def run():
+            for frame_number in range(5):
+                await operator.process(Frame(frame_number))
+            assert operator.published == []
+            assert operator.frame_stats()["pending"] == 4
+
+            # The initial models finish loading
+            reducer.ready = True
+            await asyncio.sleep(0.2)
+            await operator.drain_in_flight()
+
+        asyncio.run(run())
+
+        assert [event.index for event in operator.published] == [1, 2, 3, 4]
+        assert operator.frame_stats()["dropped"] == {"queue_full": 1}
+
+    def test_held_frames_dropped_when_models_never_load(self, operator_factory, tmp_path):
+        """If the selected pair never loads, held frames are dropped and counted rather than held forever"""
+        reducer = DelayedReducer()
+        reducer.ready = False
+        operator = operator_factory(
+            reducer,
+            pending_queue=PendingFrameQueue(max_memory_frames=2, max_disk_frames=2, spill_dir=str(tmp_path)),
+            replay_poll_interval=0.01,
+            max_hold_s=0.05,
+        )
+
+        async def run():
+            for frame_number in range(3):
+                await operator.process(Frame(frame_number))
+            await asyncio.sleep(0.2)
+            # The replay loop stopped, later frames are dropped until the models load
+            assert operator._replay_task is None
+            await operator.process(Frame(3))
+            assert operator.frame_stats()["pending"] == 0
+
+            reducer.ready = True
+            await operator.process(Frame(4))
+            await operator.drain_in_flight()
+
+        asyncio.run(run())
+
+        assert [event.index for event in operator.published] == [4]
+        assert operator.frame_stats()["dropped"] == {"model_load_failed": 4}
+
+    def test_frames_not_held_during_hot_swap(self, operator_factory):
+        """While the selected pair loads, the previous pair keeps serving frames"""
+        reducer = DelayedReducer()
+        reducer.autoencoder_model_name = "old_ae"
+        operator = operator_factory(reducer)
+
+        async def run():
+            for frame_number in range(3):
+                await operator.process(Frame(frame_number))
+            await operator.drain_in_flight()
+
+        asyncio.run(run())
+
+        assert [event.index for event in operator.published] == [0, 1, 2]
+        assert {event.autoencoder_model for event in operator.published} == {"old_ae"}
+        assert operator.frame_stats()["pending"] == 0
+
+    def test_load_shedding_tags_events(self, operator_factory):
+        """Under overload only the latest frames are reduced and events report the frames skipped"""
+        operator = operator_factory(
+            DelayedReducer({frame_number: 0.05 for frame_number in range(10)}),
+            max_in_flight=1,
+            backpressure=KeepLatestPolicy(),
+        )
+
+        async def run():
+            for frame_number in range(10):
+                # The listener is never blocked by inference
+                await asyncio.wait_for(operator.process(Frame(frame_number)), 0.01)
+            await operator.drain_intake()
+            await operator.drain_in_flight()
+
+        asyncio.run(run())
+
+        indices = [event.index for event in operator.published]
+        assert indices[0] == 0 and indices[-1] == 9
+        assert len(indices) < 10
+        skipped = sum(event.frames_skipped for event in operator.published)
+        assert skipped == 10 - len(indices) == operator.frame_stats()["dropped"]["load_shed"]
+        assert operator.published[-1].sampling_policy == "keep_latest"
+        assert operator.pipeline_stats()["lag_ms_max"] > 0
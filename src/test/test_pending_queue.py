@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import pytest
+
+from src.arroyo_reduction.pending_queue import PendingFrameQueue
+
+
+@pytest.fixture
+def spill_dir(tmp_path):
+    return str(tmp_path / "spill")
+
+
+class TestPendingFrameQueue:
+
+    def test_fifo_across_memory_and_disk(self, spill_dir):
+        """Frames come back in arrival order, whether they were kept in memory or spilled"""
+        queue = PendingFrameQueue(max_memory_frames=2, max_disk_frames=3, spill_dir=spill_dir)
+        for frame in range(5):
+            queue.put({"frame_number": frame})
+
+        stats = queue.stats()
+        assert stats["in_memory"] == 2
+        assert stats["on_disk"] == 3
+        queue.flush()
+        assert len(os.listdir(queue.spill_path)) == 3
+
+        replayed = [queue.get()["frame_number"] for _ in range(5)]
+        assert replayed == [0, 1, 2, 3, 4]
+        assert queue.get() is None
+        assert len(queue) == 0
+        assert os.listdir(queue.spill_path) == []
+
+    def test_overflow_drops_oldest(self, spill_dir):
+        """A full queue drops its oldest frames and counts them"""
+        queue = PendingFrameQueue(max_memory_frames=1, max_disk_frames=2, spill_dir=spill_dir)
+        for frame in range(6):
+            queue.put(frame)
+
+        assert len(queue) == 3
+        assert queue.dropped["queue_full"] == 3
+        assert [queue.get() for _ in range(3)] == [3, 4, 5]
+        assert os.listdir(queue.spill_path) == []
+
+    def test_disabled_queue(self, spill_dir):
+        """A queue without capacity drops every frame"""
+        queue = PendingFrameQueue(max_memory_frames=0, max_disk_frames=0, spill_dir=spill_dir)
+        queue.put(1)
+
+        assert len(queue) == 0
+        assert queue.stats()["dropped"] == {"queue_disabled": 1}
+
+    def test_spill_read_error(self, spill_dir):
+        """A spill file that disappeared is counted and skipped"""
+        queue = PendingFrameQueue(max_memory_frames=0, max_disk_frames=2, spill_dir=spill_dir)
+        queue.put(1)
+        queue.put(2)
+        queue.flush()
+        os.remove(os.path.join(queue.spill_path, sorted(os.listdir(queue.spill_path))[0]))
+
+        assert queue.get() in (1, 2)
+        assert queue.get() is None
+        assert queue.dropped["spill_read_error"] == 1
+
+    def test_clear(self, spill_dir):
+        """Clearing with a reason removes spill files and counts the frames"""
+        queue = PendingFrameQueue(max_memory_frames=1, max_disk_frames=1, spill_dir=spill_dir)
+        queue.put(1)
+        queue.put(2)
+        queue.clear(reason="new_run")
+
+        assert len(queue) == 0
+        assert queue.dropped["new_run"] == 2
+        queue.flush()
+        assert os.listdir(queue.spill_path) == []
+
+    def test_queues_do_not_share_spill_files(self, spill_dir):
+        """Queues sharing a spill_dir each spill to their own directory and only remove it"""
+        first = PendingFrameQueue(max_memory_frames=0, max_disk_frames=2, spill_dir=spill_dir)
+        second = PendingFrameQueue(max_memory_frames=0, max_disk_frames=2, spill_dir=spill_dir)
+        first.put("first")
+        second.put("second")
+        assert first.spill_path != second.spill_path
+
+        second_path = second.spill_path
+        second.close()
+        assert not os.path.exists(second_path)
+        assert os.path.exists(first.spill_path)
+        assert first.get() == "first"
+        assert first.stats()["dropped"] == {}
+
+    def test_get_async(self, spill_dir):
+        """Spilled frames are read back in order from the event loop"""
+        queue = PendingFrameQueue(max_memory_frames=1, max_disk_frames=2, spill_dir=spill_dir)
+        for frame in range(3):
+            queue.put(frame)
+
+        async def replay():
+            return [await queue.get_async() for _ in range(4)]
+
+        assert asyncio.run(replay()) == [0, 1, 2, None]
@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.utils.plot_utils import (
+    generate_scatter3d_plot,
+    generate_scattergl_plot,
+    labels_in_order,
+    masked_columns,
+)
+
+LABELS = [2, 0, 2, 1, 0, 1]
+LABEL_NAMES = {0: "zero", 1: "one", 2: "two"}
+
+
+class TestScatterBuilders:
+
+    def test_labels_in_first_appearance_order(self):
+        """Labels come back in the order they first appear, not sorted"""
+        unique_labels, codes = labels_in_order(LABELS)
+        np.testing.assert_array_equal(unique_labels, [2, 0, 1])
+        np.testing.assert_array_equal(codes, [0, 1, 0, 2, 1, 2])
+
+        unique_labels, codes = labels_in_order(["b", "a", "b", "c", "a"])
+        np.testing.assert_array_equal(unique_labels, ["b", "a", "c"])
+        np.testing.assert_array_equal(codes, [0, 1, 0, 2, 1])
+
+    def test_masked_columns(self):
+        """Each column keeps its values where the code matches and is NaN elsewhere"""
+        codes = np.array([0, 1, 0, 2])
+        x, index = masked_columns(codes, 0, [1.5, 2.5, 3.5, 4.5], np.arange(4))
+        np.testing.assert_array_equal(x, [1.5, np.nan, 3.5, np.nan])
+        np.testing.assert_array_equal(index, [0, np.nan, 2, np.nan])
+        assert index.dtype == float
+
+    def test_scattergl_keeps_row_order(self):
+        """The i-th point of every trace is the i-th row, with NaN where other labels are"""
+        x = np.arange(6) * 10.0
+        y = -np.arange(6, dtype=float)
+        fig = generate_scattergl_plot(x, y, LABELS, LABEL_NAMES, custom_indices=np.arange(100, 106))
+
+        assert [trace.name for trace in fig.data] == ["two", "zero", "one"]
+        labels = np.array(LABELS)
+        for trace, label in zip(fig.data, [2, 0, 1]):
+            rows = labels == label
+            np.testing.assert_array_equal(trace.x, np.where(rows, x, np.nan))
+            np.testing.assert_array_equal(trace.y, np.where(rows, y, np.nan))
+            np.testing.assert_array_equal(
+                np.asarray(trace.customdata, dtype=float)[:, 0], np.where(rows, np.arange(100, 106), np.nan)
+            )
+
+    def test_scatter3d_keeps_row_order(self):
+        """The 3D builder keeps the same row order, customdata defaulting to the row index"""
+        x = np.arange(6, dtype=float)
+        fig = generate_scatter3d_plot(x, x + 1, x + 2, LABELS, LABEL_NAMES)
+
+        labels = np.array(LABELS)
+        for trace, label in zip(fig.data, [2, 0, 1]):
+            rows = labels == label
+            np.testing.assert_array_equal(trace.z, np.where(rows, x + 2, np.nan))
+            np.testing.assert_array_equal(np.asarray(trace.customdata, dtype=float)[:, 0], np.where(rows, x, np.nan))
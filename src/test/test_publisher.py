@@ -0,0 +1,306 @@
+import asyncio
+import json
+import socket
+
+import numpy as np
+import pytest
+import websockets
+from arroyopy.schemas import Start, Stop
+
+from src.arroyo_reduction import metrics, ws_protocol
+from src.arroyo_reduction.client_queue import (
+    POLICY_COALESCE,
+    POLICY_DISCONNECT,
+    POLICY_DROP_OLDEST,
+    ClientSendQueue,
+)
+from src.arroyo_reduction.publisher import LSEWSResultPublisher
+from src.arroyo_reduction.replay_buffer import ReplayBuffer
+from src.arroyo_reduction.schemas import LatentSpaceEvent
+
+
+def make_event(index, tiled_url="http://tiled/api/v1/raw/run1", autoencoder_model="ae"):
+    return LatentSpaceEvent(
+        tiled_url=tiled_url,
+        feature_vector=[float(index), index + 0.5],
+        index=index,
+        autoencoder_model=autoencoder_model,
+        dimred_model="dr",
+    )
+
+
+class FakeClient:
+    def __init__(self, subprotocol=None, delay=0, port=1234):
+        self.subprotocol = subprotocol
+        self.remote_address = ("127.0.0.1", port)
+        self.delay = delay
+        self.sent = []
+        self.closed = False
+        self._closed = asyncio.Event()
+
+    async def send(self, payload):
+        await asyncio.sleep(self.delay)
+        self.sent.append(payload)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+        self._closed.set()
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+
+async def connect(publisher, client) -> ClientSendQueue:
+    """Run the publisher's handler for a client and return its send queue"""
+    asyncio.ensure_future(publisher.websocket_handler(client))
+    await asyncio.sleep(0)
+    return publisher.client_queues[client]
+
+
+@pytest.fixture
+def publisher():
+    publisher = LSEWSResultPublisher(flush_interval_ms=20)
+    # connected_clients is shared by the class, start from an empty set
+    publisher.connected_clients = set()
+    return publisher
+
+
+class TestWSProtocol:
+
+    def test_encode_decode_roundtrip(self):
+        events = [make_event(i) for i in range(4)]
+        batch = ws_protocol.batch_frame(3, events)
+        for protocol in ws_protocol.SUBPROTOCOLS:
+            frame = ws_protocol.decode(ws_protocol.encode(batch, protocol))
+            assert frame["session"] == 3 and frame["count"] == 4
+            np.testing.assert_array_equal(frame["index"], [0, 1, 2, 3])
+            np.testing.assert_allclose(frame["feature_vector"], [event.feature_vector for event in events])
+
+    def test_batch_smaller_than_json(self):
+        events = [make_event(i) for i in range(100)]
+        legacy = sum(len(event.model_dump_json()) for event in events)
+        batch = ws_protocol.encode(ws_protocol.batch_frame(1, events), ws_protocol.PROTOCOL_MSGPACK)
+        assert len(batch) < legacy / 10
+
+
+class TestReplayBuffer:
+
+    def test_ring_keeps_latest_points(self):
+        buffer = ReplayBuffer(max_points=5)
+        for start in range(0, 12, 3):
+            index = np.arange(start, start + 3)
+            buffer.append(index, np.stack([index, -index], axis=1).astype(np.float32))
+
+        index, feature_vectors = buffer.snapshot()
+        np.testing.assert_array_equal(index, [7, 8, 9, 10, 11])
+        np.testing.assert_array_equal(feature_vectors[:, 1], -index)
+        assert buffer.overwritten == 7
+
+    def test_bounded_by_bytes(self):
+        # 4 bytes of index and 2 x 4 bytes of features per point
+        buffer = ReplayBuffer(max_points=1000, max_bytes=120)
+        buffer.append(np.arange(50), np.zeros((50, 2), dtype=np.float32))
+        assert buffer.capacity == len(buffer) == 10
+        assert buffer.nbytes <= 120
+        np.testing.assert_array_equal(buffer.snapshot()[0], range(40, 50))
+
+
+class TestLSEWSResultPublisher:
+
+    def test_events_coalesced_per_flush_interval(self, publisher):
+        client = FakeClient(ws_protocol.PROTOCOL_MSGPACK)
+
+        async def run():
+            await connect(publisher, client)
+            for index in range(5):
+                await publisher.publish(make_event(index))
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+        frames = [ws_protocol.decode(payload) for payload in client.sent]
+        assert [frame["type"] for frame in frames] == ["session", "batch"]
+        assert frames[0]["tiled_url"] == "http://tiled/api/v1/raw/run1"
+        assert frames[0]["autoencoder_model"] == "ae"
+        np.testing.assert_array_equal(frames[1]["index"], range(5))
+
+    def test_session_sent_again_when_it_changes(self, publisher):
+        client = FakeClient(ws_protocol.PROTOCOL_BASE64)
+
+        async def run():
+            await connect(publisher, client)
+            await publisher.publish(make_event(0))
+            await publisher.publish(make_event(1))
+            await publisher.publish(make_event(2, autoencoder_model="other_ae"))
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+        # Text frames for the browser
+        assert all(isinstance(payload, str) for payload in client.sent)
+        frames = [ws_protocol.decode(payload) for payload in client.sent]
+        assert [frame["type"] for frame in frames] == ["session", "batch", "session", "batch"]
+        assert frames[2]["autoencoder_model"] == "other_ae"
+        assert frames[3]["session"] == frames[2]["session"] != frames[1]["session"]
+        assert frames[1]["count"] == 2 and frames[3]["count"] == 1
+
+    def test_legacy_client_gets_json_per_event(self, publisher):
+        legacy = FakeClient()
+
+        async def run():
+            await connect(publisher, legacy)
+            for index in range(3):
+                await publisher.publish(make_event(index))
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        assert [json.loads(payload)["index"] for payload in legacy.sent] == [0, 1, 2]
+        assert publisher._batch == []
+
+    def test_subprotocol_negotiation(self, publisher):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        publisher.host, publisher.port = "127.0.0.1", port
+
+        async def negotiate(subprotocols):
+            async with websockets.connect(f"ws://127.0.0.1:{port}", subprotocols=subprotocols) as websocket:
+                return websocket.subprotocol
+
+        async def run():
+            server = asyncio.create_task(publisher.start())
+            await asyncio.sleep(0.2)
+            try:
+                return [
+                    await negotiate([ws_protocol.PROTOCOL_BASE64]),
+                    await negotiate(["unknown", ws_protocol.PROTOCOL_MSGPACK]),
+                    await negotiate(None),
+                ]
+            finally:
+                server.cancel()
+
+        assert asyncio.run(run()) == [ws_protocol.PROTOCOL_BASE64, ws_protocol.PROTOCOL_MSGPACK, None]
+
+    def test_slow_client_does_not_hold_up_others(self, publisher):
+        publisher.flush_interval = 0
+        publisher.client_queue_size = 4
+        publisher.client_queue_policy = POLICY_DROP_OLDEST
+        fast = FakeClient(ws_protocol.PROTOCOL_MSGPACK, port=1)
+        slow = FakeClient(ws_protocol.PROTOCOL_MSGPACK, delay=0.5, port=2)
+
+        async def run():
+            await connect(publisher, fast)
+            slow_queue = await connect(publisher, slow)
+            for index in range(20):
+                await publisher.publish(make_event(index))
+                await asyncio.sleep(0.005)
+            assert slow_queue.lag() > 0
+            assert metrics.CLIENT_LAG_SECONDS.get(client="127.0.0.1:2") > 0
+            assert metrics.CLIENT_FRAMES_DROPPED.get(client="127.0.0.1:2") == slow_queue.dropped
+            return slow_queue
+
+        slow_queue = asyncio.run(run())
+
+        fast_indices = [int(i) for payload in fast.sent[1:] for i in ws_protocol.decode(payload)["index"]]
+        assert fast_indices == list(range(20))
+        assert len(slow.sent) < 3
+        assert slow_queue.dropped > 0
+
+    def test_coalesce_keeps_every_point(self, publisher):
+        publisher.flush_interval = 0
+        publisher.client_queue_size = 2
+        publisher.client_queue_policy = POLICY_COALESCE
+        slow = FakeClient(ws_protocol.PROTOCOL_MSGPACK, delay=0.05)
+
+        async def run():
+            queue = await connect(publisher, slow)
+            for index in range(10):
+                await publisher.publish(make_event(index))
+            while len(queue):
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.1)
+            return queue
+
+        queue = asyncio.run(run())
+
+        frames = [ws_protocol.decode(payload) for payload in slow.sent]
+        indices = [int(i) for frame in frames if frame["type"] == "batch" for i in frame["index"]]
+        assert indices == list(range(10))
+        assert len(frames) < 11
+        assert queue.dropped == 0
+
+    def test_disconnect_slow_client(self, publisher):
+        publisher.flush_interval = 0
+        publisher.client_queue_size = 2
+        publisher.client_queue_policy = POLICY_DISCONNECT
+        slow = FakeClient(ws_protocol.PROTOCOL_MSGPACK, delay=1)
+
+        async def run():
+            await connect(publisher, slow)
+            for index in range(5):
+                await publisher.publish(make_event(index))
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        assert slow.closed
+
+    def test_late_joiner_gets_snapshot(self, publisher):
+        early = FakeClient(ws_protocol.PROTOCOL_MSGPACK, port=1)
+        late = FakeClient(ws_protocol.PROTOCOL_BASE64, port=2)
+
+        async def run():
+            # Points published before anyone connects are replayed too
+            for index in range(3):
+                await publisher.publish(make_event(index))
+            await asyncio.sleep(0.05)
+            await connect(publisher, early)
+            for index in range(3, 6):
+                await publisher.publish(make_event(index))
+            await asyncio.sleep(0.05)
+            await connect(publisher, late)
+            await publisher.publish(make_event(6))
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        frames = [ws_protocol.decode(payload) for payload in late.sent]
+        assert [frame["type"] for frame in frames] == ["session", "snapshot", "batch"]
+        assert frames[0]["tiled_url"] == "http://tiled/api/v1/raw/run1"
+        np.testing.assert_array_equal(frames[1]["index"], range(6))
+        np.testing.assert_array_equal(frames[2]["index"], [6])
+        early_frames = [ws_protocol.decode(payload) for payload in early.sent]
+        assert [frame["type"] for frame in early_frames] == ["session", "snapshot", "batch", "batch"]
+
+    def test_start_and_stop_leave_no_tasks(self, publisher):
+        """Start and Stop with clients connected do not spawn tasks that nobody awaits"""
+        client = FakeClient(ws_protocol.PROTOCOL_MSGPACK)
+
+        async def run():
+            await connect(publisher, client)
+            tasks = asyncio.all_tasks()
+            await publisher.publish(Start())
+            await publisher.publish(Stop())
+            return asyncio.all_tasks() - tasks
+
+        assert asyncio.run(run()) == set()
+
+    def test_start_resets_replay(self, publisher):
+        client = FakeClient(ws_protocol.PROTOCOL_MSGPACK)
+
+        async def run():
+            for index in range(3):
+                await publisher.publish(make_event(index))
+            await publisher.publish(Start())
+            await publisher.publish(make_event(0, tiled_url="http://tiled/api/v1/raw/run2"))
+            await asyncio.sleep(0.05)
+            await connect(publisher, client)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        frames = [ws_protocol.decode(payload) for payload in client.sent]
+        assert frames[0]["tiled_url"] == "http://tiled/api/v1/raw/run2"
+        np.testing.assert_array_equal(frames[1]["index"], [0])
+        assert publisher.current_start_message is not None
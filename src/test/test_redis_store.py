@@ -1,10 +1,11 @@
 import pytest
 import redis
 import json
+import time
 from unittest.mock import patch, MagicMock
 
 from src.test.test_utils import mock_redis_client, redis_test_store
-from src.arroyo_reduction.redis_model_store import RedisModelStore
+from src.arroyo_reduction.redis_model_store import ModelSelectionCache, ModelUpdateSubscriber, RedisModelStore
 
 class TestRedisStore:
     
@@ -70,25 +71,110 @@ class TestRedisStore:
         assert "timestamp" in message
         
     def test_subscribe_to_model_updates(self, redis_test_store):
-        """Test subscribing to model updates"""
-        # Set up mocks
-        mock_thread = MagicMock()
-        mock_thread_cls = MagicMock(return_value=mock_thread)
-        
-        # Set up callback
-        callback = MagicMock()
-        
-        # Call the function
-        with patch('threading.Thread', mock_thread_cls):
-            redis_test_store.subscribe_to_model_updates(callback)
-            
-            # Verify thread was created and started
-            mock_thread_cls.assert_called_once()
-            assert mock_thread_cls.call_args[1]["daemon"] is True
-            
-            # Get the thread target function
-            thread_target = mock_thread_cls.call_args[1]["target"]
-            assert callable(thread_target)
-            
-            # Verify thread was started
-            mock_thread.start.assert_called_once()
\ No newline at end of file
+        """Every store of the process shares one subscription, each callback gets every update"""
+        first_callback = MagicMock()
+        second_callback = MagicMock()
+
+        with patch.dict("src.arroyo_reduction.redis_model_store._subscribers", clear=True), \
+             patch.object(ModelUpdateSubscriber, "_listen") as mock_listen:
+            redis_test_store.subscribe_to_model_updates(first_callback)
+            other_store = RedisModelStore(host="localhost", port=6379)
+            other_store.subscribe_to_model_updates(second_callback)
+
+            subscriber = ModelUpdateSubscriber.shared("localhost", 6379, RedisModelStore.CHANNEL_MODEL_UPDATES)
+            update = {"model_type": "autoencoder", "model_name": "ae"}
+            subscriber.dispatch(update)
+
+            deadline = time.monotonic() + 2
+            while not (first_callback.called and second_callback.called) and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        # A single listener thread for both stores
+        mock_listen.assert_called_once()
+        first_callback.assert_called_once_with(update)
+        second_callback.assert_called_once_with(update)
+
+    def test_store_models_is_atomic(self, redis_test_store):
+        """The pair, its generation and a single pair update are written by one script call"""
+        store_pair = redis_test_store._mock_client.register_script.return_value
+        store_pair.return_value = [7, 2]
+
+        assert redis_test_store.store_models("ae", None) == 7
+
+        redis_test_store._mock_client.register_script.assert_called_once_with(RedisModelStore._STORE_PAIR_SCRIPT)
+        kwargs = store_pair.call_args[1]
+        assert kwargs["keys"] == [
+            RedisModelStore.KEY_MODEL_PAIR,
+            RedisModelStore.KEY_AUTOENCODER_MODEL,
+            RedisModelStore.KEY_DIMRED_MODEL,
+        ]
+        channel, _, set_autoencoder, autoencoder, set_dimred, _ = kwargs["args"]
+        assert channel == RedisModelStore.CHANNEL_MODEL_UPDATES
+        assert (set_autoencoder, autoencoder, set_dimred) == (1, "ae", 0)
+        # No separate SET and PUBLISH round trips
+        redis_test_store._mock_client.set.assert_not_called()
+        redis_test_store._mock_client.publish.assert_not_called()
+
+        # The script is registered once
+        redis_test_store.store_models("", "")
+        redis_test_store._mock_client.register_script.assert_called_once()
+
+        store_pair.side_effect = redis.exceptions.ConnectionError()
+        assert redis_test_store.store_models("ae", "dr") is None
+
+    def test_get_model_pair(self, redis_test_store):
+        redis_test_store._mock_client.hmget.return_value = ["ae", "dr", "3"]
+        assert redis_test_store.get_model_pair() == ("ae", "dr", 3)
+
+    def test_get_selected_models(self, redis_test_store):
+        """Test reading both selections in one round trip"""
+        redis_test_store._mock_client.mget.return_value = ["ae", "dr"]
+
+        assert redis_test_store.get_selected_models() == ("ae", "dr")
+        redis_test_store._mock_client.mget.assert_called_once_with(
+            [RedisModelStore.KEY_AUTOENCODER_MODEL, RedisModelStore.KEY_DIMRED_MODEL]
+        )
+
+        # A failed read is distinguishable from an empty selection
+        redis_test_store._mock_client.mget.side_effect = redis.exceptions.ConnectionError()
+        assert redis_test_store.get_selected_models() is None
+
+
+class TestModelSelectionCache:
+
+    def test_selection_follows_updates(self):
+        """The snapshot is seeded from Redis, then kept current by pub/sub without further reads"""
+        store = MagicMock()
+        store.get_selected_models.return_value = ("ae", "dr")
+
+        cache = ModelSelectionCache(store, reconcile_interval=0)
+        assert cache.get() == ("ae", "dr")
+
+        callback = store.subscribe_to_model_updates.call_args[0][0]
+        callback({"model_type": "autoencoder", "model_name": "ae2"})
+        callback({"model_type": "dimred", "model_name": ""})
+        callback({"model_type": "unknown", "model_name": "x"})
+
+        assert cache.get() == ("ae2", "")
+
+        callback({"model_type": "pair", "autoencoder_model": "ae3", "dimred_model": "dr3", "generation": 2})
+        assert cache.get() == ("ae3", "dr3")
+
+        # A pair update delivered late is not applied over a newer one
+        callback({"model_type": "pair", "autoencoder_model": "ae1", "dimred_model": "dr1", "generation": 1})
+        assert cache.get() == ("ae3", "dr3")
+        store.get_selected_models.assert_called_once()
+
+    def test_reconcile(self):
+        """Reconciliation picks up missed updates and keeps the snapshot if Redis is unreachable"""
+        store = MagicMock()
+        store.get_selected_models.return_value = ("ae", "dr")
+        cache = ModelSelectionCache(store, reconcile_interval=0)
+
+        store.get_selected_models.return_value = ("ae", "dr2")
+        assert cache.reconcile() is True
+        assert cache.get() == ("ae", "dr2")
+
+        store.get_selected_models.return_value = None
+        assert cache.reconcile() is False
+        assert cache.get() == ("ae", "dr2")
@@ -21,6 +21,9 @@ class TestReducer:
             # Set references to the mock models
             reducer.current_torch_model = redis_mlflow_mocks["autoencoder"]
             reducer.current_dim_reduction_model = redis_mlflow_mocks["dimred"]
+            # Forget the warm-up of the initial pair
+            redis_mlflow_mocks["autoencoder"].reset_mock()
+            redis_mlflow_mocks["dimred"].reset_mock()
             
             # Store test data
             reducer._test_data = {
@@ -65,9 +68,54 @@ class TestReducer:
         # Verify it's actually the same array we created
         np.testing.assert_array_equal(result, umap_coords)
     
-    def test_reduce_during_model_loading(self, reducer, mock_event):
-        """Test that reduce() returns zeros when models are loading"""
-        # Set loading flag to True to simulate model loading
+    def test_reduce_batch(self, reducer, redis_mlflow_mocks):
+        """Test that reduce_batch() runs one batched call per model and keeps frame order"""
+        mocks = redis_mlflow_mocks
+
+        # Three frames with distinct content
+        events = []
+        for _ in range(3):
+            event = MagicMock()
+            event.image.array = np.random.randint(0, 255, (64, 64), dtype=np.uint8)
+            events.append(event)
+
+        latent_features = np.random.rand(3, 64).astype(np.float32)
+        umap_coords = np.random.rand(3, 2).astype(np.float32)
+        mocks["autoencoder"].predict.return_value = {"latent_features": latent_features}
+        mocks["dimred"].predict.return_value = {"umap_coords": umap_coords}
+
+        with patch('src.arroyo_reduction.reducer.logger'):
+            result = reducer.reduce_batch(events)
+
+        # One forward pass with the stacked frames, in message order
+        mocks["autoencoder"].predict.assert_called_once()
+        batch_input = mocks["autoencoder"].predict.call_args[0][0]
+        assert batch_input.shape == (3, 64, 64)
+        for i, event in enumerate(events):
+            np.testing.assert_array_equal(batch_input[i], event.image.array)
+
+        # One dimension reduction call with all latent features
+        mocks["dimred"].predict.assert_called_once_with(latent_features)
+        np.testing.assert_array_equal(result, umap_coords)
+
+    def test_reduce_batch_size_mismatch(self, reducer, redis_mlflow_mocks):
+        """Test that reduce_batch() refuses results that cannot be split per frame"""
+        mocks = redis_mlflow_mocks
+        events = [MagicMock(), MagicMock()]
+        for event in events:
+            event.image.array = np.zeros((64, 64), dtype=np.uint8)
+
+        mocks["autoencoder"].predict.return_value = {"latent_features": np.zeros((1, 64))}
+        mocks["dimred"].predict.return_value = {"umap_coords": np.zeros((1, 2))}
+
+        with patch('src.arroyo_reduction.reducer.logger'):
+            assert reducer.reduce_batch(events) is None
+
+    def test_reduce_during_model_loading(self, reducer, mock_event, redis_mlflow_mocks):
+        """Test that reduce() keeps serving with the current models while a new model loads"""
+        mocks = redis_mlflow_mocks
+
+        # Set loading flag to True to simulate a background model load
         reducer.is_loading_model = True
         reducer.loading_model_type = "autoencoder"
         
@@ -76,10 +124,73 @@ class TestReducer:
             # Call reduce()
             result = reducer.reduce(mock_event)
         
-        # Verify result is zeros of correct shape
-        assert isinstance(result, np.ndarray)
-        assert result.shape == (1, 2)
-        assert np.all(result == 0)
+        # The current models produced a real result, not a placeholder
+        mocks["autoencoder"].predict.assert_called_once()
+        np.testing.assert_array_equal(result, mocks["umap_coords"])
+
+    def test_hot_swap_keeps_old_model_serving(self, reducer, mock_event, redis_mlflow_mocks):
+        """Test that a model update swaps atomically and the old model serves until then"""
+        mocks = redis_mlflow_mocks
+        old_autoencoder = mocks["autoencoder"]
+
+        new_autoencoder = MagicMock()
+        new_autoencoder.predict.return_value = {"latent_features": mocks["latent_features"]}
+
+        results_during_load = []
+
+        def slow_load(model_name):
+            # A frame arriving mid-load is served by the old autoencoder
+            results_during_load.append(reducer.reduce(mock_event))
+            return new_autoencoder
+
+        reducer.mlflow_client = MagicMock()
+        reducer.mlflow_client.load_model.side_effect = slow_load
+
+        with patch('src.arroyo_reduction.reducer.logger'):
+            reducer._handle_model_update({"model_type": "autoencoder", "model_name": "new_autoencoder"})
+            old_calls = old_autoencoder.predict.call_count
+            reducer.reduce(mock_event)
+
+        np.testing.assert_array_equal(results_during_load[0], mocks["umap_coords"])
+        assert old_calls == 1
+        assert reducer.current_torch_model is new_autoencoder
+        assert reducer.autoencoder_model_name == "new_autoencoder"
+        # Warm-up plus one real frame went through the new model
+        assert new_autoencoder.predict.call_count == 2
+        assert reducer.swap_count == 1
+        assert reducer.last_swap_latency is not None
+        assert not reducer.is_loading_model
+
+    def test_time_to_first_result_after_swap(self, reducer, mock_event, redis_mlflow_mocks):
+        """Test that the first frame reduced by a new pair records its time to first result"""
+        new_dimred = MagicMock()
+        new_dimred.predict.return_value = {"umap_coords": redis_mlflow_mocks["umap_coords"]}
+        reducer.mlflow_client = MagicMock()
+        reducer.mlflow_client.load_model.return_value = new_dimred
+        reducer.take_time_to_first_result()
+
+        with patch('src.arroyo_reduction.reducer.logger'):
+            reducer._handle_model_update({"model_type": "dimred", "model_name": "new_dimred"})
+            # The warm-up frame does not count
+            assert reducer.time_to_first_result is None
+            reducer.reduce(mock_event)
+            reducer.reduce(mock_event)
+
+        seconds = reducer.take_time_to_first_result()
+        assert 0 < seconds >= reducer.last_swap_latency
+        assert reducer.take_time_to_first_result() is None
+
+    def test_failed_load_keeps_current_model(self, reducer, redis_mlflow_mocks):
+        """Test that a model that fails to load is never swapped in"""
+        reducer.mlflow_client = MagicMock()
+        reducer.mlflow_client.load_model.return_value = None
+
+        with patch('src.arroyo_reduction.reducer.logger'):
+            reducer._handle_model_update({"model_type": "dimred", "model_name": "broken_dimred"})
+
+        assert reducer.current_dim_reduction_model is redis_mlflow_mocks["dimred"]
+        assert reducer.dimred_model_name == "test_dimred"
+        assert reducer.swap_count == 0
     
     def test_init_loads_models_from_redis(self):
         """Test that constructor loads models from Redis"""
@@ -345,35 +456,93 @@ class TestReducer:
             assert reducer.is_loading_model == False
             assert reducer.loading_model_type == None
     
-    def test_subscribe_to_model_updates(self):
-        """Test subscribing to model updates"""
-        # Create a mock thread class and instance
-        mock_thread = MagicMock()
-        
-        # Test with just the thread mocked
-        with patch('threading.Thread', return_value=mock_thread) as mock_thread_class, \
-             patch('src.arroyo_reduction.redis_model_store.RedisModelStore'), \
-             patch('src.utils.mlflow_utils.MLflowClient'):
-            
-            # Import the real class but patch the __init__ to avoid complex initialization
-            from src.arroyo_reduction.reducer import LatentSpaceReducer
-            
-            with patch.object(LatentSpaceReducer, '__init__', return_value=None):
-                # Create the reducer without calling __init__
-                reducer = LatentSpaceReducer()
-                
-                # Mock any necessary attributes
-                reducer.autoencoder_model_name = "test_autoencoder"
-                reducer.dimred_model_name = "test_dimred"
-                
-                # Call the method directly
-                reducer._subscribe_to_model_updates()
-                
-                # Verify thread was created with expected parameters
-                mock_thread_class.assert_called_once()
-                args, kwargs = mock_thread_class.call_args
-                assert kwargs['daemon'] is True
-                assert 'target' in kwargs
-                
-                # Verify thread was started
-                mock_thread.start.assert_called_once()
\ No newline at end of file
+    def test_subscribe_to_model_updates(self, reducer):
+        """The reducer registers its handlers with the process-wide model update listener"""
+        reducer._test_data["mocks"]["store"].subscribe_to_model_updates.reset_mock()
+
+        reducer._subscribe_to_model_updates()
+
+        callbacks = [call[0][0] for call in reducer.redis_model_store.subscribe_to_model_updates.call_args_list]
+        assert callbacks == [reducer._note_model_generation, reducer._handle_model_update]
+
+    def test_pair_update_swaps_both_models_at_once(self, reducer):
+        """A pair update loads both models and swaps them in together, or not at all"""
+        new_autoencoder, new_dimred = MagicMock(), MagicMock()
+        reducer.mlflow_client = MagicMock()
+        reducer.mlflow_client.load_model.side_effect = {"ae2": new_autoencoder, "dr2": new_dimred}.get
+
+        with patch.object(reducer, "_warm_up"), \
+             patch.object(reducer, "_swap_models", wraps=reducer._swap_models) as swap:
+            reducer._handle_model_update({"model_type": "pair", "autoencoder_model": "ae2", "dimred_model": "dr2"})
+            swap.assert_called_once()
+
+            assert reducer.model_snapshot() == ("ae2", new_autoencoder, "dr2", new_dimred)
+
+            # The dimred model cannot be loaded, the autoencoder is not swapped either
+            reducer._handle_model_update({"model_type": "pair", "autoencoder_model": "ae3", "dimred_model": "missing"})
+            assert swap.call_count == 1
+            assert reducer.model_snapshot() == ("ae2", new_autoencoder, "dr2", new_dimred)
+
+    def test_pair_models_load_concurrently(self, reducer):
+        """Both models of a pair load at the same time rather than one after the other"""
+        import threading
+        import time
+
+        both_loading = threading.Barrier(2, timeout=2)
+
+        def load_model(name):
+            # Fails with BrokenBarrierError unless both loads run at once
+            both_loading.wait()
+            return MagicMock(name=name)
+
+        reducer.mlflow_client = MagicMock()
+        reducer.mlflow_client.load_model.side_effect = load_model
+
+        with patch.object(reducer, "_warm_up"):
+            start = time.monotonic()
+            reducer._handle_model_update({"model_type": "pair", "autoencoder_model": "ae2", "dimred_model": "dr2", "generation": 1})
+
+        assert time.monotonic() - start < 2
+        assert (reducer.autoencoder_model_name, reducer.dimred_model_name) == ("ae2", "dr2")
+        assert reducer.model_generation == 1
+
+    def test_stale_pair_generation_ignored(self, reducer):
+        """A pair superseded by a newer selection, before or while loading, is never swapped in"""
+        reducer.mlflow_client = MagicMock()
+        reducer.mlflow_client.load_model.side_effect = lambda name: MagicMock(name=name)
+        reducer.model_generation = 5
+
+        with patch.object(reducer, "_warm_up"):
+            reducer._handle_model_update({"model_type": "pair", "autoencoder_model": "ae4", "dimred_model": "dr4", "generation": 4})
+            assert reducer.autoencoder_model_name == "test_autoencoder"
+            reducer.mlflow_client.load_model.assert_not_called()
+
+            # Generation 7 is selected while generation 6 loads
+            def load_and_supersede(name):
+                reducer._note_model_generation({"generation": 7})
+                return MagicMock(name=name)
+
+            reducer.mlflow_client.load_model.side_effect = load_and_supersede
+            reducer._handle_model_update({"model_type": "pair", "autoencoder_model": "ae6", "dimred_model": "dr6", "generation": 6})
+
+        assert reducer.autoencoder_model_name == "test_autoencoder"
+        assert reducer.model_generation == 5
+
+
+class TestModelPrefetcher:
+
+    def test_prefetch_once_skips_placeholder(self):
+        """Test that every listed live model is prefetched, but not the error placeholder"""
+        from src.arroyo_reduction.model_prefetch import ModelPrefetcher
+
+        mlflow_client = MagicMock()
+        mlflow_client.get_mlflow_models.return_value = [
+            {"label": "ae", "value": "ae"},
+            {"label": "dr", "value": "dr"},
+            {"label": "Error loading models", "value": None},
+        ]
+        mlflow_client.prefetch_model.side_effect = lambda name: name == "ae"
+
+        assert ModelPrefetcher(mlflow_client).prefetch_once() == 1
+        mlflow_client.get_mlflow_models.assert_called_once_with(livemode=True)
+        assert [c.args[0] for c in mlflow_client.prefetch_model.call_args_list] == ["ae", "dr"]
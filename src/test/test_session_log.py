@@ -0,0 +1,205 @@
+import asyncio
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from src.arroyo_reduction.schemas import LatentSpaceEvent
+from src.arroyo_reduction.session_log import LiveSessionLog
+
+
+class FakeStreams:
+    """Just enough of a Redis client for streams, sorted sets and pipelines, with bytes responses"""
+
+    def __init__(self):
+        self.streams = {}
+        self.sorted_sets = {}
+        self.round_trips = 0
+        # Stream entries returned by XRANGE, to check a read only fetches what it asks for
+        self.entries_read = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    @staticmethod
+    def _id(entry_id, default_seq):
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        ms, _, seq = entry_id.partition("-")
+        return int(ms), int(seq) if seq else default_seq
+
+    def _xadd(self, key, fields, id="*", **kwargs):
+        entries = self.streams.setdefault(key.encode(), [])
+        last = self._id(entries[-1][0], 0) if entries else (0, 0)
+        new = (last[0] + 1, 0) if id == "*" else self._id(id, 0)
+        if new <= last:
+            raise ValueError("The ID specified in XADD is equal or smaller than the target stream top item")
+        entry_id = f"{new[0]}-{new[1]}".encode()
+        encoded = {
+            name.encode(): value if isinstance(value, bytes) else str(value).encode()
+            for name, value in fields.items()
+        }
+        entries.append((entry_id, encoded))
+        return entry_id
+
+    def _xrange(self, key, min="-", max="+", count=None):
+        entries = self.streams.get(key.encode(), [])
+        if min != "-":
+            entries = [entry for entry in entries if self._id(entry[0], 0) >= self._id(min, 0)]
+        if max != "+":
+            entries = [entry for entry in entries if self._id(entry[0], 0) <= self._id(max, float("inf"))]
+        entries = entries[:count]
+        self.entries_read += len(entries)
+        return entries
+
+    def xrange(self, key, min="-", max="+", count=None):
+        self.round_trips += 1
+        return self._xrange(key, min, max, count)
+
+    def _xrevrange(self, key, max="+", min="-", count=None):
+        return self.streams.get(key.encode(), [])[::-1][:count]
+
+    def _zadd(self, key, mapping, nx=False):
+        members = self.sorted_sets.setdefault(key.encode(), {})
+        for member, score in mapping.items():
+            if not (nx and member.encode() in members):
+                members[member.encode()] = score
+        return len(mapping)
+
+    def zrange(self, key, start, end):
+        self.round_trips += 1
+        members = self.sorted_sets.get(key.encode(), {})
+        return sorted(members, key=members.get)
+
+    def _xlen(self, key):
+        return len(self.streams.get(key.encode(), []))
+
+    def xlen(self, key):
+        self.round_trips += 1
+        return self._xlen(key)
+
+    def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip("*").encode()
+        return iter([key for key in [*self.streams, *self.sorted_sets] if key.startswith(prefix)])
+
+    def delete(self, *keys):
+        for key in keys:
+            self.streams.pop(key.encode(), None)
+            self.sorted_sets.pop(key.encode(), None)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.client, f"_{name}"), args, kwargs))
+
+        return queue
+
+    def execute(self):
+        self.client.round_trips += 1
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+def make_event(index, autoencoder_model="ae", tiled_url="http://tiled/api/v1/raw/run1"):
+    return LatentSpaceEvent(
+        tiled_url=tiled_url,
+        feature_vector=[index, -index],
+        index=index,
+        autoencoder_model=autoencoder_model,
+        dimred_model="dr",
+    )
+
+
+@pytest.fixture
+def session_log():
+    with patch("src.arroyo_reduction.session_log.redis.Redis", return_value=FakeStreams()):
+        yield LiveSessionLog(batch_size=100, flush_interval_ms=10)
+
+
+class TestLiveSessionLog:
+
+    def test_events_written_in_pipelined_batches(self, session_log):
+        async def run():
+            for index in range(250):
+                await session_log.publish(make_event(index))
+            # The last 50 are written after the flush interval
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+        session_log.join()
+
+        client = session_log.redis_client
+        # The first batch also registers the run
+        assert client.round_trips == 4
+        assert session_log.session_length("ae", "dr") == 250
+
+    def test_read_session_by_index_range(self, session_log):
+        session_log.write([make_event(index) for index in range(30)])
+        session_log.write([make_event(index, autoencoder_model="other") for index in range(5)])
+
+        points = session_log.read_session("ae", "dr", start_index=10, end_index=25, page_size=7)
+
+        np.testing.assert_array_equal(points["index"], range(10, 25))
+        np.testing.assert_array_equal(points["feature_vector"][:, 1], -np.arange(10, 25))
+        assert points["feature_vector"].dtype == np.float32
+        assert set(points["tiled_url"]) == {"http://tiled/api/v1/raw/run1"}
+        assert sorted(session_log.list_sessions()) == [("ae", "dr"), ("other", "dr")]
+
+    def test_read_session_only_reads_the_requested_page(self, session_log):
+        """An index range is an XRANGE of that range, not a scan of the session"""
+        session_log.write([make_event(index) for index in range(1000)])
+        session_log.write([make_event(index, tiled_url="http://tiled/api/v1/raw/run2") for index in range(1000)])
+        client = session_log.redis_client
+        client.entries_read = 0
+
+        points = session_log.read_session(
+            "ae", "dr", start_index=500, end_index=510, tiled_url="http://tiled/api/v1/raw/run2"
+        )
+
+        np.testing.assert_array_equal(points["index"], range(500, 510))
+        assert set(points["tiled_url"]) == {"http://tiled/api/v1/raw/run2"}
+        assert client.entries_read == 10
+
+    def test_runs_are_kept_apart(self, session_log):
+        """Index ranges of different runs of a pair do not mix"""
+        session_log.write([make_event(index) for index in range(5)])
+        session_log.write([make_event(index, tiled_url="http://tiled/api/v1/raw/run2") for index in range(3)])
+
+        assert session_log.list_runs("ae", "dr") == ["http://tiled/api/v1/raw/run1", "http://tiled/api/v1/raw/run2"]
+        points = session_log.read_session("ae", "dr", start_index=1, end_index=3)
+        assert points["index"].tolist() == [1, 2, 1, 2]
+        assert session_log.session_length("ae", "dr", "http://tiled/api/v1/raw/run2") == 3
+
+    def test_late_and_repeated_frames_are_kept(self, session_log):
+        """A frame logged after a later one of its run is filed after it and still read back"""
+        session_log.write([make_event(index) for index in [0, 1, 3, 2, 3]])
+        points = session_log.read_session("ae", "dr", start_index=2, end_index=4)
+        assert sorted(points["index"].tolist()) == [2, 3, 3]
+
+    def test_writes_continue_an_existing_stream(self, session_log):
+        """Another process picks up the entry IDs of a stream where the previous one stopped"""
+        session_log.write([make_event(index) for index in range(5)])
+        with patch("src.arroyo_reduction.session_log.redis.Redis", return_value=session_log.redis_client):
+            restarted = LiveSessionLog(batch_size=100, flush_interval_ms=10)
+        assert restarted.write([make_event(4), make_event(5)])
+        assert restarted.session_length("ae", "dr") == 7
+
+    def test_read_pages_through_whole_stream(self, session_log):
+        session_log.write([make_event(index) for index in range(20)])
+        pages = list(session_log.iter_pages("ae", "dr", "http://tiled/api/v1/raw/run1", page_size=8))
+        assert [len(page) for page in pages] == [8, 8, 4]
+
+    def test_delete_session(self, session_log):
+        session_log.write([make_event(index) for index in range(5)])
+        assert session_log.delete_session("ae", "dr")
+        assert session_log.list_sessions() == []
+        assert session_log.write([make_event(0)])
+
+    def test_write_error_does_not_raise(self, session_log):
+        with patch.object(session_log.redis_client, "pipeline", side_effect=ConnectionError("down")):
+            assert session_log.write([make_event(0)]) is False
+        assert session_log.dropped == 1
@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from src.arroyo_reduction.session_log import LiveSessionLog
+from src.test.test_session_log import FakeStreams, make_event
+from src.utils.spatial_index import LatentIndex, LiveSessionIndex, tiled_uri
+
+
+@pytest.fixture
+def coords():
+    return np.random.default_rng(2).uniform(-1, 1, size=(20_000, 2))
+
+
+@pytest.fixture
+def session_log():
+    with patch("src.arroyo_reduction.session_log.redis.Redis", return_value=FakeStreams()):
+        yield LiveSessionLog(batch_size=100, flush_interval_ms=10)
+
+
+class TestLatentIndex:
+
+    def test_box_and_lasso_match_brute_force(self, coords):
+        """Box and lasso selections resolve to every point within them"""
+        index = LatentIndex(coords)
+        x, y = coords[:, 0], coords[:, 1]
+
+        box = index.select({"points": [], "range": {"x": [0.5, -0.2], "y": [0.1, 0.3]}})
+        expected = np.flatnonzero((x >= -0.2) & (x <= 0.5) & (y >= 0.1) & (y <= 0.3))
+        assert np.array_equal(box, expected)
+
+        triangle = {"points": [], "lassoPoints": {"x": [0, 1, 0], "y": [0, 0, 1]}}
+        lasso = index.select(triangle)
+        expected = np.flatnonzero((x > 0) & (y > 0) & (x + y < 1))
+        assert np.array_equal(np.sort(lasso), expected)
+
+    def test_click_snaps_to_nearest_point(self, coords):
+        """A click resolves to the nearest point, not to its position in a trace"""
+        index = LatentIndex(coords)
+        click = {"points": [{"x": coords[123, 0] + 1e-9, "y": coords[123, 1], "pointIndex": 0}]}
+        assert index.select(None, click).tolist() == [123]
+        assert index.select(None, None) is None
+
+    def test_similar_frames(self, coords):
+        """The frames most similar to a point are its nearest neighbours, without itself"""
+        index = LatentIndex(coords)
+        similar = index.similar(7, k=5)
+        distances = np.linalg.norm(coords - coords[7], axis=1)
+        assert 7 not in similar
+        assert np.array_equal(similar, np.argsort(distances)[1:6])
+
+
+class TestLiveSessionIndex:
+
+    def test_refresh_reads_new_entries_only(self, session_log):
+        """Every refresh reads the entries logged since the previous one"""
+        session_log.write([make_event(i) for i in range(5)])
+        live = LiveSessionIndex(session_log.redis_client, "ae", "dr")
+        assert len(live.refresh()) == 5
+
+        session_log.write([make_event(i, tiled_url="http://tiled/api/v1/raw/run2") for i in range(3)])
+        session_log.redis_client.entries_read = 0
+        assert len(live.refresh()) == 8
+        assert session_log.redis_client.entries_read == 3
+
+    def test_data_indices_follow_the_live_datasets(self, session_log):
+        """Points map to data project indices through their run's offset, unknown runs are dropped"""
+        session_log.write([make_event(i, tiled_url="http://tiled/api/v1/raw/run0") for i in range(2)])
+        session_log.write([make_event(i) for i in range(4)])
+        session_log.write([make_event(i, tiled_url="http://tiled/api/v1/raw/run2") for i in range(3)])
+        live = LiveSessionIndex(session_log.redis_client, "ae", "dr")
+        index = live.refresh()
+
+        datasets = [
+            {"uri": "run1", "cumulative_data_count": 4},
+            {"uri": "run2", "cumulative_data_count": 7},
+        ]
+        box = index.select({"points": [], "range": {"x": [-10, 10], "y": [-10, 10]}})
+        assert live.data_indices(box, datasets) == [0, 1, 2, 3, 4, 5, 6]
+        # The frame 1 of run2 is at (1, -1), the frame 1 of run0 and run1 too
+        click = index.select(None, {"points": [{"x": 1, "y": -1}]}, n_candidates=3)
+        assert sorted(live.data_indices(click, datasets)) == [1, 5]
+
+    def test_tiled_uri(self):
+        assert tiled_uri("http://tiled/api/v1/raw/run1") == "run1"
+        assert tiled_uri("http://tiled/api/v1/raw/") == ""
@@ -79,6 +79,12 @@ def redis_mlflow_mocks():
     # Start all the patches
     redis_mock = redis_mock_patch.start()
     mlflow_client_mock = mlflow_client_mock_patch.start()
+
+    # Also patch the names bound in the reducer module, in case another test imported it first
+    reducer_redis_patch = patch('src.arroyo_reduction.reducer.RedisModelStore', redis_mock)
+    reducer_mlflow_patch = patch('src.arroyo_reduction.reducer.MLflowClient', mlflow_client_mock)
+    reducer_redis_patch.start()
+    reducer_mlflow_patch.start()
     
     # Configure the Redis mock
     mock_store = MagicMock()
@@ -118,6 +124,8 @@ def redis_mlflow_mocks():
     yield mocks
     
     # Stop all patches after the test
+    reducer_redis_patch.stop()
+    reducer_mlflow_patch.stop()
     redis_mock_patch.stop()
     mlflow_client_mock_patch.stop()
 
@@ -0,0 +1,110 @@
+import asyncio
+import socket
+import threading
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+import zmq
+from arroyosas.schemas import RawFrameEvent
+
+from src.arroyo_reduction.worker_pool import (
+    ERROR_NOT_READY,
+    ReducerWorkerPool,
+    run_broker,
+    serve_requests,
+)
+
+
+def free_address():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{s.getsockname()[1]}"
+
+
+def make_frame(frame_number):
+    """A small frame whose pixels hold its frame number, sent through the msgpack round trip"""
+    image = np.arange(12, dtype=np.float32).reshape(3, 4) + frame_number
+    return RawFrameEvent(image={"array": image}, frame_number=frame_number, tiled_url="http://tiled/frames")
+
+
+def reduce_frame(message):
+    """Feature vector of a frame, checking its image was decoded with the shape and dtype it was sent with"""
+    image = message.image.array
+    assert image.shape == (3, 4) and image.dtype == np.float32
+    np.testing.assert_array_equal(image, np.arange(12, dtype=np.float32).reshape(3, 4) + message.frame_number)
+    return [message.frame_number, float(image[0, 0])]
+
+
+def mock_reducer(ready=True):
+    reducer = MagicMock()
+    reducer.is_ready.return_value = ready
+    reducer.model_snapshot.return_value = ("ae", MagicMock(), "dr", MagicMock())
+    reducer.take_time_to_first_result.return_value = None
+    # Encode the frame number in the feature vector so the order can be checked
+    reducer.reduce.side_effect = lambda message, models, timings: np.array([reduce_frame(message)])
+    reducer.reduce_batch.side_effect = lambda messages, models, timings: np.array(
+        [reduce_frame(message) for message in messages]
+    )
+    return reducer
+
+
+def start_worker(backend_address, reducer, model_selection=None, ready_timeout=1.0):
+    worker_socket = zmq.Context.instance().socket(zmq.DEALER)
+    worker_socket.connect(backend_address)
+    thread = threading.Thread(
+        target=serve_requests,
+        args=(worker_socket, reducer, model_selection, ready_timeout),
+        daemon=True,
+    )
+    thread.start()
+
+
+@pytest.fixture
+def worker_pool():
+    frontend_address, backend_address = free_address(), free_address()
+    threading.Thread(target=run_broker, args=(frontend_address, backend_address), daemon=True).start()
+    pool = ReducerWorkerPool(
+        num_workers=2,
+        frontend_address=frontend_address,
+        backend_address=backend_address,
+        max_in_flight=3,
+    )
+    yield pool
+    pool.stop()
+
+
+class TestReducerWorkerPool:
+
+    def test_pipelined_requests(self, worker_pool):
+        """Requests are sent before earlier replies arrive and each reply matches its request"""
+        for _ in range(2):
+            start_worker(worker_pool.backend_address, mock_reducer())
+        worker_pool.start(start_broker=False, start_workers=False)
+
+        async def run():
+            futures = [await worker_pool.submit([make_frame(i)]) for i in range(6)]
+            futures.append(await worker_pool.submit([make_frame(6), make_frame(7)]))
+            return [await asyncio.wait_for(future, 5) for future in futures]
+
+        replies = asyncio.run(run())
+
+        frame_numbers = [row[0] for reply in replies for row in reply["feature_vectors"]]
+        assert frame_numbers == list(range(8))
+        # The image of each frame survived the round trip, its first pixel is the frame number
+        assert all(row[0] == row[1] for reply in replies for row in reply["feature_vectors"])
+        assert all(reply["autoencoder_model"] == "ae" for reply in replies)
+        assert worker_pool.in_flight == 0
+
+    def test_worker_not_ready(self, worker_pool):
+        """A worker that never gets the selected models rejects the frames"""
+        model_selection = MagicMock()
+        model_selection.get.return_value = ("other_ae", "dr")
+        start_worker(worker_pool.backend_address, mock_reducer(), model_selection, ready_timeout=0.1)
+        worker_pool.start(start_broker=False, start_workers=False)
+
+        async def run():
+            future = await worker_pool.submit([make_frame(0)])
+            return await asyncio.wait_for(future, 5)
+
+        assert asyncio.run(run()) == {"error": ERROR_NOT_READY}
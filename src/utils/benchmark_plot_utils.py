@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Benchmark for the multi-trace scatter figures of plot_utils.
+
+Compares the legacy construction (unique labels with a list `in` check, one
+full-length list of None per label filled point by point) with the NumPy one
+(np.unique and NaN masks) on random clustered latent vectors. Reports the time
+to build the figure, the time to serialize it as Dash does, and the payload size.
+
+Usage:
+    python -m src.utils.benchmark_plot_utils --points 1000000 --clusters 50
+"""
+
+import argparse
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from src.utils.plot_utils import generate_scatter3d_plot, generate_scattergl_plot
+
+
+def legacy_scattergl_plot(x_coords, y_coords, labels, label_to_string_map):
+    """generate_scattergl_plot as it was before vectorization"""
+    custom_indices = list(range(len(x_coords)))
+    unique_labels = []
+    for lbl in labels:
+        if lbl not in unique_labels:
+            unique_labels.append(lbl)
+
+    traces = []
+    for label in unique_labels:
+        trace_x = [None] * len(x_coords)
+        trace_y = [None] * len(y_coords)
+        trace_custom = [None] * len(x_coords)
+        for i, lbl in enumerate(labels):
+            if lbl == label:
+                trace_x[i] = x_coords[i]
+                trace_y[i] = y_coords[i]
+                trace_custom[i] = custom_indices[i]
+        trace_custom = np.array(trace_custom).reshape(-1, 1)
+        traces.append(
+            go.Scattergl(
+                x=trace_x,
+                y=trace_y,
+                mode="markers",
+                name=str(label_to_string_map[label]),
+                customdata=trace_custom,
+            )
+        )
+    fig = go.Figure(data=traces)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def make_clusters(n_points, n_clusters, n_components, seed=0):
+    """Gaussian blobs around random centers, as a dimension reduction would give"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-10, 10, size=(n_clusters, n_components))
+    labels = rng.integers(0, n_clusters, size=n_points)
+    latent_vectors = centers[labels] + rng.normal(0, 0.5, size=(n_points, n_components))
+    return latent_vectors, labels
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def report(name, build_fn, args):
+    fig, build_s = timed(build_fn, *args)
+    payload, encode_s = timed(to_json_plotly, fig)
+    print(
+        f"{name:>12} {build_s:>10.2f} {encode_s:>10.2f} {len(payload) / 1e6:>12.1f}"
+    )
+    return fig
+
+
+def check_row_order(fig, latent_vectors, labels):
+    """The i-th point of every trace is the i-th row, NaN unless it has the trace's label"""
+    for trace, label in zip(fig.data, dict.fromkeys(labels.tolist())):
+        rows = np.flatnonzero(labels == label)
+        assert np.array_equal(trace.x[rows], latent_vectors[rows, 0])
+        assert np.isnan(trace.x[labels != label]).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="legacy takes about half an hour at 1M points"
+    )
+    args = parser.parse_args()
+
+    latent_vectors, labels = make_clusters(args.points, args.clusters, 3)
+    names = {label: label for label in range(args.clusters)}
+
+    print("----------------------------------------------")
+    print(f"Points: {args.points}, clusters: {args.clusters}")
+    print(f"{'':>12} {'build s':>10} {'encode s':>10} {'payload MB':>12}")
+    if not args.skip_legacy:
+        report(
+            "legacy 2D",
+            legacy_scattergl_plot,
+            (latent_vectors[:, 0], latent_vectors[:, 1], labels.tolist(), names),
+        )
+    # Each figure is released before the next one, they take GBs at 1M points
+    fig = report(
+        "numpy 2D",
+        generate_scattergl_plot,
+        (latent_vectors[:, 0], latent_vectors[:, 1], labels, names),
+    )
+    check_row_order(fig, latent_vectors, labels)
+    del fig
+    fig = report(
+        "numpy 3D",
+        generate_scatter3d_plot,
+        (latent_vectors[:, 0], latent_vectors[:, 1], latent_vectors[:, 2], labels, names),
+    )
+    check_row_order(fig, latent_vectors, labels)
+    del fig
+    print("----------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
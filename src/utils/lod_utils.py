@@ -0,0 +1,156 @@
+import os
+
+import numpy as np
+
+# Above this number of points a 2D latent space is drawn as a density raster
+# of the visible region plus a subsample of its points
+LOD_POINT_THRESHOLD = int(os.getenv("LOD_POINT_THRESHOLD", 200_000))
+LOD_BINS = int(os.getenv("LOD_BINS", 256))
+LOD_MAX_POINTS = int(os.getenv("LOD_MAX_POINTS", 20_000))
+
+
+def use_lod(n_points, n_components):
+    """
+    Whether a latent space is drawn at a reduced level of detail. Scatter3d has
+    no density raster nor lasso selection, so 3D spaces are always drawn in full.
+    """
+    return n_components == 2 and n_points > LOD_POINT_THRESHOLD
+
+
+def data_ranges(latent_vectors):
+    """
+    Ranges of the first two latent dimensions, padded by 2% like Plotly's autorange
+    Args:
+        latent_vectors:     numpy.ndarray, Nx2
+    Returns:
+        x_range, y_range:   [min, max] of each axis
+    """
+    ranges = []
+    for axis in range(2):
+        values = latent_vectors[:, axis]
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            ranges.append([0.0, 1.0])
+            continue
+        low, high = float(finite.min()), float(finite.max())
+        pad = 0.02 * (high - low) if high > low else 0.5
+        ranges.append([low - pad, high + pad])
+    return ranges[0], ranges[1]
+
+
+def viewport_from_relayout(relayout_data):
+    """
+    The viewport set by a zoom, pan or autorange in the scatter's relayoutData
+    Args:
+        relayout_data:      relayoutData of the scatter figure
+    Returns:
+        (x_range, y_range) with None for an autoranged axis, or None when the
+        relayout did not change the viewport, e.g. a change of dragmode
+    """
+    if not relayout_data:
+        return None
+    changed = False
+    ranges = []
+    for axis in ["xaxis", "yaxis"]:
+        axis_range = relayout_data.get(f"{axis}.range")
+        if axis_range is None and f"{axis}.range[0]" in relayout_data:
+            axis_range = [
+                relayout_data[f"{axis}.range[0]"],
+                relayout_data[f"{axis}.range[1]"],
+            ]
+        if axis_range is not None:
+            changed = True
+            ranges.append(sorted(float(v) for v in axis_range))
+        else:
+            changed = changed or relayout_data.get(f"{axis}.autorange", False)
+            ranges.append(None)
+    return tuple(ranges) if changed else None
+
+
+def density_raster(latent_vectors, x_range, y_range, n_bins=LOD_BINS):
+    """
+    2D histogram of the points within the viewport
+    Args:
+        latent_vectors:     numpy.ndarray, Nx2
+        x_range, y_range:   viewport
+        n_bins:             number of bins along each axis
+    Returns:
+        counts:             numpy.ndarray, n_bins x n_bins, indexed [y, x] like a heatmap's z
+    """
+    counts, _, _ = np.histogram2d(
+        latent_vectors[:, 1],
+        latent_vectors[:, 0],
+        bins=n_bins,
+        range=[y_range, x_range],
+    )
+    return counts
+
+
+def subsample_indices(
+    latent_vectors, x_range, y_range, max_points=LOD_MAX_POINTS, n_bins=LOD_BINS
+):
+    """
+    Representative subsample of the points within the viewport. Every occupied
+    bin of a coarse grid keeps the same number of points, so sparse regions and
+    outliers stay visible next to the dense clusters.
+    Args:
+        latent_vectors:     numpy.ndarray, Nx2
+        x_range, y_range:   viewport
+        max_points:         maximum number of points returned
+        n_bins:             number of bins of the raster, the grid is 4 times coarser
+    Returns:
+        indices:            sorted numpy.ndarray of row indices into latent_vectors
+    """
+    x, y = latent_vectors[:, 0], latent_vectors[:, 1]
+    visible = np.flatnonzero(
+        (x >= x_range[0]) & (x <= x_range[1]) & (y >= y_range[0]) & (y <= y_range[1])
+    )
+    if visible.size <= max_points:
+        return visible
+
+    # Same seed for the same viewport, so a redraw does not make points jump around
+    rng = np.random.default_rng(0)
+    visible = visible[rng.permutation(visible.size)]
+
+    grid = max(1, n_bins // 4)
+    x_span = (x_range[1] - x_range[0]) or 1.0
+    y_span = (y_range[1] - y_range[0]) or 1.0
+    cell_x = np.clip(((x[visible] - x_range[0]) / x_span * grid).astype(int), 0, grid - 1)
+    cell_y = np.clip(((y[visible] - y_range[0]) / y_span * grid).astype(int), 0, grid - 1)
+    cells = cell_y * grid + cell_x
+
+    # Rank of each point within its cell, in the shuffled order
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    ranks = np.arange(order.size) - np.repeat(starts, np.diff(np.r_[starts, order.size]))
+
+    quota = max(1, max_points // starts.size)
+    kept = order[ranks < quota]
+    if kept.size > max_points:
+        kept = kept[:max_points]
+    return np.sort(visible[kept])
+
+
+def points_in_polygon(points, polygon_x, polygon_y):
+    """
+    Even-odd rule point in polygon test, looping over the edges rather than the points
+    Args:
+        points:                 numpy.ndarray, Nx2
+        polygon_x, polygon_y:   vertices of the polygon
+    Returns:
+        inside:                 numpy.ndarray of bool, N
+    """
+    polygon_x = np.asarray(polygon_x, dtype=float)
+    polygon_y = np.asarray(polygon_y, dtype=float)
+    x, y = points[:, 0], points[:, 1]
+    inside = np.zeros(points.shape[0], dtype=bool)
+    for i in range(polygon_x.size):
+        x0, y0 = polygon_x[i - 1], polygon_y[i - 1]
+        x1, y1 = polygon_x[i], polygon_y[i]
+        if y0 == y1:
+            continue
+        crosses = (y0 > y) != (y1 > y)
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (x < x_cross)
+    return inside
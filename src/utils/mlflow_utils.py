@@ -1,11 +1,24 @@
+import contextlib
+import json
 import logging
 import os
 import shutil
 import hashlib
+import sys
 import tempfile  
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows, the cache is then only safe within one process
+    fcntl = None
 
 import mlflow
 from mlex_utils.prefect_utils.core import get_flow_run_name
+from mlflow.entities import ViewType
 from mlflow.tracking import MlflowClient
 
 from src.utils.prefect import get_flow_run_parent_id
@@ -15,22 +28,534 @@ MLFLOW_TRACKING_USERNAME = os.getenv("MLFLOW_TRACKING_USERNAME", "")
 MLFLOW_TRACKING_PASSWORD = os.getenv("MLFLOW_TRACKING_PASSWORD", "")
 # Define a cache directory that will be mounted as a volume
 MLFLOW_CACHE_DIR = os.getenv("MLFLOW_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mlflow_cache"))
+# Budget of the in-memory model cache, models are evicted least recently used first
+MLFLOW_MODEL_CACHE_MAX_BYTES = int(os.getenv("MLFLOW_MODEL_CACHE_MAX_BYTES", 4 * 2**30))
+# Size cap of the disk cache, shared by every process using MLFLOW_CACHE_DIR
+MLFLOW_DISK_CACHE_MAX_BYTES = int(os.getenv("MLFLOW_DISK_CACHE_MAX_BYTES", 20 * 2**30))
+# How long the list of registered model versions is reused before asking MLflow again
+MLFLOW_REGISTRY_CACHE_TTL = float(os.getenv("MLFLOW_REGISTRY_CACHE_TTL", 30))
+# Run ids per search_runs call, and threads for run and label lookups
+SEARCH_RUNS_CHUNK = 100
+REGISTRY_WORKERS = 8
 
 logger = logging.getLogger(__name__)
 
 
+def _directory_size(path):
+    """Total size of the files under path, 0 if it does not exist"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _tensor_bytes(obj):
+    """Bytes of the parameters and buffers of a torch module, or of a numpy array, else None"""
+    if callable(getattr(obj, "parameters", None)) and callable(getattr(obj, "buffers", None)):
+        try:
+            tensors = list(obj.parameters()) + list(obj.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        except Exception:
+            return None
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return None
+
+
+def estimate_model_bytes(model, model_path=None):
+    """
+    Estimate the resident memory of a loaded model.
+
+    Looks for torch modules and arrays on the pyfunc wrapper and the python
+    model it wraps, then falls back to the size of the model artifacts on
+    disk, which is close for pickled models such as UMAP or PCA.
+    """
+    candidates = [model]
+    impl = getattr(model, "_model_impl", None)
+    if impl is not None:
+        candidates.append(impl)
+        python_model = getattr(impl, "python_model", None)
+        if python_model is not None:
+            candidates.append(python_model)
+
+    total = 0
+    seen = set()
+    for candidate in candidates:
+        members = [candidate] + list(getattr(candidate, "__dict__", {}).values())
+        for member in members:
+            if id(member) in seen:
+                continue
+            seen.add(id(member))
+            size = _tensor_bytes(member)
+            if size:
+                total += size
+    if total:
+        return total
+
+    if model_path and os.path.isdir(model_path):
+        size = _directory_size(model_path)
+        if size:
+            return size
+    return sys.getsizeof(model)
+
+
+class ModelMemoryCache:
+    """
+    Thread-safe LRU cache of loaded models keyed by (model name, version),
+    bounded by an estimate of their resident memory. Adding a model evicts
+    the least recently used ones until the total fits in max_bytes. A model
+    larger than the whole budget is still returned to the caller, just not
+    kept.
+    """
+
+    def __init__(self, max_bytes=MLFLOW_MODEL_CACHE_MAX_BYTES):
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries = OrderedDict()  # (name, version) -> (model, size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """The cached model for key, marked as most recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def latest_version(self, name):
+        """Newest cached version of a model, or None"""
+        with self._lock:
+            versions = [key[1] for key in self._entries if key[0] == name]
+        return max(versions, default=None)
+
+    def put(self, key, model, size=None):
+        """Cache a model, evicting least recently used ones to stay within max_bytes"""
+        size = estimate_model_bytes(model) if size is None else int(size)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                logger.warning(
+                    f"Model {key[0]} v{key[1]} needs ~{size / 2**20:.1f} MiB, more than the whole "
+                    f"cache budget of {self.max_bytes / 2**20:.1f} MiB, not caching it"
+                )
+                return False
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                self._evict_oldest()
+            self._entries[key] = (model, size)
+            self.current_bytes += size
+            return True
+
+    def _evict_oldest(self):
+        (name, version), (_, size) = self._entries.popitem(last=False)
+        self.current_bytes -= size
+        self.evictions += 1
+        logger.info(f"Evicted model {name} v{version} (~{size / 2**20:.1f} MiB) from the memory cache")
+
+    def evict(self, name, version=None):
+        """Drop every cached version of a model, or only one, returns how many were dropped"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == name and (version is None or key[1] == version)]
+            for key in keys:
+                self.current_bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Hit, miss and eviction counts with the current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _same_file(lock_file, path):
+    try:
+        return os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+@contextlib.contextmanager
+def _file_lock(path, shared=False, blocking=True):
+    """
+    Advisory lock on path, held across processes and threads, exclusive unless
+    shared. Yields whether the lock was taken, which is only False when not
+    blocking and the lock is held elsewhere. The holder of an exclusive lock
+    may remove the lock file, a lock taken on a removed file is taken again.
+    """
+    while True:
+        with open(path, "a") as lock_file:
+            if fcntl is None:
+                yield True
+                return
+            operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(lock_file, operation if blocking else operation | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                if _same_file(lock_file, path):
+                    yield True
+                    return
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _directory_checksum(path):
+    """sha256 over the relative paths and contents of the files under path"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelDiskCache:
+    """
+    Directory of downloaded model artifacts that several processes (gunicorn
+    workers, operator replicas) can share.
+
+    Models are downloaded into a temporary directory and renamed into place
+    once complete, so a crash mid-download never leaves a half written entry.
+    manifest.json records the size, checksum and last use of every entry;
+    a directory without a manifest entry, or whose checksum does not match,
+    is removed rather than trusted. When the total size exceeds max_bytes the
+    least recently used entries are removed.
+
+    The manifest is guarded by cache_dir/.lock, only held to read-modify-write
+    it. Each entry has its own lock file: downloads and checksum checks hold
+    it exclusively, so two processes never download the same model at once
+    and hashing a large model only holds up that model. Loads hold it shared
+    through use(), and eviction skips any entry whose lock is held.
+    """
+
+    MANIFEST = "manifest.json"
+    TEMP_PREFIX = ".tmp-"
+    # Temporary directories older than this are left over from a crash
+    STALE_TEMP_SECONDS = 24 * 3600
+    # last_used is only rewritten once it is older than this, a hit does not rewrite the manifest
+    LAST_USED_RESOLUTION = 60
+
+    # Entries whose checksum was verified by this process
+    _verified = set()
+
+    def __init__(self, cache_dir, max_bytes=MLFLOW_DISK_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, int(max_bytes))
+        # Size of prefetched entries that did not fit, so they are not downloaded again to find out
+        self._unfit = {}
+
+    @staticmethod
+    def entry_name(model_name, version):
+        return f"{model_name}_v{version}"
+
+    def _entry_path(self, entry):
+        return os.path.join(self.cache_dir, entry)
+
+    def _manifest_lock(self):
+        return _file_lock(os.path.join(self.cache_dir, ".lock"))
+
+    def _entry_lock_path(self, entry):
+        return os.path.join(self.cache_dir, f".{entry}.lock")
+
+    def _entry_lock(self, entry, shared=False, blocking=True):
+        return _file_lock(self._entry_lock_path(entry), shared, blocking)
+
+    def _remove_entry_lock(self, entry):
+        """Remove the lock file of an entry that is gone, its exclusive lock held"""
+        try:
+            os.remove(self._entry_lock_path(entry))
+        except OSError:
+            pass
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.cache_dir, self.MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Unreadable disk cache manifest, starting a new one: {e}")
+            return {}
+
+    def _write_manifest(self, manifest):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=self.TEMP_PREFIX, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.cache_dir, self.MANIFEST))
+
+    def _remove(self, path):
+        """Rename a directory out of the way before deleting it, so it is never seen half deleted"""
+        if not os.path.exists(path):
+            return
+        trash = tempfile.mkdtemp(dir=self.cache_dir, prefix=self.TEMP_PREFIX)
+        os.replace(path, os.path.join(trash, "entry"))
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def get(self, model_name, version):
+        """
+        Local path of a cached model, or None if it is not cached or fails its
+        checksum. Nothing keeps the entry in place once this returns, use()
+        to load it.
+        """
+        with self.use(model_name, version) as path:
+            return path
+
+    @contextlib.contextmanager
+    def use(self, model_name, version):
+        """
+        Local path of a cached model, or None, holding a shared lock of the
+        entry for the with block so it is not evicted or replaced meanwhile
+        """
+        entry = self.entry_name(model_name, version)
+        if self._lookup(entry) is None:
+            with self._entry_lock(entry):
+                self._validate(entry)
+        with self._entry_lock(entry, shared=True):
+            yield self._lookup(entry, touch=True)
+
+    def _lookup(self, entry, touch=False):
+        """
+        Path of an entry this process has verified, else None. The manifest is
+        replaced atomically, so reading it needs no lock.
+        """
+        record = self._read_manifest().get(entry)
+        path = self._entry_path(entry)
+        if record is None or (entry, record["checksum"]) not in self._verified or not os.path.isdir(path):
+            return None
+        if touch and time.time() - record["last_used"] > self.LAST_USED_RESOLUTION:
+            with self._manifest_lock():
+                manifest = self._read_manifest()
+                if entry in manifest:
+                    manifest[entry]["last_used"] = time.time()
+                    self._write_manifest(manifest)
+        return os.path.join(path, record.get("path", ""))
+
+    def _validate(self, entry):
+        """Check an entry against the manifest and its checksum, removing it if it fails, entry lock held"""
+        path = self._entry_path(entry)
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            record = manifest.get(entry)
+            if record is None or not os.path.isdir(path):
+                if os.path.exists(path):
+                    logger.warning(f"Removing unmanaged cache directory {path}")
+                    self._remove(path)
+                if record is not None:
+                    manifest.pop(entry)
+                    self._write_manifest(manifest)
+                return None
+        if (entry, record["checksum"]) in self._verified:
+            return record
+
+        # Hashed without the manifest lock, the entry lock keeps the directory in place
+        if _directory_checksum(path) == record["checksum"]:
+            self._verified.add((entry, record["checksum"]))
+            return record
+        logger.warning(f"Checksum mismatch for cached model {entry}, removing it")
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            self._remove(path)
+            manifest.pop(entry, None)
+            self._write_manifest(manifest)
+        return None
+
+    def contains(self, model_name, version):
+        """Whether a model is cached, without marking it as used nor verifying its checksum"""
+        entry = self.entry_name(model_name, version)
+        return entry in self._read_manifest() and os.path.isdir(self._entry_path(entry))
+
+    def latest_version(self, model_name):
+        """Newest version of a model in the manifest, or None"""
+        versions = [int(record["version"]) for record in self._read_manifest().values() if record["model"] == model_name]
+        return max(versions, default=None)
+
+    def fetch(self, model_name, version, download, prefetch=False):
+        """
+        Local path of a model, calling download(dst_path) to fetch it if it is
+        not cached. download returns the path of the model under dst_path.
+        Errors of download are raised.
+
+        A prefetch never evicts: the model is only kept if it fits in
+        max_bytes next to the cached entries, else None is returned. It is
+        recorded as used before any real load, so it is the first to go.
+        """
+        entry = self.entry_name(model_name, version)
+        with self._entry_lock(entry):
+            # Another process may have downloaded it while we waited for the lock
+            record = self._validate(entry)
+            if record is not None:
+                return os.path.join(self._entry_path(entry), record.get("path", ""))
+            if prefetch and not self._fits(self._read_manifest(), self._unfit.get(entry, 0)):
+                return None
+
+            self.cleanup_temp()
+            tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=self.TEMP_PREFIX)
+            try:
+                download_path = download(tmp_dir)
+                relative_path = os.path.relpath(download_path, tmp_dir)
+                record = {
+                    "model": model_name,
+                    "version": str(version),
+                    "path": "" if relative_path == "." else relative_path,
+                    "bytes": _directory_size(tmp_dir),
+                    "checksum": _directory_checksum(tmp_dir),
+                    "last_used": time.time(),
+                }
+                with self._manifest_lock():
+                    manifest = self._read_manifest()
+                    if prefetch:
+                        if not self._fits(manifest, record["bytes"]):
+                            self._unfit[entry] = record["bytes"]
+                            logger.info(f"Not prefetching model {entry}, it does not fit in the disk cache")
+                            return None
+                        record["last_used"] = 0.0
+                    path = self._entry_path(entry)
+                    self._remove(path)
+                    os.replace(tmp_dir, path)
+                    manifest[entry] = record
+                    self._verified.add((entry, record["checksum"]))
+                    self._evict_to_fit(manifest, keep=entry)
+                    self._write_manifest(manifest)
+            finally:
+                if os.path.exists(tmp_dir):
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.info(f"Cached model {entry} ({record['bytes'] / 2**20:.1f} MiB) at {path}")
+            return os.path.join(path, record["path"])
+
+    def _fits(self, manifest, size):
+        """Whether size more bytes fit in max_bytes next to the entries of the manifest"""
+        return sum(record["bytes"] for record in manifest.values()) + size <= self.max_bytes
+
+    def _remove_unused(self, manifest, entry):
+        """Remove an entry unless its lock is held, e.g. while it is loaded, manifest lock held"""
+        with self._entry_lock(entry, blocking=False) as locked:
+            if not locked:
+                logger.info(f"Not removing cached model {entry}, it is in use")
+                return False
+            manifest.pop(entry)
+            self._remove(self._entry_path(entry))
+            self._remove_entry_lock(entry)
+            return True
+
+    def _evict_to_fit(self, manifest, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes, manifest lock held"""
+        total = sum(record["bytes"] for record in manifest.values())
+        for entry in sorted(manifest, key=lambda name: manifest[name]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            size = manifest[entry]["bytes"]
+            if self._remove_unused(manifest, entry):
+                total -= size
+                logger.info(f"Evicted model {entry} from the disk cache")
+
+    def evict(self, model_name=None, version=None):
+        """Remove the cached versions of a model, one version of it, or everything if model_name is None"""
+        removed = 0
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            for entry, record in list(manifest.items()):
+                if model_name is not None and record["model"] != model_name:
+                    continue
+                if version is not None and record["version"] != str(version):
+                    continue
+                removed += self._remove_unused(manifest, entry)
+            if model_name is None:
+                # Also anything not in the manifest, such as caches from before it existed
+                for name in os.listdir(self.cache_dir):
+                    path = self._entry_path(name)
+                    if os.path.isdir(path) and not name.startswith(self.TEMP_PREFIX) and name not in manifest:
+                        self._remove(path)
+            self._write_manifest(manifest)
+        return removed
+
+    def cleanup_temp(self):
+        """Remove temporary directories left over by a crashed download, and lock files of entries that are gone"""
+        manifest = self._read_manifest()
+        for name in os.listdir(self.cache_dir):
+            entry = name[1:-len(".lock")]
+            if not (name.startswith(".") and name.endswith(".lock")) or not entry or entry in manifest:
+                continue
+            # Skipped while held, e.g. by a download of that entry
+            with self._entry_lock(entry, blocking=False) as locked:
+                if locked and entry not in self._read_manifest():
+                    self._remove_entry_lock(entry)
+
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = self._entry_path(name)
+            if not name.startswith(self.TEMP_PREFIX) or now - os.path.getmtime(path) < self.STALE_TEMP_SECONDS:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def stats(self):
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+        return {
+            "entries": len(manifest),
+            "bytes": sum(record["bytes"] for record in manifest.values()),
+            "max_bytes": self.max_bytes,
+        }
+
+
 class MLflowClient:
     """A wrapper class for MLflow client operations."""
     
-    # In-memory model cache (for quick access)
-    _model_cache = {}
+    # In-memory LRU model cache shared by every client in the process
+    _model_cache = ModelMemoryCache()
+    
+    # Registry listing (TTL), run tags and dropdown labels shared by every client in the process
+    _registry_lock = threading.Lock()
+    _registry_versions = None
+    _registry_fetched_at = 0.0
+    _run_tags_cache = {}
+    _label_cache = {}
     
     def __init__(
         self, 
         tracking_uri=None,
         username=None, 
         password=None,
-        cache_dir=None
+        cache_dir=None,
+        disk_cache_max_bytes=None
     ):
         """
         Initialize the MLflow client with connection parameters.
@@ -40,6 +565,7 @@ class MLflowClient:
             username: MLflow authentication username
             password: MLflow authentication password
             cache_dir: Directory to store cached models
+            disk_cache_max_bytes: Size cap of the disk cache, MLFLOW_DISK_CACHE_MAX_BYTES by default
         """
         self.tracking_uri = tracking_uri or os.getenv("MLFLOW_TRACKING_URI")
         self.username = username or os.getenv("MLFLOW_TRACKING_USERNAME", "")
@@ -48,6 +574,10 @@ class MLflowClient:
         
         # Create cache directory if it doesn't exist
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.disk_cache = ModelDiskCache(
+            self.cache_dir,
+            MLFLOW_DISK_CACHE_MAX_BYTES if disk_cache_max_bytes is None else disk_cache_max_bytes,
+        )
         
         # Set environment variables
         os.environ['MLFLOW_TRACKING_USERNAME'] = self.username
@@ -87,10 +617,106 @@ class MLflowClient:
         params = run_info.data.params
         return params
 
+    @classmethod
+    def invalidate_registry_cache(cls):
+        """Forget the cached model version listing, e.g. when the user asks for a refresh"""
+        with cls._registry_lock:
+            cls._registry_versions = None
+            cls._registry_fetched_at = 0.0
+
+    def _list_model_versions(self):
+        """Every registered model version, cached for MLFLOW_REGISTRY_CACHE_TTL seconds"""
+        with self._registry_lock:
+            if (
+                self._registry_versions is not None
+                and time.monotonic() - self._registry_fetched_at < MLFLOW_REGISTRY_CACHE_TTL
+            ):
+                return self._registry_versions
+        versions = list(self.client.search_model_versions())
+        with self._registry_lock:
+            MLflowClient._registry_versions = versions
+            MLflowClient._registry_fetched_at = time.monotonic()
+        return versions
+
+    def _get_run_tags(self, run_ids):
+        """
+        Tags of the given runs, by run id. The tags of a run never change once
+        its model is registered, so they are cached for the process lifetime and
+        only unseen runs are fetched, with one search_runs call per chunk.
+        """
+        with self._registry_lock:
+            missing = [run_id for run_id in set(run_ids) if run_id not in self._run_tags_cache]
+
+        fetched = {}
+        if missing:
+            try:
+                experiment_ids = [
+                    experiment.experiment_id
+                    for experiment in self.client.search_experiments(view_type=ViewType.ALL)
+                ]
+                for start in range(0, len(missing), SEARCH_RUNS_CHUNK):
+                    chunk = missing[start:start + SEARCH_RUNS_CHUNK]
+                    quoted = ", ".join(f"'{run_id}'" for run_id in chunk)
+                    runs = self.client.search_runs(
+                        experiment_ids,
+                        filter_string=f"attributes.run_id IN ({quoted})",
+                        run_view_type=ViewType.ALL,
+                        max_results=len(chunk),
+                    )
+                    for run in runs:
+                        fetched[run.info.run_id] = dict(run.data.tags)
+            except Exception as e:
+                logger.warning(f"Batched run search failed, fetching runs one by one: {e}")
+
+            # Runs the search did not return, e.g. from an experiment we could not list
+            remaining = [run_id for run_id in missing if run_id not in fetched]
+            if remaining:
+                with ThreadPoolExecutor(max_workers=REGISTRY_WORKERS) as executor:
+                    for run_id, tags in zip(remaining, executor.map(self._fetch_run_tags, remaining)):
+                        if tags is not None:
+                            fetched[run_id] = tags
+
+        with self._registry_lock:
+            self._run_tags_cache.update(fetched)
+            return {run_id: self._run_tags_cache[run_id] for run_id in run_ids if run_id in self._run_tags_cache}
+
+    def _fetch_run_tags(self, run_id):
+        try:
+            return dict(self.client.get_run(run_id).data.tags)
+        except Exception as e:
+            logger.warning(f"Error fetching run {run_id}: {e}")
+            return None
+
+    @staticmethod
+    def _resolve_label(name):
+        """Name of the flow run that trained a model, None if Prefect cannot tell"""
+        try:
+            parent_id = get_flow_run_parent_id(name)
+            return get_flow_run_name(parent_id)
+        except Exception as e:
+            logger.warning(f"Failed to get label for model '{name}': {e}")
+            return None
+
+    def _get_labels(self, names):
+        """Dropdown labels of offline models, resolved concurrently and cached once found"""
+        with self._registry_lock:
+            missing = [name for name in names if name not in self._label_cache]
+        if missing:
+            with ThreadPoolExecutor(max_workers=REGISTRY_WORKERS) as executor:
+                resolved = dict(zip(missing, executor.map(self._resolve_label, missing)))
+            with self._registry_lock:
+                # Failures are not cached, the next refresh tries again
+                self._label_cache.update({name: label for name, label in resolved.items() if label})
+        with self._registry_lock:
+            return {name: self._label_cache.get(name, name) for name in names}
+
     def get_mlflow_models(self, livemode=False, model_type=None):
         """
         Retrieve available MLflow models and create dropdown options.
 
+        The version listing is cached for a short TTL and the run tags and
+        labels for good, so opening a dialog does not fetch every run again.
+
         Args:
             livemode (bool): If True, only include models where exp_type == "live_mode".
                             If False, exclude models where exp_type == "live_mode" and use custom labels.
@@ -100,53 +726,39 @@ class MLflowClient:
             list: Dropdown options for MLflow models matching the tag filters.
         """
         try:
-            all_versions = self.client.search_model_versions()
+            all_versions = self._list_model_versions()
+            run_tags = self._get_run_tags([v.run_id for v in all_versions])
 
             model_map = {}  # model name -> latest version info
 
             for v in all_versions:
-                try:
-                    current = model_map.get(v.name)
-                    if current and int(v.version) <= int(current.version):
-                        continue
-
-                    run = self.client.get_run(v.run_id)
-                    run_tags = run.data.tags
-
-                    # Tag-based filtering
-                    exp_type = run_tags.get("exp_type")
-                    if livemode:
-                        if exp_type != "live_mode":
-                            continue
-                    else:
-                        if exp_type == "live_mode":
-                            continue
-
-                    if model_type is not None and run_tags.get("model_type") != model_type:
-                        continue
-
-                    model_map[v.name] = v
+                current = model_map.get(v.name)
+                if current and int(v.version) <= int(current.version):
+                    continue
 
-                except Exception as e:
-                    logger.warning(f"Error processing model version {v.name} v{v.version}: {e}")
+                tags = run_tags.get(v.run_id)
+                if tags is None:
+                    logger.warning(f"Skipping model version {v.name} v{v.version}, its run could not be read")
                     continue
 
-            # Build dropdown options
-            model_options = []
-            for name in sorted(model_map.keys()):
+                # Tag-based filtering
+                exp_type = tags.get("exp_type")
                 if livemode:
-                    label = name
+                    if exp_type != "live_mode":
+                        continue
                 else:
-                    try:
-                        parent_id = get_flow_run_parent_id(name)
-                        label = get_flow_run_name(parent_id)
-                    except Exception as e:
-                        logger.warning(f"Failed to get label for model '{name}': {e}")
-                        label = name  # fallback
+                    if exp_type == "live_mode":
+                        continue
+
+                if model_type is not None and tags.get("model_type") != model_type:
+                    continue
 
-                model_options.append({"label": label, "value": name})
+                model_map[v.name] = v
 
-            return model_options
+            # Build dropdown options
+            names = sorted(model_map.keys())
+            labels = {name: name for name in names} if livemode else self._get_labels(names)
+            return [{"label": labels[name], "value": name} for name in names]
 
         except Exception as e:
             logger.warning(f"Error retrieving MLflow models: {e}")
@@ -161,8 +773,33 @@ class MLflowClient:
             hash_str = hash_obj.hexdigest()
             return os.path.join(self.cache_dir, f"{model_name}_{hash_str}")
         else:
-            # Include version in the filename
-            return os.path.join(self.cache_dir, f"{model_name}_v{version}")
+            # Include version in the filename, as the disk cache names its entries
+            return os.path.join(self.cache_dir, ModelDiskCache.entry_name(model_name, version))
+
+    def _latest_version(self, model_name):
+        """
+        Latest registered version of a model, None if it has none. When the
+        registry cannot be reached, the newest version cached in memory or on
+        disk is used instead, so a model already loaded keeps being served.
+        """
+        try:
+            versions = self.client.search_model_versions(f"name='{model_name}'")
+        except Exception as e:
+            cached = [self._model_cache.latest_version(model_name)]
+            try:
+                cached.append(self.disk_cache.latest_version(model_name))
+            except Exception as disk_error:
+                logger.warning(f"Could not read the disk cache manifest: {disk_error}")
+            cached = [version for version in cached if version is not None]
+            if not cached:
+                raise
+            logger.warning(
+                f"MLflow registry unreachable ({e}), using cached model {model_name} v{max(cached)}"
+            )
+            return max(cached)
+        if not versions:
+            return None
+        return max([int(mv.version) for mv in versions])
 
     def load_model(self, model_name):
         """
@@ -178,62 +815,50 @@ class MLflowClient:
             logger.error("Cannot load model: model_name is None")
             return None
         
-        # Check in-memory cache first
-        if model_name in self._model_cache:
-            logger.info(f"Using in-memory cached model: {model_name}")
-            return self._model_cache[model_name]
-        
         try:
-            # Get latest version using existing client
-            versions = self.client.search_model_versions(f"name='{model_name}'")
+            # Get latest version using existing client, or the newest cached one if MLflow is down
+            latest_version = self._latest_version(model_name)
             
-            if not versions:
+            if latest_version is None:
                 logger.error(f"No versions found for model {model_name}")
                 return None
                 
-            latest_version = max([int(mv.version) for mv in versions])
             model_uri = f"models:/{model_name}/{latest_version}"
             
+            # Check in-memory cache, a newly registered version is a miss
+            cache_key = (model_name, latest_version)
+            model = self._model_cache.get(cache_key)
+            if model is not None:
+                logger.info(f"Using in-memory cached model: {model_name} v{latest_version}")
+                return model
+            
             # Check disk cache
-            cache_path = self._get_cache_path(model_name, latest_version)
-            if os.path.exists(cache_path):
-                logger.info(f"Loading model from disk cache: {cache_path}")
-                try:
-                    # Load from cached MLflow model
-                    model = mlflow.pyfunc.load_model(cache_path)
-                    
-                    # Store in memory cache
-                    self._model_cache[model_name] = model
-                    
+            try:
+                model = self._load_from_disk_cache(model_name, latest_version)
+                if model is not None:
                     logger.info(f"Successfully loaded cached model: {model_name}")
                     return model
-                except Exception as e:
-                    logger.warning(f"Error loading model from cache: {e}")
-                    # Continue to download if cache load fails
-            
-            # Create cache directory if it doesn't exist
-            os.makedirs(os.path.dirname(cache_path) if os.path.dirname(cache_path) else ".", exist_ok=True)
+            except Exception as e:
+                logger.warning(f"Error loading model from cache, downloading it again: {e}")
+                self.disk_cache.evict(model_name, latest_version)
             
-            # Instead of loading and then saving, we'll download directly to the cache location
-            # This is more efficient and avoids the save_model error
+            # Download into a temporary directory of the cache, renamed into place once complete
             logger.info(f"Downloading model {model_name}, version {latest_version} from MLflow to cache")
             
-            # Use mlflow.artifacts.download_artifacts to get the model artifacts
             try:
-                # First method: Download the model directly to the cache location
-                download_path = mlflow.artifacts.download_artifacts(
-                    artifact_uri=f"models:/{model_name}/{latest_version}",
-                    dst_path=cache_path
+                download_path = self.disk_cache.fetch(
+                    model_name,
+                    latest_version,
+                    lambda dst_path: mlflow.artifacts.download_artifacts(artifact_uri=model_uri, dst_path=dst_path),
                 )
                 logger.info(f"Downloaded model artifacts to: {download_path}")
                 
                 # Now load the model from the cached location
-                model = mlflow.pyfunc.load_model(download_path)
+                model = self._load_from_disk_cache(model_name, latest_version)
+                if model is None:
+                    raise RuntimeError(f"{download_path} left the disk cache before it could be loaded")
                 logger.info(f"Successfully loaded model from cache: {model_name}")
                 
-                # Store in memory cache
-                self._model_cache[model_name] = model
-                
                 return model
             except Exception as e:
                 logger.warning(f"Error downloading artifacts: {e}")
@@ -244,25 +869,87 @@ class MLflowClient:
                 logger.info(f"Successfully loaded model: {model_name}")
                 
                 # Store in memory cache
-                self._model_cache[model_name] = model
+                self._model_cache.put(cache_key, model)
                 
                 return model
         except Exception as e:
             logger.error(f"Error loading model {model_name}: {e}")
             return None
     
+    def _load_from_disk_cache(self, model_name, version):
+        """
+        Load a model from the disk cache and keep it in memory, or return None
+        if it is not cached. The entry is held under a shared lock while it
+        loads, so no other process evicts it meanwhile.
+        """
+        with self.disk_cache.use(model_name, version) as cache_path:
+            if cache_path is None:
+                return None
+            logger.info(f"Loading model from disk cache: {cache_path}")
+            model = mlflow.pyfunc.load_model(cache_path)
+            size = estimate_model_bytes(model, cache_path)
+        self._model_cache.put((model_name, version), model, size)
+        return model
+    
+    def prefetch_model(self, model_name):
+        """
+        Download the latest version of a model into the disk cache without
+        loading it, so that selecting it later only has to deserialize it.
+        A prefetch neither marks cached models as used nor evicts any of them.
+        
+        Returns:
+            True if the model is in the disk cache, False otherwise
+        """
+        try:
+            latest_version = self._latest_version(model_name)
+            if latest_version is None:
+                logger.warning(f"No versions found for model {model_name}, nothing to prefetch")
+                return False
+            if self.disk_cache.contains(model_name, latest_version):
+                return True
+            model_uri = f"models:/{model_name}/{latest_version}"
+            path = self.disk_cache.fetch(
+                model_name,
+                latest_version,
+                lambda dst_path: mlflow.artifacts.download_artifacts(artifact_uri=model_uri, dst_path=dst_path),
+                prefetch=True,
+            )
+            return path is not None
+        except Exception as e:
+            logger.warning(f"Error prefetching model {model_name}: {e}")
+            return False
+    
     @classmethod
     def clear_memory_cache(cls):
         """Clear the in-memory model cache"""
         logger.info("Clearing in-memory model cache")
         cls._model_cache.clear()
     
-    def clear_disk_cache(self):
-        """Clear the disk cache"""
-        logger.info(f"Clearing disk cache at {self.cache_dir}")
+    @classmethod
+    def set_memory_cache_budget(cls, max_bytes):
+        """Change the byte budget of the in-memory cache, evicting models if it shrinks"""
+        cache = cls._model_cache
+        with cache._lock:
+            cache.max_bytes = max(0, int(max_bytes))
+            while cache._entries and cache.current_bytes > cache.max_bytes:
+                cache._evict_oldest()
+    
+    @classmethod
+    def memory_cache_stats(cls):
+        """Hit, miss and eviction counts and the size of the in-memory cache"""
+        return cls._model_cache.stats()
+    
+    def clear_disk_cache(self, model_name=None, version=None):
+        """
+        Clear the disk cache, or only the cached versions of one model, or one version of it
+        
+        Returns:
+            Number of cached model versions removed
+        """
+        target = "" if model_name is None else f" for {model_name}" + ("" if version is None else f" v{version}")
+        logger.info(f"Clearing disk cache at {self.cache_dir}{target}")
         try:
-            # Delete and recreate the cache directory
-            shutil.rmtree(self.cache_dir)
-            os.makedirs(self.cache_dir, exist_ok=True)
+            return self.disk_cache.evict(model_name, version)
         except Exception as e:
-            logger.error(f"Error clearing disk cache: {e}")
\ No newline at end of file
+            logger.error(f"Error clearing disk cache: {e}")
+            return 0
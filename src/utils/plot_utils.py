@@ -8,6 +8,8 @@ from dash import html
 from dash_iconify import DashIconify
 from plotly.io import to_image
 
+from .lod_utils import data_ranges, density_raster, subsample_indices
+
 
 def plot_empty_scatter():
     return go.Figure(
@@ -25,6 +27,33 @@ def plot_empty_scatter():
     )
 
 
+def labels_in_order(labels):
+    """
+    Unique labels in order of first appearance, computed with np.unique
+    Args:
+        labels:     label of each point
+    Returns:
+        unique_labels, codes: the labels, and the position of each point's label among them
+    """
+    labels = np.asarray(labels)
+    unique_labels, first, inverse = np.unique(
+        labels, return_index=True, return_inverse=True
+    )
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    return unique_labels[order], rank[inverse]
+
+
+def masked_columns(codes, code, *columns):
+    """
+    Full-length copies of the columns with NaN, a gap for Plotly, wherever the
+    point's label is not the given one
+    """
+    mask = codes == code
+    return [np.where(mask, np.asarray(column, dtype=float), np.nan) for column in columns]
+
+
 def generate_scattergl_plot(
     x_coords,
     y_coords,
@@ -38,37 +67,23 @@ def generate_scattergl_plot(
     preserving the exact i-th ordering across all data.
 
     Each trace is the same length as x_coords/y_coords, but for points
-    not belonging to that trace's label, we insert None. This ensures:
+    not belonging to that trace's label, we insert NaN. This ensures:
       - i-th point in the figure is i-th data row (helpful for selectedData).
       - Each label gets its own legend entry.
+    The columns are passed to Plotly as numpy arrays.
     """
-    import plotly.graph_objects as go
-
     if custom_indices is None:
-        custom_indices = list(range(len(x_coords)))
+        custom_indices = np.arange(len(x_coords))
 
     # Gather unique labels in order of first appearance
-    unique_labels = []
-    for lbl in labels:
-        if lbl not in unique_labels:
-            unique_labels.append(lbl)
+    unique_labels, codes = labels_in_order(labels)
 
     traces = []
-    for label in unique_labels:
-        # Initialize the entire length with None
-        trace_x = [None] * len(x_coords)
-        trace_y = [None] * len(y_coords)
-        trace_custom = [None] * len(x_coords)
-
+    for code, label in enumerate(unique_labels):
         # Fill in data only where labels match
-        for i, lbl in enumerate(labels):
-            if lbl == label:
-                trace_x[i] = x_coords[i]
-                trace_y[i] = y_coords[i]
-                trace_custom[i] = custom_indices[i]
-
-        # Convert custom_indices to a 2D array if needed by Plotly
-        trace_custom = np.array(trace_custom).reshape(-1, 1)
+        trace_x, trace_y, trace_custom = masked_columns(
+            codes, code, x_coords, y_coords, custom_indices
+        )
 
         traces.append(
             go.Scattergl(
@@ -76,7 +91,8 @@ def generate_scattergl_plot(
                 y=trace_y,
                 mode="markers",
                 name=str(label_to_string_map[label]),
-                customdata=trace_custom,
+                # Convert custom_indices to a 2D array if needed by Plotly
+                customdata=trace_custom.reshape(-1, 1),
             )
         )
 
@@ -115,39 +131,25 @@ def generate_scatter3d_plot(
     go.Figure: The generated Scatter3d plot.
     """
     if custom_indices is None:
-        custom_indices = list(range(len(x_coords)))
+        custom_indices = np.arange(len(x_coords))
 
     # Collect unique labels in the order of their first appearance
-    unique_labels = []
-    for lbl in labels:
-        if lbl not in unique_labels:
-            unique_labels.append(lbl)
+    unique_labels, codes = labels_in_order(labels)
 
     traces = []
-    for label in unique_labels:
-        # Prepare arrays with the full length, initially filled with None
-        trace_x = [None] * len(x_coords)
-        trace_y = [None] * len(y_coords)
-        trace_z = [None] * len(z_coords)
-        trace_custom = [None] * len(x_coords)
-
-        # Fill in actual values only for points whose label == current label
-        for i, lbl in enumerate(labels):
-            if lbl == label:
-                trace_x[i] = x_coords[i]
-                trace_y[i] = y_coords[i]
-                trace_z[i] = z_coords[i]
-                trace_custom[i] = custom_indices[i]
-
-        # Convert custom data to a 2D array for Plotly
-        trace_custom = np.array(trace_custom).reshape(-1, 1)
+    for code, label in enumerate(unique_labels):
+        # Actual values only for points whose label == current label, NaN elsewhere
+        trace_x, trace_y, trace_z, trace_custom = masked_columns(
+            codes, code, x_coords, y_coords, z_coords, custom_indices
+        )
 
         traces.append(
             go.Scatter3d(
                 x=trace_x,
                 y=trace_y,
                 z=trace_z,
-                customdata=trace_custom,
+                # Convert custom data to a 2D array for Plotly
+                customdata=trace_custom.reshape(-1, 1),
                 mode="markers",
                 name=str(label_to_string_map[label]),
                 marker=dict(size=3),
@@ -216,7 +218,7 @@ def generate_scatter_data(
             vals_names = {value: key for key, value in label_names.items()}
         vals_names[-1] = "Unlabeled"
     else:
-        vals = [-1 for i in range(latent_vectors.shape[0])]
+        vals = np.full(latent_vectors.shape[0], -1)
         vals_names = {a: a for a in np.unique(vals).astype(int)}
 
     # all clusters & all labels
@@ -289,6 +291,68 @@ def generate_scatter_data(
     return fig
 
 
+def generate_lod_scatter_data(latent_vectors, x_range=None, y_range=None, clusters=None):
+    """
+    Generate a level of detail plot of a large 2D latent space: a density raster
+    of the viewport under a representative subsample of its points. The points
+    carry their row in latent_vectors as customdata, as their position in the
+    trace no longer is their row.
+
+    Parameters:
+    latent_vectors (numpy.ndarray, Nx2, floats): The latent vectors
+    x_range, y_range (list, optional): The viewport. Defaults to the range of the data.
+    clusters (numpy.ndarray, N, ints optional): The cluster number for each data point
+
+    Returns:
+    plotly.graph_objects.Figure: A heatmap and a Scattergl trace.
+    """
+    full_x_range, full_y_range = data_ranges(latent_vectors)
+    x_range = x_range or full_x_range
+    y_range = y_range or full_y_range
+
+    counts = density_raster(latent_vectors, x_range, y_range)
+    n_bins_y, n_bins_x = counts.shape
+    dx = (x_range[1] - x_range[0]) / n_bins_x
+    dy = (y_range[1] - y_range[0]) / n_bins_y
+    # Empty bins are left transparent
+    density = np.where(counts > 0, np.log1p(counts), np.nan)
+
+    indices = subsample_indices(latent_vectors, x_range, y_range)
+    marker = dict(size=4)
+    if clusters is not None:
+        marker.update(color=np.asarray(clusters)[indices], colorscale="Turbo")
+
+    fig = go.Figure(
+        [
+            go.Heatmap(
+                z=density,
+                x0=x_range[0] + dx / 2,
+                dx=dx,
+                y0=y_range[0] + dy / 2,
+                dy=dy,
+                colorscale="Blues",
+                showscale=False,
+                hoverinfo="skip",
+            ),
+            go.Scattergl(
+                x=latent_vectors[indices, 0],
+                y=latent_vectors[indices, 1],
+                mode="markers",
+                marker=marker,
+                customdata=indices,
+            ),
+        ]
+    )
+    fig.update_layout(
+        dragmode="lasso",
+        margin=go.layout.Margin(l=20, r=20, b=20, t=20, pad=0),
+        showlegend=False,
+        # Keep the user's zoom when the traces are re-binned
+        uirevision="lod",
+    )
+    return fig
+
+
 def plot_empty_heatmap():
     return go.Figure(
         go.Heatmap(),
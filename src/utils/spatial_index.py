@@ -0,0 +1,254 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import numpy as np
+import redis
+from scipy.spatial import cKDTree
+
+from src.arroyo_reduction import session_reader
+from src.arroyo_reduction.redis_model_store import get_connection_pool
+
+from .lod_utils import points_in_polygon
+
+logger = logging.getLogger("lse.spatial_index")
+
+# Clicks snap to the nearest point within this many neighbours that can be mapped to data
+CLICK_CANDIDATES = 16
+
+
+class LatentIndex:
+    """
+    KD-tree over the plotted coordinates of a latent space, resolving lasso and
+    box selections, clicks and nearest neighbour queries to positions in the
+    coordinates without the browser having to hold every point.
+    """
+
+    def __init__(self, coords):
+        coords = np.asarray(coords, dtype=float)
+        # Only the plotted dimensions matter: x, y and z for a 3D space
+        self.coords = coords[:, :3] if coords.shape[1] >= 3 else coords[:, :2]
+        self.tree = cKDTree(self.coords) if len(self.coords) else None
+
+    def __len__(self):
+        return len(self.coords)
+
+    def in_box(self, x_range, y_range):
+        """Positions of the points within a box of the first two dimensions"""
+        if self.tree is None or self.coords.shape[1] != 2:
+            return np.empty(0, dtype=int)
+        (x0, x1), (y0, y1) = sorted(x_range), sorted(y_range)
+        # The square around the box, in the Chebyshev norm, then the exact box
+        center = [(x0 + x1) / 2, (y0 + y1) / 2]
+        radius = max(x1 - x0, y1 - y0) / 2
+        candidates = np.asarray(
+            self.tree.query_ball_point(center, radius, p=np.inf, return_sorted=False),
+            dtype=int,
+        )
+        x, y = self.coords[candidates, 0], self.coords[candidates, 1]
+        inside = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        return np.sort(candidates[inside])
+
+    def in_polygon(self, polygon_x, polygon_y):
+        """Positions of the points within a lasso of the first two dimensions"""
+        polygon_x = np.asarray(polygon_x, dtype=float)
+        polygon_y = np.asarray(polygon_y, dtype=float)
+        if polygon_x.size < 3:
+            return np.empty(0, dtype=int)
+        candidates = self.in_box(
+            [polygon_x.min(), polygon_x.max()], [polygon_y.min(), polygon_y.max()]
+        )
+        inside = points_in_polygon(self.coords[candidates], polygon_x, polygon_y)
+        return candidates[inside]
+
+    def nearest(self, point, k=1):
+        """Positions of the k points nearest to a point, closest first"""
+        if self.tree is None:
+            return np.empty(0, dtype=int)
+        k = min(k, len(self))
+        _, positions = self.tree.query(np.asarray(point, dtype=float), k=k)
+        return np.atleast_1d(positions)
+
+    def similar(self, position, k=10):
+        """Positions of the k points nearest to the point at position, the frames most similar to it"""
+        return self.nearest(self.coords[position], k + 1)[1:]
+
+    def select(self, selected_data=None, click_data=None, n_candidates=1):
+        """
+        Resolve a selection of the scatter figure
+        Args:
+            selected_data:      selectedData, with the lasso or box of the selection
+            click_data:         clickData, snapped to the nearest point
+            n_candidates:       number of nearest points returned for a click
+        Returns:
+            positions, or None if there is no selection or it has no region
+        """
+        if selected_data:
+            if selected_data.get("range"):
+                return self.in_box(selected_data["range"]["x"], selected_data["range"]["y"])
+            if selected_data.get("lassoPoints"):
+                lasso = selected_data["lassoPoints"]
+                return self.in_polygon(lasso["x"], lasso["y"])
+        if click_data and len(click_data["points"]) > 0:
+            point = click_data["points"][0]
+            axes = ["x", "y", "z"][: self.coords.shape[1]]
+            if all(point.get(axis) is not None for axis in axes):
+                return self.nearest([point[axis] for axis in axes], n_candidates)
+        return None
+
+
+def tiled_uri(tiled_url):
+    """The dataset uri of a tiled_url in a data project, like liveWS.addLiveEvents"""
+    path_parts = urlparse(tiled_url).path.split("/")
+    if len(path_parts) > 1 and path_parts[-1] != "":
+        return path_parts[-1]
+    return ""
+
+
+class LiveSessionIndex:
+    """
+    LatentIndex over the points logged for a live session by LiveSessionLog.
+    Every refresh only reads the entries of each run logged after the last
+    one it read and the tree is rebuilt only if there were any.
+    """
+
+    def __init__(self, redis_client, autoencoder_model, dimred_model):
+        self.redis_client = redis_client
+        self.autoencoder_model = autoencoder_model
+        self.dimred_model = dimred_model
+        self.index = None
+        self._lock = threading.Lock()
+        # Last entry ID read from each run's stream
+        self._last_ids = {}
+        self._coords = []
+        self._frames = []
+        # Code of each point's dataset uri, the codes numbering the uris in order of appearance
+        self._uri_codes = []
+        self._uri_names = {}
+
+    def refresh(self):
+        """Read the newly logged points, returns the index"""
+        with self._lock:
+            new_points = 0
+            for run in session_reader.list_runs(self.redis_client, self.autoencoder_model, self.dimred_model):
+                new_points += self._read_run(run)
+
+            if new_points:
+                # Few large arrays rather than one per page
+                self._coords = [np.vstack(self._coords)]
+                self._frames = [np.concatenate(self._frames)]
+                self._uri_codes = [np.concatenate(self._uri_codes)]
+                self.index = LatentIndex(self._coords[0])
+                logger.debug(
+                    f"Live index of {self.autoencoder_model}/{self.dimred_model}: "
+                    f"{len(self.index)} points, {new_points} new"
+                )
+            return self.index
+
+    def _read_run(self, run):
+        """Read the points of a run logged after the last one read, returns their number"""
+        new_points = 0
+        uri_code = self._uri_names.setdefault(tiled_uri(run), len(self._uri_names))
+        for page in session_reader.iter_pages(
+            self.redis_client,
+            self.autoencoder_model,
+            self.dimred_model,
+            run,
+            after=self._last_ids.get(run),
+        ):
+            self._coords.append(
+                np.vstack(
+                    [
+                        np.frombuffer(
+                            fields[b"feature_vector"], dtype=session_reader.FEATURE_DTYPE
+                        )
+                        for _, fields in page
+                    ]
+                )
+            )
+            self._frames.append(np.array([int(fields[b"index"]) for _, fields in page]))
+            self._uri_codes.append(np.full(len(page), uri_code))
+            self._last_ids[run] = page[-1][0]
+            new_points += len(page)
+        return new_points
+
+    def data_indices(self, positions, datasets):
+        """
+        Map positions in the index to data project indices. The live data project
+        has one dataset per tiled run, each starting at the cumulative_data_count
+        of the previous one. Points of runs not in it, e.g. those logged before
+        the page went live, are dropped.
+        Args:
+            positions:          positions in the index
+            datasets:           datasets of the live data project
+        Returns:
+            list of data project indices, in the order of positions
+        """
+        positions = np.asarray(positions, dtype=int)
+        if not self._frames or positions.size == 0:
+            return []
+        offsets_by_uri = {}
+        previous = 0
+        for dataset in datasets:
+            offsets_by_uri.setdefault(dataset["uri"], previous)
+            previous = dataset["cumulative_data_count"]
+        offsets = np.full(len(self._uri_names), -1)
+        for uri, code in self._uri_names.items():
+            offsets[code] = offsets_by_uri.get(uri, -1)
+
+        offset = offsets[self._uri_codes[0][positions]]
+        frame = self._frames[0][positions]
+        keep = (offset >= 0) & (frame >= 0)
+        return (offset[keep] + frame[keep]).tolist()
+
+
+class LiveSessionIndexes:
+    """The LiveSessionIndex of the few most recently queried live sessions"""
+
+    def __init__(self, host=None, port=None, max_sessions=2):
+        self.host = host or os.getenv("REDIS_HOST", "kvrocks")
+        self.port = port or int(os.getenv("REDIS_PORT", 6666))
+        self.max_sessions = max_sessions
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, autoencoder_model, dimred_model):
+        key = (autoencoder_model, dimred_model)
+        with self._lock:
+            if key not in self._indexes:
+                # Feature vectors are stored as bytes, so responses are not decoded
+                redis_client = redis.Redis(
+                    connection_pool=get_connection_pool(
+                        self.host, self.port, decode_responses=False
+                    )
+                )
+                self._indexes[key] = LiveSessionIndex(redis_client, *key)
+                while len(self._indexes) > self.max_sessions:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(key)
+            return self._indexes[key]
+
+    def select(self, selected_models, datasets, selected_data=None, click_data=None):
+        """
+        Resolve a selection of the live scatter to data project indices
+        Returns:
+            list of data project indices, or None if the session log cannot be read
+        """
+        session = self.get(selected_models["autoencoder"], selected_models["dimred"])
+        try:
+            index = session.refresh()
+        except Exception as e:
+            logger.warning(f"Could not read the live session log: {e}")
+            return None
+        if index is None:
+            return []
+        positions = index.select(selected_data, click_data, CLICK_CANDIDATES)
+        if positions is None:
+            return []
+        indices = session.data_indices(positions, datasets)
+        # A click selects the nearest point that is part of the plot
+        if not selected_data or not (selected_data.get("range") or selected_data.get("lassoPoints")):
+            return indices[:1]
+        return indices